@@ -0,0 +1,69 @@
+"""
+End-to-end /api/predict/ latency through the Django test client (no network):
+upload parsing, tempfile write, inference, media save and DB insert.
+
+Example:
+    python benchmarks/bench_api_predict.py --requests 20
+"""
+import argparse
+import time
+
+from common import environment_info, percentile, setup_django, write_json
+from synthetic import synthetic_png_bytes
+
+
+def run(n_requests: int = 20) -> dict:
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from django.core.files.uploadedfile import SimpleUploadedFile
+    from django.test.utils import override_settings, setup_test_environment
+    from rest_framework.test import APIClient
+
+    from prediction.models import MeanSizePrediction
+
+    setup_test_environment()
+    user, _ = get_user_model().objects.get_or_create(username="bench-api")
+    client = APIClient()
+    client.force_authenticate(user)
+    png = synthetic_png_bytes(seed=2)
+
+    latencies = []
+    with override_settings(SEM_INFERENCE_RATE=0, SEM_INFERENCE_MAX_INFLIGHT=0):
+        for i in range(n_requests + 1):
+            upload = SimpleUploadedFile(f"bench_{i}.png", png, content_type="image/png")
+            t0 = time.perf_counter()
+            response = client.post("/api/predict/", {"image": upload}, format="multipart")
+            elapsed = time.perf_counter() - t0
+            if response.status_code != 200:
+                raise RuntimeError(f"/api/predict/ returned {response.status_code}: {response.content[:200]!r}")
+            if i > 0:  # first request is warm-up
+                latencies.append(elapsed)
+
+    for prediction in MeanSizePrediction.objects.filter(user=user):
+        prediction.image.delete(save=False)
+    MeanSizePrediction.objects.filter(user=user).delete()
+
+    return {
+        "predict_ms_p50": percentile(latencies, 50, scale=1000),
+        "predict_ms_p95": percentile(latencies, 95, scale=1000),
+        "predict_ms_mean": sum(latencies) / len(latencies) * 1000,
+        "predict_requests_per_s": len(latencies) / sum(latencies),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end /api/predict/ latency benchmark.")
+    parser.add_argument("--requests", type=int, default=20, help="Timed requests (after one warm-up).")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(n_requests=args.requests)
+    for metric, value in results.items():
+        print(f"{metric:<24} {value:10.3f}")
+
+    write_json({"environment": environment_info(), "api_predict": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
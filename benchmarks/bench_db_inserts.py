@@ -0,0 +1,115 @@
+"""
+Load test for MeanSizePrediction inserts under concurrent uploads.
+
+Runs N writer threads that each insert rows the same way predict_mean_size_view
+does, against a throwaway database, and reports insert throughput, latency
+percentiles and how many inserts failed with "database is locked".
+
+Examples:
+    python benchmarks/bench_db_inserts.py --threads 8 --rows 200
+    python benchmarks/bench_db_inserts.py --sqlite-profile default   # stock journal
+    SEM_DB_ENGINE=postgres SEM_DB_NAME=sem_bench python benchmarks/bench_db_inserts.py
+"""
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import os
+import threading
+import time
+
+from common import environment_info, format_value, percentile, setup_django, write_json
+
+
+def run(threads: int = 8, rows: int = 200, sqlite_profile: str | None = None) -> dict:
+    if sqlite_profile is not None:
+        os.environ["SEM_SQLITE_PROFILE"] = sqlite_profile
+
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from django.db import OperationalError, connection
+    from prediction.models import MeanSizePrediction
+
+    user, _ = get_user_model().objects.get_or_create(username="bench-inserts")
+    connection.close()
+
+    latencies = []
+    errors = []
+    lock = threading.Lock()
+    start_barrier = threading.Barrier(threads)
+
+    def writer(worker_id: int):
+        local_latencies = []
+        local_errors = 0
+        start_barrier.wait()
+        for i in range(rows):
+            t0 = time.perf_counter()
+            try:
+                MeanSizePrediction.objects.create(
+                    user=user,
+                    image=f"sem_uploads/bench_{worker_id}_{i}.png",
+                    original_filename=f"bench_{worker_id}_{i}.png",
+                    predicted_mean_size_nm=42.0,
+                )
+            except OperationalError:
+                local_errors += 1
+                continue
+            local_latencies.append(time.perf_counter() - t0)
+        connection.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors.append(local_errors)
+
+    t_start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(writer, range(threads)))
+    elapsed = time.perf_counter() - t_start
+
+    MeanSizePrediction.objects.filter(user=user).delete()
+    connection.close()
+
+    from django.conf import settings
+    inserted = len(latencies)
+    return {
+        "engine": settings.DATABASES["default"]["ENGINE"],
+        "sqlite_profile": getattr(settings, "SEM_SQLITE_PROFILE", None),
+        "threads": threads,
+        "rows_per_thread": rows,
+        "inserted": inserted,
+        "locked_errors": sum(errors),
+        "elapsed_s": elapsed,
+        "inserts_per_s": inserted / elapsed if elapsed > 0 else 0.0,
+        "latency_ms_p50": percentile(latencies, 50, scale=1000),
+        "latency_ms_p95": percentile(latencies, 95, scale=1000),
+        "latency_ms_p99": percentile(latencies, 99, scale=1000),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Concurrent MeanSizePrediction insert load test.")
+    parser.add_argument("--threads", type=int, default=8, help="Concurrent writer threads.")
+    parser.add_argument("--rows", type=int, default=200, help="Rows inserted per thread.")
+    parser.add_argument(
+        "--sqlite-profile",
+        choices=["wal", "default"],
+        default=None,
+        help="Override SEM_SQLITE_PROFILE for this run.",
+    )
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(threads=args.threads, rows=args.rows, sqlite_profile=args.sqlite_profile)
+
+    print(f"Engine        : {results['engine']} (profile: {results['sqlite_profile']})")
+    print(f"Writers       : {results['threads']} x {results['rows_per_thread']} rows")
+    print(f"Inserted      : {results['inserted']} ({results['locked_errors']} 'database is locked' errors)")
+    print(f"Throughput    : {results['inserts_per_s']:.1f} inserts/s")
+    print(
+        f"Latency (ms)  : p50 {format_value(results['latency_ms_p50'], '.2f')} | "
+        f"p95 {format_value(results['latency_ms_p95'], '.2f')} | p99 {format_value(results['latency_ms_p99'], '.2f')}"
+    )
+
+    write_json({"environment": environment_info(), "db_inserts": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
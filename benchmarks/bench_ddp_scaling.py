@@ -0,0 +1,125 @@
+"""
+DDP (gloo) training throughput versus number of processes on the synthetic
+benchmark dataset, going through the same create_dataloaders /
+train_one_epoch path that `torchrun src/ml/train.py` uses.
+
+Each process is pinned to --threads intra-op threads (default 1) so a
+single machine with N cores emulates N one-core CPU nodes; compare
+images/s against world size 1 for the scaling efficiency. Speedup is only
+meaningful when the machine has at least max(world sizes) * threads cores.
+
+Example:
+    python benchmarks/bench_ddp_scaling.py --world-sizes 1 2 4 --n-images 128
+"""
+import argparse
+import os
+import socket
+import tempfile
+import time
+
+from common import add_src_paths, environment_info, write_json
+from synthetic import make_synthetic_dataset
+
+add_src_paths()
+
+import torch  # noqa: E402
+import torch.distributed as dist  # noqa: E402
+import torch.multiprocessing as mp  # noqa: E402
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _worker(rank, world_size, port, csv_path, images_dir, batch_size, epochs, threads, results):
+    import torch.nn as nn
+    from torch.nn.parallel import DistributedDataParallel
+    from model import create_model
+    from train import create_dataloaders, train_one_epoch
+
+    torch.set_num_threads(threads)
+    os.environ.update(MASTER_ADDR="127.0.0.1", MASTER_PORT=str(port))
+    dist.init_process_group("gloo", rank=rank, world_size=world_size)
+    try:
+        train_loader, _, _ = create_dataloaders(
+            csv_path=csv_path, images_dir=images_dir, batch_size=batch_size, val_ratio=0.0, test_ratio=0.0,
+        )
+        device = torch.device("cpu")
+        model = DistributedDataParallel(create_model(device=device))
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+        criterion = nn.MSELoss()
+
+        train_one_epoch(model, train_loader, criterion, optimizer, device)  # warm-up
+        dist.barrier()
+        t0 = time.perf_counter()
+        for epoch in range(epochs):
+            if hasattr(train_loader.sampler, "set_epoch"):  # DistributedSampler (world size > 1)
+                train_loader.sampler.set_epoch(epoch + 1)
+            train_one_epoch(model, train_loader, criterion, optimizer, device)
+        elapsed = torch.tensor(time.perf_counter() - t0)
+        dist.all_reduce(elapsed, op=dist.ReduceOp.MAX)
+        if rank == 0:
+            results[world_size] = elapsed.item()
+    finally:
+        dist.destroy_process_group()
+
+
+def run(world_sizes=(1, 2, 4), n_images: int = 64, batch_size: int = 4, epochs: int = 1, threads: int = 1) -> dict:
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, images_dir = make_synthetic_dataset(tmp, n_images=n_images)
+        with mp.Manager() as manager:
+            shared = manager.dict()
+            for world_size in world_sizes:
+                mp.spawn(
+                    _worker,
+                    args=(world_size, _free_port(), csv_path, images_dir, batch_size, epochs, threads, shared),
+                    nprocs=world_size,
+                    join=True,
+                )
+            elapsed = dict(shared)
+
+    base = n_images * epochs / elapsed[world_sizes[0]] / world_sizes[0]
+    for world_size in world_sizes:
+        images_per_s = n_images * epochs / elapsed[world_size]
+        results[f"ws{world_size}_images_per_s"] = images_per_s
+        results[f"ws{world_size}_epoch_s"] = elapsed[world_size] / epochs
+        results[f"ws{world_size}_speedup"] = images_per_s / (base * world_sizes[0])
+        results[f"ws{world_size}_efficiency"] = images_per_s / (base * world_size)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="DDP (gloo) training scaling benchmark.")
+    parser.add_argument("--world-sizes", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--n-images", type=int, default=64, help="Synthetic training images.")
+    parser.add_argument("--batch-size", type=int, default=4, help="Per-process batch size.")
+    parser.add_argument("--epochs", type=int, default=1, help="Timed epochs (after one warm-up epoch).")
+    parser.add_argument("--threads", type=int, default=1, help="torch intra-op threads per process.")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(
+        world_sizes=args.world_sizes,
+        n_images=args.n_images,
+        batch_size=args.batch_size,
+        epochs=args.epochs,
+        threads=args.threads,
+    )
+    print(f"{'procs':>5} | {'images/s':>9} {'epoch s':>8} {'speedup':>8} {'efficiency':>10}")
+    for world_size in args.world_sizes:
+        print(
+            f"{world_size:>5} | {results[f'ws{world_size}_images_per_s']:>9.2f} "
+            f"{results[f'ws{world_size}_epoch_s']:>8.2f} {results[f'ws{world_size}_speedup']:>8.2f} "
+            f"{results[f'ws{world_size}_efficiency']:>10.2f}"
+        )
+    if max(args.world_sizes) * args.threads > (os.cpu_count() or 1):
+        print(f"note: only {os.cpu_count()} CPU core(s) here; larger world sizes are oversubscribed")
+
+    write_json({"environment": environment_info(), "ddp_scaling": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
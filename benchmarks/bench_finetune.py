@@ -0,0 +1,95 @@
+"""
+Warm-start fine-tuning (src/ml/finetune.py) vs. a full retrain.
+
+On synthetic 480x480 images (decoded up front, so PNG I/O is not measured)
+it times one full-model training epoch over old + new images, extrapolated
+to a full retrain of --full-epochs epochs (train.py's default is 100), and
+a complete fine-tune (feature caching + --epochs epochs on new images plus
+an equal number of replayed old ones) for several numbers of frozen blocks.
+
+Example:
+    python benchmarks/bench_finetune.py --old 256 --new 64 --freeze 0 2 3 4
+"""
+import argparse
+import tempfile
+import time
+
+from common import add_src_paths, environment_info, write_json
+from synthetic import make_synthetic_dataset
+
+
+def _decoded(n_images: int, seed: int):
+    import torch
+    from torch.utils.data import TensorDataset
+    from datasets import SemMeanSizeDataset
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, images_dir = make_synthetic_dataset(tmp, n_images=n_images, seed=seed)
+        dataset = SemMeanSizeDataset(csv_path=csv_path, images_dir=images_dir)
+        items = [dataset[i] for i in range(len(dataset))]
+    return TensorDataset(torch.stack([x for x, _ in items]), torch.stack([y for _, y in items]))
+
+
+def run(n_old: int = 64, n_new: int = 16, freeze=(0, 3), epochs: int = 10, full_epochs: int = 100,
+        batch_size: int = 4) -> dict:
+    add_src_paths()
+    import torch
+    import torch.nn as nn
+    from torch.utils.data import ConcatDataset, DataLoader
+    from finetune import fine_tune, replay_sample
+    from model import create_model
+    from train import train_one_epoch
+
+    torch.manual_seed(0)
+    device = torch.device("cpu")
+    old, new = _decoded(n_old, seed=0), _decoded(n_new, seed=1)
+
+    model = create_model(device=device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    loader = DataLoader(ConcatDataset([old, new]), batch_size=batch_size, shuffle=True)
+    t0 = time.perf_counter()
+    train_one_epoch(model, loader, nn.MSELoss(), optimizer, device)
+    full_epoch_s = time.perf_counter() - t0
+    results = {"full_retrain": {"epoch_s": full_epoch_s, "total_s": full_epoch_s * full_epochs}}
+
+    base_state = model.state_dict()
+    for n_frozen in freeze:
+        model.load_state_dict(base_state)
+        result = fine_tune(
+            model, ConcatDataset([new, replay_sample(old, n_new)]), device,
+            n_frozen=n_frozen, epochs=epochs, batch_size=batch_size,
+        )
+        total = result["cache_seconds"] + result["train_seconds"]
+        results[f"freeze_{n_frozen}"] = {
+            "cache_s": result["cache_seconds"],
+            "epoch_s": result["train_seconds"] / epochs,
+            "total_s": total,
+            "fraction_of_retrain": total / results["full_retrain"]["total_s"],
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fine-tune vs. full retrain benchmark.")
+    parser.add_argument("--old", type=int, default=64, help="Old (already trained on) images.")
+    parser.add_argument("--new", type=int, default=16, help="Newly labelled images.")
+    parser.add_argument("--freeze", type=int, nargs="+", default=[0, 2, 3, 4], help="Frozen ConvBlocks to compare.")
+    parser.add_argument("--epochs", type=int, default=10, help="Fine-tune epochs.")
+    parser.add_argument("--full-epochs", type=int, default=100, help="Epochs of the full retrain it replaces.")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(args.old, args.new, args.freeze, args.epochs, args.full_epochs)
+    r = results["full_retrain"]
+    print(f"full retrain: {r['epoch_s']:.2f} s/epoch x {args.full_epochs} = {r['total_s']:.0f} s")
+    print(f"{'frozen':>7} {'cache s':>8} {'s/epoch':>8} {'total s':>8} {'of retrain':>10}")
+    for name, r in results.items():
+        if name.startswith("freeze_"):
+            print(f"{name[7:]:>7} {r['cache_s']:>8.2f} {r['epoch_s']:>8.2f} {r['total_s']:>8.2f} "
+                  f"{r['fraction_of_retrain']:>10.2%}")
+
+    write_json({"environment": environment_info(), "finetune": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Compare history serialization throughput (rows/sec): the DRF
+MeanSizePredictionSerializer + JSONRenderer path versus the .values() fast path
+(serialize_history_rows + FastJSONRenderer) used by PredictionHistoryView.
+
+Example:
+    python benchmarks/bench_history_serialization.py --rows 1000 10000
+"""
+import argparse
+import time
+
+from common import environment_info, setup_django, write_json
+
+
+def _best_of(fn, repeats: int) -> float:
+    best = float("inf")
+    for _ in range(repeats):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def run(row_counts=(1000, 10000), repeats: int = 3) -> dict:
+    setup_django()
+
+    from django.contrib.auth import get_user_model
+    from rest_framework.renderers import JSONRenderer
+    from rest_framework.test import APIRequestFactory
+
+    from prediction.models import MeanSizePrediction
+    from prediction.renderers import FastJSONRenderer
+    from prediction.serializers import HISTORY_VALUE_FIELDS, MeanSizePredictionSerializer, serialize_history_rows
+    from prediction.storage import shard_name
+
+    user, _ = get_user_model().objects.get_or_create(username="bench-history")
+    request = APIRequestFactory().get("/api/history/", HTTP_HOST="localhost")
+    results = {}
+
+    for n_rows in row_counts:
+        MeanSizePrediction.objects.filter(user=user).delete()
+        MeanSizePrediction.objects.bulk_create(
+            [
+                MeanSizePrediction(
+                    user=user,
+                    image=shard_name(f"sem_uploads/img_{i}.png"),
+                    original_filename=f"img_{i}.png",
+                    predicted_mean_size_nm=float(i % 97),
+                )
+                for i in range(n_rows)
+            ],
+            batch_size=1000,
+        )
+        qs = MeanSizePrediction.objects.filter(user=user).order_by("-created_at")
+
+        def model_serializer():
+            data = MeanSizePredictionSerializer(qs.all(), many=True, context={"request": request}).data
+            return JSONRenderer().render(data)
+
+        def fast_path():
+            data = serialize_history_rows(qs.values(*HISTORY_VALUE_FIELDS), request)
+            return FastJSONRenderer().render(data)
+
+        assert len(model_serializer()) > 0 and len(fast_path()) > 0  # warm-up
+        t_model = _best_of(model_serializer, repeats)
+        t_fast = _best_of(fast_path, repeats)
+
+        results[str(n_rows)] = {
+            "model_serializer_rows_per_s": n_rows / t_model,
+            "fast_path_rows_per_s": n_rows / t_fast,
+            "speedup": t_model / t_fast,
+        }
+
+    MeanSizePrediction.objects.filter(user=user).delete()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="History serialization benchmark.")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000, 10000], help="Row counts to test.")
+    parser.add_argument("--repeats", type=int, default=3, help="Timed repeats (best is reported).")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(row_counts=args.rows, repeats=args.repeats)
+    for n_rows, r in results.items():
+        print(
+            f"{n_rows:>7} rows | serializer {r['model_serializer_rows_per_s']:>10.0f} rows/s | "
+            f"fast path {r['fast_path_rows_per_s']:>10.0f} rows/s | x{r['speedup']:.1f}"
+        )
+
+    write_json({"environment": environment_info(), "history_serialization": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,110 @@
+"""
+Per-item label lookup overhead and worker start-up payload of
+SemMeanSizeDataset's label store, compared with the previous
+DataFrame-based approach (df.iloc[idx] + float() + torch.tensor()).
+
+Image decoding is excluded: this isolates the bookkeeping cost that every
+__getitem__ pays on top of reading the PNG.
+
+Example:
+    python benchmarks/bench_label_store.py --sizes 10000 100000 1000000
+"""
+from pathlib import Path
+import argparse
+import pickle
+import tempfile
+import time
+
+from common import add_src_paths, environment_info, write_json
+
+add_src_paths()
+
+import numpy as np  # noqa: E402
+import pandas as pd  # noqa: E402
+import torch  # noqa: E402
+
+
+def _dataframe_lookup(df: pd.DataFrame, idx: int):
+    row = df.iloc[idx]
+    filename = row["filename"]
+    target = torch.tensor(float(row["mean_size_nm"]), dtype=torch.float32)
+    return filename, target
+
+
+def _array_lookup(filenames: np.ndarray, targets: torch.Tensor, idx: int):
+    return filenames[idx].decode("utf-8"), targets[idx]
+
+
+def run(sizes=(10_000, 100_000, 1_000_000), lookups: int = 20_000) -> dict:
+    from datasets import SemMeanSizeDataset
+
+    results = {}
+    rng = np.random.default_rng(0)
+
+    for n in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            csv_path = Path(tmp) / "labels.csv"
+            pd.DataFrame({
+                "filename": [f"sem_image_{i:08d}.png" for i in range(n)],
+                "mean_size_nm": rng.uniform(5, 200, n).round(3),
+            }).to_csv(csv_path, index=False)
+
+            df = pd.read_csv(csv_path)
+            dataset = SemMeanSizeDataset(csv_path=csv_path, images_dir=tmp)
+
+        indices = rng.integers(0, n, lookups).tolist()
+
+        t0 = time.perf_counter()
+        for idx in indices:
+            _dataframe_lookup(df, idx)
+        t_df = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        for idx in indices:
+            _array_lookup(dataset.filenames, dataset.targets, idx)
+        t_arrays = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        df_payload = pickle.dumps(df)
+        pickle.loads(df_payload)
+        t_df_pickle = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        ds_payload = pickle.dumps(dataset)
+        pickle.loads(ds_payload)
+        t_ds_pickle = time.perf_counter() - t0
+
+        results[str(n)] = {
+            "dataframe_us_per_item": t_df / lookups * 1e6,
+            "arrays_us_per_item": t_arrays / lookups * 1e6,
+            "dataframe_pickle_mb": len(df_payload) / 1e6,
+            "arrays_pickle_mb": len(ds_payload) / 1e6,
+            "dataframe_pickle_roundtrip_ms": t_df_pickle * 1000,
+            "arrays_pickle_roundtrip_ms": t_ds_pickle * 1000,
+        }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Label store per-item overhead benchmark.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--lookups", type=int, default=20_000, help="Random lookups timed per size.")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(sizes=args.sizes, lookups=args.lookups)
+    print(f"{'rows':>9} | {'iloc us/item':>12} {'arrays us/item':>14} | "
+          f"{'df pickle MB':>12} {'arrays MB':>9} | {'df rt ms':>8} {'arrays rt ms':>12}")
+    for n, r in results.items():
+        print(
+            f"{n:>9} | {r['dataframe_us_per_item']:>12.2f} {r['arrays_us_per_item']:>14.2f} | "
+            f"{r['dataframe_pickle_mb']:>12.1f} {r['arrays_pickle_mb']:>9.1f} | "
+            f"{r['dataframe_pickle_roundtrip_ms']:>8.1f} {r['arrays_pickle_roundtrip_ms']:>12.1f}"
+        )
+
+    write_json({"environment": environment_info(), "label_store": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""
+Micro-benchmarks for the ML code in src/ml on synthetic 480x480 data:
+
+  forward     SemMeanSizeCNN forward throughput per batch size and thread count
+  preprocess  infer.preprocess_image decode + normalize cost per image
+  dataset     SemMeanSizeDataset iteration speed through a DataLoader
+  train_step  train.train_one_epoch time per optimizer step
+  eval_step   train.evaluate time per batch
+  augment     augment.BatchAugment per batch vs. per-image PIL transforms
+  ensemble    ensemble.EnsemblePredictor latency (K models x T TTA views) vs. one model
+
+Example:
+    python benchmarks/bench_ml.py forward --batch-sizes 1 8 --threads 1 4
+"""
+from pathlib import Path
+import argparse
+import io
+import tempfile
+import time
+
+from common import add_src_paths, environment_info, write_json
+from synthetic import make_synthetic_dataset, synthetic_png_bytes
+
+add_src_paths()
+
+import torch  # noqa: E402
+
+
+def _timed_loop(fn, min_time: float, min_iters: int = 3) -> tuple[int, float]:
+    """Call fn repeatedly for at least min_time seconds; return (iterations, elapsed)."""
+    fn()  # warm-up
+    iters = 0
+    t0 = time.perf_counter()
+    while True:
+        fn()
+        iters += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time and iters >= min_iters:
+            return iters, elapsed
+
+
+def default_thread_counts() -> list[int]:
+    counts = [1]
+    while counts[-1] * 2 <= torch.get_num_threads():
+        counts.append(counts[-1] * 2)
+    return counts
+
+
+def run_forward(batch_sizes=(1, 4, 8), thread_counts=None, min_time: float = 1.0) -> dict:
+    from model import create_model
+
+    thread_counts = thread_counts or default_thread_counts()
+    original_threads = torch.get_num_threads()
+    model = create_model(device="cpu").eval()
+    results = {}
+
+    for threads in thread_counts:
+        torch.set_num_threads(threads)
+        for bs in batch_sizes:
+            x = torch.randn(bs, 1, 480, 480)
+
+            def step():
+                with torch.no_grad():
+                    model(x)
+
+            iters, elapsed = _timed_loop(step, min_time)
+            results[f"bs{bs}_t{threads}_images_per_s"] = iters * bs / elapsed
+            results[f"bs{bs}_t{threads}_batch_ms"] = elapsed / iters * 1000
+
+    torch.set_num_threads(original_threads)
+    return results
+
+
+def run_preprocess(min_time: float = 1.0) -> dict:
+    from infer import preprocess_image
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "synthetic.png"
+        path.write_bytes(synthetic_png_bytes(seed=1))
+        iters, elapsed = _timed_loop(lambda: preprocess_image(path), min_time)
+
+    return {"preprocess_ms": elapsed / iters * 1000}
+
+
+def run_dataset(n_images: int = 64, batch_size: int = 8, num_workers: int = 0, data_dir=None) -> dict:
+    from torch.utils.data import DataLoader
+    from datasets import SemMeanSizeDataset
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, images_dir = make_synthetic_dataset(data_dir or tmp, n_images=n_images)
+        dataset = SemMeanSizeDataset(csv_path=csv_path, images_dir=images_dir)
+        loader = DataLoader(dataset, batch_size=batch_size, num_workers=num_workers)
+
+        t0 = time.perf_counter()
+        n = 0
+        for images, _ in loader:
+            n += images.size(0)
+        elapsed = time.perf_counter() - t0
+
+    return {"dataset_images_per_s": n / elapsed, "dataset_ms_per_image": elapsed / n * 1000}
+
+
+def _decoded_synthetic(n_images: int, side: int = 480, data_dir=None):
+    from datasets import SemMeanSizeDataset
+
+    with tempfile.TemporaryDirectory() as tmp:
+        csv_path, images_dir = make_synthetic_dataset(data_dir or tmp, n_images=n_images)
+        dataset = SemMeanSizeDataset(csv_path=csv_path, images_dir=images_dir)
+        # Decode once up front so the numbers measure the training step, not PNG I/O.
+        images = torch.stack([dataset[i][0] for i in range(len(dataset))])
+        targets = torch.stack([dataset[i][1] for i in range(len(dataset))])
+    if side != images.shape[-1]:
+        images = torch.nn.functional.interpolate(images, size=(side, side), mode="area")
+    return images, targets
+
+
+def run_train_step(n_images: int = 32, batch_size: int = 4, data_dir=None, side: int = 480) -> dict:
+    import torch.nn as nn
+    from torch.utils.data import DataLoader, TensorDataset
+    from model import create_model
+    from train import train_one_epoch
+
+    images, targets = _decoded_synthetic(n_images, side, data_dir)
+    loader = DataLoader(TensorDataset(images, targets), batch_size=batch_size, shuffle=True)
+    device = torch.device("cpu")
+    model = create_model(device=device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    criterion = nn.MSELoss()
+
+    train_one_epoch(model, loader, criterion, optimizer, device)  # warm-up
+    t0 = time.perf_counter()
+    train_one_epoch(model, loader, criterion, optimizer, device)
+    elapsed = time.perf_counter() - t0
+
+    return {"train_step_ms": elapsed / len(loader) * 1000, "train_images_per_s": len(images) / elapsed}
+
+
+def run_eval_step(n_images: int = 64, batch_size: int = 16, side: int = 480, min_time: float = 1.0) -> dict:
+    """train.evaluate time per batch (the metrics bookkeeping is part of every step)."""
+    from torch.utils.data import DataLoader, TensorDataset
+    from model import create_model
+    from train import evaluate
+
+    images, targets = _decoded_synthetic(n_images, side)
+    loader = DataLoader(TensorDataset(images, targets), batch_size=batch_size)
+    model = create_model(device="cpu")
+    device = torch.device("cpu")
+    iters, elapsed = _timed_loop(lambda: evaluate(model, loader, device), min_time)
+    return {"eval_step_ms": elapsed / iters / len(loader) * 1000, "eval_images_per_s": iters * len(images) / elapsed}
+
+
+def run_augment(batch_size: int = 16, min_time: float = 1.0) -> dict:
+    from PIL import Image
+    from torchvision import transforms
+    from augment import BatchAugment
+    from datasets import get_default_transforms
+
+    pil_images = [Image.open(io.BytesIO(synthetic_png_bytes(seed=i))).convert("L") for i in range(batch_size)]
+    base = get_default_transforms(train=True)
+    images = torch.stack([base(img) for img in pil_images])
+    targets = torch.rand(batch_size) * 100
+
+    # Roughly the same augmentations, applied per image on PIL images the way
+    # a worker-side torchvision pipeline would.
+    per_image = transforms.Compose([
+        transforms.RandomHorizontalFlip(),
+        transforms.RandomVerticalFlip(),
+        transforms.RandomApply([transforms.RandomRotation((90, 90))], p=0.5),
+        transforms.RandomResizedCrop(480, scale=(0.49, 1.0), ratio=(1.0, 1.0)),
+        transforms.ColorJitter(brightness=0.1, contrast=0.1),
+        base,
+    ])
+    batch_augment = BatchAugment(crop_p=1.0)
+
+    iters, elapsed = _timed_loop(lambda: [per_image(img) for img in pil_images], min_time)
+    per_image_ms = elapsed / iters * 1000
+    iters, elapsed = _timed_loop(lambda: batch_augment(images, targets), min_time)
+    batch_ms = elapsed / iters * 1000
+
+    return {
+        "per_image_pil_batch_ms": per_image_ms,
+        "batch_augment_batch_ms": batch_ms,
+        "batch_augment_speedup": per_image_ms / batch_ms,
+    }
+
+
+def run_ensemble(n_models=(1, 3), n_views=(1, 4, 8), min_time: float = 1.0) -> dict:
+    from ensemble import EnsemblePredictor
+    from model import create_model
+
+    x = torch.randn(1, 1, 480, 480)
+    results = {}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = []
+        for seed in range(max(n_models)):
+            torch.manual_seed(seed)
+            paths.append(Path(tmp) / f"seed{seed}.pt")
+            torch.save(create_model().state_dict(), paths[-1])
+
+        single = EnsemblePredictor(paths[:1], tta_views=1, device="cpu")
+        iters, elapsed = _timed_loop(lambda: single.predict(x), min_time)
+        single_ms = elapsed / iters * 1000
+        results["single_ms"] = single_ms
+
+        for k in n_models:
+            for t in n_views:
+                if k == t == 1:
+                    continue
+                predictor = EnsemblePredictor(paths[:k], tta_views=t, device="cpu")
+                iters, elapsed = _timed_loop(lambda: predictor.predict(x), min_time)
+                ms = elapsed / iters * 1000
+                results[f"k{k}_t{t}_ms"] = ms
+                # Cost relative to one forward pass, and per prediction relative
+                # to K x T sequential single-image calls
+                results[f"k{k}_t{t}_x_single"] = ms / single_ms
+                results[f"k{k}_t{t}_vs_sequential_speedup"] = single_ms * k * t / ms
+
+    return results
+
+
+BENCHMARKS = {
+    "forward": run_forward,
+    "preprocess": run_preprocess,
+    "dataset": run_dataset,
+    "train_step": run_train_step,
+    "eval_step": run_eval_step,
+    "augment": run_augment,
+    "ensemble": run_ensemble,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ML micro-benchmarks on synthetic data.")
+    parser.add_argument("benchmarks", nargs="*", help=f"Any of {', '.join(BENCHMARKS)} (default: all).")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 4, 8])
+    parser.add_argument("--threads", type=int, nargs="+", default=None, help="Thread counts for forward.")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(BENCHMARKS)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.benchmarks or BENCHMARKS:
+        if name == "forward":
+            results[name] = run_forward(batch_sizes=args.batch_sizes, thread_counts=args.threads)
+        else:
+            results[name] = BENCHMARKS[name]()
+        for metric, value in results[name].items():
+            print(f"{name:>11} | {metric:<28} {value:12.3f}")
+
+    write_json({"environment": environment_info(), "results": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Memory and throughput of N inference worker processes, in two modes:
+
+  - independent: each worker is a fresh interpreter (spawn) that imports
+    torch, loads its own SemMeanSizeCNN and keeps torch's default thread
+    count (all cores), like N uvicorn/gunicorn workers without preloading
+  - prefork: the parent runs prediction.prefork.preload() and forks the
+    workers, which share its heap copy-on-write and call configure_worker()
+    to split the cores (the gunicorn.conf.py mode)
+
+Every worker runs batch-1 forward passes for --duration seconds after a
+common start barrier. Reported per mode and worker count: total images/s,
+mean RSS, and total PSS (proportional set size from /proc/self/smaps_rollup,
+i.e. shared pages split between the processes that map them, parent
+included), which is the real memory footprint. PSS is Linux-only.
+
+Example:
+    python benchmarks/bench_prefork.py --workers 1 2 4 8 --duration 10
+"""
+import argparse
+import multiprocessing as mp
+import time
+
+from common import environment_info, setup_django, write_json
+
+
+def memory_mb() -> dict:
+    """RSS / PSS / USS of this process in MB (RSS only when smaps_rollup is unavailable)."""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            fields = {
+                line.split(":")[0]: int(line.split()[1])
+                for line in f if line.split()[-1] == "kB"
+            }
+    except OSError:
+        import resource
+        return {"rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024}
+    return {
+        "rss_mb": fields["Rss"] / 1024,
+        "pss_mb": fields["Pss"] / 1024,
+        "uss_mb": (fields["Private_Clean"] + fields["Private_Dirty"]) / 1024,
+    }
+
+
+def _worker(mode: str, workers: int, barrier, results, duration: float):
+    import torch
+
+    if mode == "independent":
+        setup_django(temp_db=False)
+    from prediction.model_server import model_server
+    from prediction.prefork import configure_worker
+
+    if mode == "prefork":
+        configure_worker(workers)
+
+    served = model_server.current()
+    images = torch.randn(1, 1, 480, 480)
+    with torch.no_grad():
+        served.model(images)
+        barrier.wait()
+        n = 0
+        t0 = time.perf_counter()
+        while time.perf_counter() - t0 < duration:
+            served.model(images)
+            n += 1
+        elapsed = time.perf_counter() - t0
+
+    results.put({"images": n, "seconds": elapsed, "threads": torch.get_num_threads(), **memory_mb()})
+
+
+def run_mode(mode: str, workers: int, duration: float = 5.0) -> dict:
+    ctx = mp.get_context("spawn" if mode == "independent" else "fork")
+    barrier = ctx.Barrier(workers)
+    results = ctx.Queue()
+    procs = [ctx.Process(target=_worker, args=(mode, workers, barrier, results, duration)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+    stats = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+
+    parent = memory_mb()
+    out = {
+        "images_per_s": sum(s["images"] / s["seconds"] for s in stats),
+        "threads_per_worker": stats[0]["threads"],
+        "rss_mb_per_worker": sum(s["rss_mb"] for s in stats) / workers,
+    }
+    if "pss_mb" in parent:
+        out["total_pss_mb"] = parent["pss_mb"] + sum(s["pss_mb"] for s in stats)
+        out["uss_mb_per_worker"] = sum(s["uss_mb"] for s in stats) / workers
+    return out
+
+
+def run(worker_counts=(1, 2, 4), duration: float = 5.0) -> dict:
+    setup_django(temp_db=False)
+
+    results = {}
+    # Independent workers first: preload() below makes this process heavy.
+    for workers in worker_counts:
+        results[f"independent_{workers}"] = run_mode("independent", workers, duration)
+
+    from prediction.prefork import preload
+    preload()
+    for workers in worker_counts:
+        results[f"prefork_{workers}"] = run_mode("prefork", workers, duration)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pre-fork vs. independent inference workers.")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--duration", type=float, default=5.0, help="Seconds of forward passes per worker.")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(worker_counts=args.workers, duration=args.duration)
+    print(f"{'mode':>12} {'workers':>7} | {'threads':>7} {'images/s':>9} | "
+          f"{'RSS MB/worker':>13} {'USS MB/worker':>13} {'total PSS MB':>12}")
+    for key, r in results.items():
+        mode, workers = key.rsplit("_", 1)
+        print(
+            f"{mode:>12} {workers:>7} | {r['threads_per_worker']:>7} {r['images_per_s']:>9.1f} | "
+            f"{r['rss_mb_per_worker']:>13.0f} {r.get('uss_mb_per_worker', float('nan')):>13.0f} "
+            f"{r.get('total_pss_mb', float('nan')):>12.0f}"
+        )
+
+    write_json({"environment": environment_info(), "prefork": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Structured channel pruning (src/ml/prune.py): latency vs. accuracy.
+
+Trains a SemMeanSizeCNN briefly on synthetic 480x480 images (decoded up
+front), then prunes it at several sparsity levels, fine-tunes each pruned
+model for --epochs epochs and reports parameters, batch-1 CPU forward
+latency, speedup and validation MAE before/after fine-tuning, marking the
+accuracy/latency Pareto front. Synthetic labels make the MAE values a
+sanity check of the pipeline, not of real accuracy; the latencies carry over.
+
+Example:
+    python benchmarks/bench_prune.py --sparsity 0.25 0.5 0.75 --blocks 0 1 2 3
+"""
+import argparse
+
+from bench_finetune import _decoded
+from common import add_src_paths, environment_info, write_json
+
+
+def run(n_images: int = 48, sparsities=(0.25, 0.5, 0.75), blocks=(0, 1, 2, 3), criterion: str = "bn",
+        base_epochs: int = 2, epochs: int = 1, batch_size: int = 4, latency_min_time: float = 1.0) -> dict:
+    add_src_paths()
+    import torch
+    import torch.nn as nn
+    from torch.utils.data import DataLoader, random_split
+    from model import create_model
+    from prune import sweep
+    from train import train_one_epoch
+
+    torch.manual_seed(0)
+    device = torch.device("cpu")
+    dataset = _decoded(n_images, seed=0)
+    n_val = n_test = max(1, n_images // 6)
+    train, val, test = random_split(
+        dataset, [n_images - n_val - n_test, n_val, n_test], generator=torch.Generator().manual_seed(42),
+    )
+    train_loader = DataLoader(train, batch_size=batch_size, shuffle=True)
+    val_loader, test_loader = DataLoader(val, batch_size=batch_size), DataLoader(test, batch_size=batch_size)
+
+    model = create_model(device=device)
+    optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+    for _ in range(base_epochs):
+        train_one_epoch(model, train_loader, nn.MSELoss(), optimizer, device)
+
+    rows = sweep(
+        model, sparsities, train_loader, val_loader, test_loader, device,
+        blocks=blocks, criterion=criterion, epochs=epochs, latency_min_time=latency_min_time,
+    )
+    return {
+        f"sparsity_{round(row['sparsity'] * 100):02d}": {
+            name: row[name]
+            for name in ("channels", "parameters", "latency_ms", "speedup", "val_mae_pruned", "val_mae", "pareto")
+        }
+        for row in rows
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Channel pruning latency/accuracy benchmark.")
+    parser.add_argument("--images", type=int, default=48, help="Synthetic images (train/val/test split 4:1:1).")
+    parser.add_argument("--sparsity", type=float, nargs="+", default=[0.25, 0.5, 0.75])
+    parser.add_argument("--blocks", type=int, nargs="+", default=[0, 1, 2, 3], help="ConvBlocks whose outputs are pruned.")
+    parser.add_argument("--criterion", choices=["bn", "l1"], default="bn")
+    parser.add_argument("--base-epochs", type=int, default=2, help="Training epochs of the model before pruning.")
+    parser.add_argument("--epochs", type=int, default=1, help="Fine-tune epochs per sparsity level.")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(args.images, args.sparsity, args.blocks, args.criterion, args.base_epochs, args.epochs)
+    print(f"{'sparsity':>8} {'channels':>24} {'params':>9} {'ms':>8} {'speedup':>7} {'MAE cut':>9} {'val MAE':>9}  pareto")
+    for name, r in results.items():
+        print(f"{name[9:]:>8} {str(tuple(r['channels'])):>24} {r['parameters']:>9,} {r['latency_ms']:>8.1f} "
+              f"{r['speedup']:>6.2f}x {r['val_mae_pruned']:>9.3f} {r['val_mae']:>9.3f}  {'*' if r['pareto'] else ''}")
+
+    write_json({"environment": environment_info(), "prune": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""
+k-NN search over stored prediction embeddings (prediction.similarity).
+
+Builds EmbeddingIndex over n synthetic clustered 256-d float16 embeddings
+(added in batches, the way a user's history grows) and reports build time,
+memory per row, and query latency and recall@k of the exact scan vs. IVF.
+Recall is measured against the exact results.
+
+Example:
+    python benchmarks/bench_similarity.py --sizes 10000 100000 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+
+from common import environment_info, setup_django, write_json
+
+
+DIM = 256
+ADD_BATCH = 100_000
+
+
+def clustered_embeddings(n: int, n_clusters: int = 500, seed: int = 0) -> np.ndarray:
+    """(n, 256) float16: Gaussian blobs, like embeddings of similar micrographs."""
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_clusters, DIM)).astype(np.float32)
+    out = np.empty((n, DIM), dtype=np.float16)
+    for start in range(0, n, ADD_BATCH):
+        m = min(ADD_BATCH, n - start)
+        noise = rng.standard_normal((m, DIM), dtype=np.float32)
+        out[start:start + m] = centers[rng.integers(0, n_clusters, m)] + 0.5 * noise
+    return out
+
+
+def time_queries(index, queries, k: int) -> tuple[float, list]:
+    """(median ms per query, results)."""
+    results, times = [], []
+    for query in queries:
+        t0 = time.perf_counter()
+        results.append(index.search(query, k)[0])
+        times.append(time.perf_counter() - t0)
+    return float(np.median(times) * 1000), results
+
+
+def run(sizes=(10_000, 100_000), k: int = 10, n_queries: int = 50, nprobe: int = 16) -> dict:
+    setup_django(temp_db=False)
+    from prediction.similarity import EmbeddingIndex
+
+    results = {}
+    for n in sizes:
+        vectors = clustered_embeddings(n)
+        ids = np.arange(n)
+        rng = np.random.default_rng(1)
+        queries = vectors[rng.choice(n, n_queries, replace=False)].astype(np.float32)
+        queries += 0.1 * rng.standard_normal(queries.shape, dtype=np.float32)
+
+        exact = EmbeddingIndex(ivf_min=n + 1)
+        t0 = time.perf_counter()
+        for start in range(0, n, ADD_BATCH):
+            exact.add(ids[start:start + ADD_BATCH], vectors[start:start + ADD_BATCH])
+        exact_build = time.perf_counter() - t0
+        exact_ms, truth = time_queries(exact, queries, k)
+        del exact
+
+        ivf = EmbeddingIndex(ivf_min=min(n, 100_000), nprobe=nprobe)
+        t0 = time.perf_counter()
+        for start in range(0, n, ADD_BATCH):
+            ivf.add(ids[start:start + ADD_BATCH], vectors[start:start + ADD_BATCH])
+        ivf_build = time.perf_counter() - t0
+        ivf_ms, found = time_queries(ivf, queries, k)
+        n_lists = len(ivf._centroids)
+        del ivf
+
+        recall = np.mean([len(set(a) & set(b)) / k for a, b in zip(truth, found)])
+        results[f"n_{n}"] = {
+            "exact_build_s": exact_build,
+            "exact_query_ms": exact_ms,
+            "ivf_build_s": ivf_build,
+            "ivf_query_ms": ivf_ms,
+            "ivf_lists": n_lists,
+            f"ivf_recall_at_{k}": float(recall),
+            "bytes_per_row": DIM * 2 + 8,
+        }
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Embedding similarity search benchmark.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000], help="Index sizes.")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(sizes=args.sizes, k=args.k, n_queries=args.queries, nprobe=args.nprobe)
+    print(f"{'rows':>10} | {'exact build s':>13} {'query ms':>9} | {'IVF build s':>11} {'lists':>6} "
+          f"{'query ms':>9} {'recall@' + str(args.k):>9}")
+    for name, r in results.items():
+        print(f"{name[2:]:>10} | {r['exact_build_s']:>13.2f} {r['exact_query_ms']:>9.2f} | {r['ivf_build_s']:>11.2f} "
+              f"{r['ivf_lists']:>6} {r['ivf_query_ms']:>9.2f} {r[f'ivf_recall_at_{args.k}']:>9.3f}")
+
+    write_json({"environment": environment_info(), "similarity": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
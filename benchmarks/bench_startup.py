@@ -0,0 +1,124 @@
+"""
+Start-up cost of the Django backend, measured with `python -X importtime`
+in fresh interpreters:
+
+  - urls: django.setup() + importing the URLconf, which every web worker and
+    every manage.py command that runs system checks (migrate, runserver,
+    check, ...) pays. torch must not show up here.
+  - ml: importing the ML stack used for inference (infer + ensemble), which
+    is deferred to the first prediction or to SEM_WARMUP.
+  - manage_check: wall time of `python manage.py check`.
+  - warm_up: prediction.inference.warm_up() (ML imports + model load + one
+    forward pass), i.e. what SEM_WARMUP=1 adds to a worker's boot.
+
+Each is the minimum over --repeats runs (the first run also pays a cold page
+cache). Example:
+    python benchmarks/bench_startup.py --repeats 5 --top 10
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+from common import BACKEND_DIR, ML_DIR, environment_info, write_json
+
+
+_DJANGO_SETUP = (
+    "import os; os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'sem_backend.settings'); "
+    "import django; django.setup(); "
+)
+SNIPPETS = {
+    "urls": _DJANGO_SETUP + "import sem_backend.urls",
+    "ml": f"import sys; sys.path.append({str(ML_DIR)!r}); import infer, ensemble",
+}
+
+
+def parse_importtime(stderr: str) -> list[tuple[str, int, int]]:
+    """(module, self_us, cumulative_us) for every line of -X importtime output."""
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def _run(args: list[str]) -> tuple[float, str]:
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, *args], cwd=BACKEND_DIR, env=os.environ.copy(),
+        capture_output=True, text=True, check=True,
+    )
+    return time.perf_counter() - t0, proc.stderr
+
+
+def measure_imports(snippet: str, repeats: int = 3) -> dict:
+    best = None
+    for _ in range(repeats):
+        _, stderr = _run(["-X", "importtime", "-c", snippet])
+        rows = parse_importtime(stderr)
+        # Top-level imports (no indentation) add up to the total import time.
+        total_us = sum(cum for name, _, cum in rows if not name.startswith(" "))
+        if best is None or total_us < best["total_us"]:
+            best = {"total_us": total_us, "rows": rows}
+
+    rows = best["rows"]
+    modules = {name.strip() for name, _, _ in rows}
+    return {
+        "import_ms": best["total_us"] / 1000,
+        "modules": len(modules),
+        "imports_torch": int("torch" in modules),
+        "top": sorted(((name.strip(), cum) for name, _, cum in rows), key=lambda r: -r[1]),
+    }
+
+
+def measure_wall(args: list[str], repeats: int = 3) -> float:
+    return min(_run(args)[0] for _ in range(repeats))
+
+
+def run(repeats: int = 3, top: int = 0) -> dict:
+    results = {}
+    for name, snippet in SNIPPETS.items():
+        stats = measure_imports(snippet, repeats)
+        top_rows = stats.pop("top")
+        if top:
+            stats["slowest"] = {module: cum / 1000 for module, cum in top_rows[:top]}
+        results[f"{name}_import_ms"] = stats["import_ms"]
+        results[f"{name}_modules"] = stats["modules"]
+        results[f"{name}_imports_torch"] = stats["imports_torch"]
+        if top:
+            results[f"{name}_slowest_ms"] = stats["slowest"]
+
+    results["manage_check_s"] = measure_wall(["manage.py", "check"], repeats)
+    results["warm_up_s"] = min(
+        float(_run(["-c", _DJANGO_SETUP + "from prediction.inference import warm_up; "
+                    "import sys; print(warm_up(), file=sys.stderr)"])[1].strip().splitlines()[-1])
+        for _ in range(repeats)
+    )
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Backend start-up / import time benchmark.")
+    parser.add_argument("--repeats", type=int, default=3, help="Fresh interpreters per measurement (min is kept).")
+    parser.add_argument("--top", type=int, default=0, help="Also list the N slowest imports (cumulative).")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(repeats=args.repeats, top=args.top)
+    for name in SNIPPETS:
+        torch_note = "imports torch" if results[f"{name}_imports_torch"] else "no torch"
+        print(f"{name:>5}: {results[f'{name}_import_ms']:8.1f} ms, "
+              f"{results[f'{name}_modules']:5d} modules ({torch_note})")
+        for module, ms in results.get(f"{name}_slowest_ms", {}).items():
+            print(f"         {ms:8.1f} ms  {module}")
+    print(f"manage.py check: {results['manage_check_s']:.2f} s")
+    print(f"warm_up():       {results['warm_up_s']:.2f} s")
+
+    write_json({"environment": environment_info(), "startup": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Multipart parsing of /api/predict/ uploads with Django's default upload
+handlers vs. prediction.upload_handlers.ImageUploadHandler.
+
+For valid noise PNGs of increasing size it reports parse time (for the
+streaming handler this includes hashing and decoding the image) and the
+peak Python heap during the parse (tracemalloc: the default handlers keep
+uploads under FILE_UPLOAD_MAX_MEMORY_SIZE in memory; the streaming handler
+should stay flat). For a non-image body it reports how many bytes are read
+before the upload is rejected.
+
+Example:
+    python benchmarks/bench_upload.py --sides 480 1024 2048 4096
+"""
+import argparse
+import io
+import time
+import tracemalloc
+
+from common import environment_info, setup_django, write_json
+
+
+BOUNDARY = "sem-bench-boundary"
+
+
+def multipart_body(data: bytes, name: str = "sem.png") -> bytes:
+    return (
+        f"--{BOUNDARY}\r\n"
+        f'Content-Disposition: form-data; name="image"; filename="{name}"\r\n'
+        "Content-Type: image/png\r\n\r\n"
+    ).encode() + data + f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+class CountingStream(io.BytesIO):
+    def __init__(self, data: bytes):
+        super().__init__(data)
+        self.bytes_read = 0
+
+    def read(self, size=-1):
+        chunk = super().read(size)
+        self.bytes_read += len(chunk)
+        return chunk
+
+
+def parse(body: bytes, streaming: bool) -> tuple[float, float, int, object]:
+    """(seconds, peak Python heap MB, bytes read, uploaded file or None)."""
+    from django.http import HttpRequest
+    from django.http.multipartparser import MultiPartParser
+    from prediction.upload_handlers import ImageUploadHandler
+
+    request = HttpRequest()
+    stream = CountingStream(body)
+    meta = {"CONTENT_TYPE": f"multipart/form-data; boundary={BOUNDARY}", "CONTENT_LENGTH": str(len(body))}
+    handlers = [ImageUploadHandler(request)] if streaming else request.upload_handlers
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    _, files = MultiPartParser(meta, stream, handlers).parse()
+    elapsed = time.perf_counter() - t0
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    uploaded = files.get("image")
+    if uploaded is not None:
+        uploaded.close()
+    return elapsed, peak / 1e6, stream.bytes_read, uploaded
+
+
+def run(sides=(480, 1024, 2048)) -> dict:
+    setup_django(temp_db=False)
+    from PIL import Image
+
+    results = {}
+    for side in sides:
+        buffer = io.BytesIO()
+        Image.effect_noise((side, side), 40).save(buffer, format="PNG")
+        body = multipart_body(buffer.getvalue())
+        row = {"upload_mb": len(body) / 1e6}
+        for mode, streaming in (("default", False), ("streaming", True)):
+            seconds, peak_mb, _, _ = parse(body, streaming)
+            row[f"{mode}_parse_ms"] = seconds * 1000
+            row[f"{mode}_peak_mb"] = peak_mb
+        results[f"png_{side}"] = row
+
+    garbage = multipart_body(b"\0" * (8 * 1024 * 1024), name="not_an_image.png")
+    row = {"upload_mb": len(garbage) / 1e6}
+    for mode, streaming in (("default", False), ("streaming", True)):
+        parse(garbage, streaming)  # first rejection imports the remaining PIL plugins
+        seconds, _, bytes_read, _ = parse(garbage, streaming)
+        row[f"{mode}_parse_ms"] = seconds * 1000
+        row[f"{mode}_read_mb"] = bytes_read / 1e6
+    results["invalid_8mb"] = row
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming upload handler benchmark.")
+    parser.add_argument("--sides", type=int, nargs="+", default=[480, 1024, 2048], help="PNG side lengths.")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+
+    results = run(sides=args.sides)
+    print(f"{'upload':>12} {'MB':>6} | {'default ms':>10} {'peak MB':>8} | {'streaming ms':>12} {'peak MB':>8}")
+    for name, r in results.items():
+        if name.startswith("png_"):
+            print(f"{name:>12} {r['upload_mb']:>6.1f} | {r['default_parse_ms']:>10.1f} {r['default_peak_mb']:>8.2f} | "
+                  f"{r['streaming_parse_ms']:>12.1f} {r['streaming_peak_mb']:>8.2f}")
+    r = results["invalid_8mb"]
+    print(f"non-image {r['upload_mb']:.1f} MB upload: default reads {r['default_read_mb']:.1f} MB "
+          f"({r['default_parse_ms']:.1f} ms), streaming rejects after {r['streaming_read_mb']:.2f} MB "
+          f"({r['streaming_parse_ms']:.1f} ms)")
+
+    write_json({"environment": environment_info(), "upload": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Shared helpers for the scripts in benchmarks/.
+
+Every benchmark can be run on its own (python benchmarks/<name>.py) and prints
+a human-readable summary; passing --json writes the raw numbers to a file.
+"""
+from pathlib import Path
+import atexit
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+BACKEND_DIR = PROJECT_ROOT / "src" / "backend"
+ML_DIR = PROJECT_ROOT / "src" / "ml"
+
+_temp_dir = None
+
+
+def add_src_paths():
+    """Make src/ml and src/backend importable the same way the app does."""
+    for path in (ML_DIR, BACKEND_DIR):
+        if str(path) not in sys.path:
+            sys.path.insert(0, str(path))
+
+
+def setup_django(temp_db: bool = True):
+    """
+    Configure Django once per process for benchmarks.
+
+    With temp_db=True and the SQLite engine, the database lives in a throwaway
+    directory (removed at exit) and is migrated, so benchmarks never write into
+    the dev database. For SEM_DB_ENGINE=postgres point SEM_DB_NAME at a scratch
+    database before running.
+    """
+    global _temp_dir
+
+    from django.apps import apps
+    if apps.ready:
+        return
+
+    add_src_paths()
+    if temp_db and os.environ.get("SEM_DB_ENGINE", "sqlite").lower() == "sqlite":
+        _temp_dir = tempfile.TemporaryDirectory(prefix="sem-bench-")
+        atexit.register(_temp_dir.cleanup)
+        os.environ["SEM_DB_NAME"] = str(Path(_temp_dir.name) / "bench.sqlite3")
+        os.environ.setdefault("SEM_MEDIA_ROOT", str(Path(_temp_dir.name) / "media"))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "sem_backend.settings")
+
+    import django
+    django.setup()
+
+    if temp_db:
+        from django.core.management import call_command
+        call_command("migrate", verbosity=0, interactive=False)
+
+
+def percentile(values, q: float, scale: float = 1.0) -> float | None:
+    """
+    Nearest-rank percentile (q in [0, 100]) of a list of numbers, times
+    scale (e.g. 1000 for seconds -> ms). None for an empty list, so results
+    files stay valid JSON (see write_json).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    k = max(0, min(len(ordered) - 1, round(q / 100 * (len(ordered) - 1))))
+    return ordered[k] * scale
+
+
+def format_value(value, spec: str) -> str:
+    """format(value, spec), or "-" right-aligned to the same width for None."""
+    if value is None:
+        width = re.match(r"[<>^]?(\d*)", spec).group(1)
+        return format("-", f">{width}")
+    return format(value, spec)
+
+
+def git_commit() -> str | None:
+    try:
+        out = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=PROJECT_ROOT, capture_output=True, text=True, check=True,
+        )
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return out.stdout.strip()
+
+
+def environment_info() -> dict:
+    info = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "git_commit": git_commit(),
+    }
+    try:
+        import torch
+        info["torch"] = torch.__version__
+        info["torch_threads"] = torch.get_num_threads()
+    except ImportError:
+        pass
+    return info
+
+
+def write_json(results: dict, path: str | Path | None):
+    if path is None:
+        return
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    # NaN/Infinity are not JSON; benchmarks report missing values as None
+    path.write_text(json.dumps(results, indent=2, sort_keys=True, allow_nan=False))
+    print(f"Results written to: {path}")
@@ -0,0 +1,257 @@
+"""
+Concurrent load-testing harness for a running backend (python manage.py
+runserver, gunicorn, uvicorn, ...).
+
+It registers N test users, obtains JWTs from /api/token/, seeds one prediction
+per user, then drives a weighted mix of
+
+  predict   POST /api/predict/      (synthetic 480x480 PNG uploads)
+  history   GET  /api/history/      (random min_size/max_size/date filters)
+  image     GET  /api/images/<id>/  (images created during the run)
+
+with asyncio + aiohttp at a fixed arrival rate (open loop, Poisson arrivals)
+or with a fixed number of always-busy clients (closed loop, --rate 0).
+Latency is measured from each request's scheduled start, so queueing inside
+the harness is not hidden. Reports p50/p95/p99 latency, throughput and error
+rates per endpoint.
+
+Examples:
+    python benchmarks/loadtest.py --rate 20 --duration 60 --mix predict=1,history=4,image=4
+    python benchmarks/loadtest.py --rate 0 --concurrency 32 --duration 30 --json load.json
+
+Requires aiohttp (pip install aiohttp).
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+import argparse
+import asyncio
+import datetime as dt
+import random
+import time
+import uuid
+
+import aiohttp
+
+from common import environment_info, format_value, percentile, write_json
+from synthetic import synthetic_png_bytes
+
+
+@dataclass
+class EndpointStats:
+    latencies: list = field(default_factory=list)
+    status_counts: dict = field(default_factory=lambda: defaultdict(int))
+    errors: int = 0
+
+    def record(self, status: int | None, latency: float):
+        self.latencies.append(latency)
+        self.status_counts["exception" if status is None else str(status)] += 1
+        if status is None or status >= 400:
+            self.errors += 1
+
+    def summary(self, duration: float) -> dict:
+        n = len(self.latencies)
+        return {
+            "requests": n,
+            "throughput_per_s": n / duration if duration > 0 else 0.0,
+            "error_rate": self.errors / n if n else 0.0,
+            "latency_ms_p50": percentile(self.latencies, 50, scale=1000),
+            "latency_ms_p95": percentile(self.latencies, 95, scale=1000),
+            "latency_ms_p99": percentile(self.latencies, 99, scale=1000),
+            "status_counts": dict(self.status_counts),
+        }
+
+
+@dataclass
+class VirtualUser:
+    username: str
+    token: str
+    prediction_ids: list = field(default_factory=list)
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+class LoadTest:
+    def __init__(self, args):
+        self.args = args
+        self.base = args.base_url.rstrip("/")
+        self.mix = parse_mix(args.mix)
+        self.stats = defaultdict(EndpointStats)
+        self.users: list[VirtualUser] = []
+        self.pngs = [synthetic_png_bytes(seed=i) for i in range(args.distinct_images)]
+        self.rng = random.Random(args.seed)
+
+    # --- setup -------------------------------------------------------------
+
+    async def create_users(self, session: aiohttp.ClientSession):
+        prefix = self.args.user_prefix or f"load-{uuid.uuid4().hex[:6]}-"
+        for i in range(self.args.users):
+            username = f"{prefix}{i}"
+            payload = {
+                "username": username,
+                "email": f"{username}@loadtest.invalid",
+                "password": self.args.password,
+                "password2": self.args.password,
+            }
+            async with session.post(f"{self.base}/api/register/", json=payload) as resp:
+                if resp.status not in (201, 400):  # 400 = user already exists
+                    raise RuntimeError(f"register {username}: HTTP {resp.status} {await resp.text()}")
+
+            token_payload = {"username": username, "password": self.args.password}
+            async with session.post(f"{self.base}/api/token/", json=token_payload) as resp:
+                if resp.status != 200:
+                    raise RuntimeError(f"token {username}: HTTP {resp.status} {await resp.text()}")
+                self.users.append(VirtualUser(username, (await resp.json())["access"]))
+
+        # Seed one prediction per user so image fetches have something to hit.
+        for user in self.users:
+            await self.do_predict(session, user, record=False)
+
+    # --- operations --------------------------------------------------------
+
+    async def do_predict(self, session, user: VirtualUser, record: bool = True):
+        form = aiohttp.FormData()
+        form.add_field("image", self.rng.choice(self.pngs), filename="load.png", content_type="image/png")
+        async with session.post(f"{self.base}/api/predict/", data=form, headers=user.headers) as resp:
+            if resp.status == 200:
+                user.prediction_ids.append((await resp.json())["id"])
+            else:
+                await resp.read()
+            return resp.status
+
+    async def do_history(self, session, user: VirtualUser):
+        params = {}
+        if self.rng.random() < 0.5:
+            low = self.rng.uniform(0, 100)
+            params.update(min_size=f"{low:.1f}", max_size=f"{low + self.rng.uniform(10, 200):.1f}")
+        if self.rng.random() < 0.3:
+            start = dt.date.today() - dt.timedelta(days=self.rng.randint(0, 30))
+            params["start_date"] = start.isoformat()
+        async with session.get(f"{self.base}/api/history/", params=params, headers=user.headers) as resp:
+            await resp.read()
+            return resp.status
+
+    async def do_image(self, session, user: VirtualUser):
+        if not user.prediction_ids:
+            return await self.do_history(session, user)
+        pk = self.rng.choice(user.prediction_ids)
+        async with session.get(f"{self.base}/api/images/{pk}/", headers=user.headers) as resp:
+            await resp.read()
+            return resp.status
+
+    async def one_request(self, session, scheduled: float):
+        op = self.rng.choices(list(self.mix), weights=list(self.mix.values()))[0]
+        user = self.rng.choice(self.users)
+        handler = {"predict": self.do_predict, "history": self.do_history, "image": self.do_image}[op]
+        try:
+            status = await handler(session, user)
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            status = None
+        self.stats[op].record(status, time.perf_counter() - scheduled)
+
+    # --- drivers -----------------------------------------------------------
+
+    async def open_loop(self, session, deadline: float):
+        """Poisson arrivals at --rate req/s; at most --concurrency in flight."""
+        semaphore = asyncio.Semaphore(self.args.concurrency)
+        tasks = set()
+
+        async def guarded(scheduled):
+            async with semaphore:
+                await self.one_request(session, scheduled)
+
+        next_at = time.perf_counter()
+        while next_at < deadline:
+            delay = next_at - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            task = asyncio.create_task(guarded(next_at))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+            next_at += self.rng.expovariate(self.args.rate)
+
+        if tasks:
+            await asyncio.gather(*tasks)
+
+    async def closed_loop(self, session, deadline: float):
+        """--concurrency clients, each sending its next request as soon as the last one returns."""
+        async def client():
+            while time.perf_counter() < deadline:
+                await self.one_request(session, time.perf_counter())
+
+        await asyncio.gather(*(client() for _ in range(self.args.concurrency)))
+
+    async def run(self) -> dict:
+        timeout = aiohttp.ClientTimeout(total=self.args.timeout)
+        connector = aiohttp.TCPConnector(limit=self.args.concurrency * 2)
+        async with aiohttp.ClientSession(timeout=timeout, connector=connector) as session:
+            await self.create_users(session)
+
+            start = time.perf_counter()
+            deadline = start + self.args.duration
+            if self.args.rate > 0:
+                await self.open_loop(session, deadline)
+            else:
+                await self.closed_loop(session, deadline)
+            elapsed = time.perf_counter() - start
+
+        per_endpoint = {op: stats.summary(elapsed) for op, stats in sorted(self.stats.items())}
+        total = EndpointStats()
+        for stats in self.stats.values():
+            total.latencies.extend(stats.latencies)
+            total.errors += stats.errors
+            for code, count in stats.status_counts.items():
+                total.status_counts[code] += count
+        per_endpoint["all"] = total.summary(elapsed)
+        return {"duration_s": elapsed, "endpoints": per_endpoint}
+
+
+def parse_mix(text: str) -> dict[str, float]:
+    mix = {}
+    for part in text.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("predict", "history", "image"):
+            raise argparse.ArgumentTypeError(f"unknown workload '{name}'")
+        mix[name] = float(weight or 1)
+    return mix
+
+
+def print_report(results: dict, args):
+    mode = f"open loop @ {args.rate:g} req/s" if args.rate > 0 else "closed loop"
+    print(f"\n{mode}, concurrency {args.concurrency}, {results['duration_s']:.1f}s\n")
+    print(f"{'endpoint':<9} {'reqs':>7} {'req/s':>8} {'err%':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}  status")
+    for op, s in results["endpoints"].items():
+        statuses = " ".join(f"{code}:{n}" for code, n in sorted(s["status_counts"].items()))
+        print(
+            f"{op:<9} {s['requests']:>7} {s['throughput_per_s']:>8.2f} {s['error_rate'] * 100:>5.1f}% "
+            f"{format_value(s['latency_ms_p50'], '>9.1f')} {format_value(s['latency_ms_p95'], '>9.1f')} "
+            f"{format_value(s['latency_ms_p99'], '>9.1f')}  {statuses}"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mixed-workload load test for the SEM Django API.")
+    parser.add_argument("--base-url", default="http://localhost:8000")
+    parser.add_argument("--users", type=int, default=5, help="Test users to register.")
+    parser.add_argument("--user-prefix", default=None, help="Reuse users with this prefix (default: random).")
+    parser.add_argument("--password", default="Load-Test-Pass-2025!")
+    parser.add_argument("--mix", default="predict=1,history=4,image=4", help="Weighted workload mix.")
+    parser.add_argument("--rate", type=float, default=10.0, help="Arrival rate in req/s; 0 = closed loop.")
+    parser.add_argument("--concurrency", type=int, default=16, help="Max in-flight requests / closed-loop clients.")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds to generate load.")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Per-request timeout in seconds.")
+    parser.add_argument("--distinct-images", type=int, default=4, help="Different synthetic PNGs to upload.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    args = parser.parse_args()
+    parse_mix(args.mix)  # validate early
+
+    results = asyncio.run(LoadTest(args).run())
+    print_report(results, args)
+    write_json({"environment": environment_info(), "config": vars(args), "loadtest": results}, args.json)
+
+
+if __name__ == "__main__":
+    main()
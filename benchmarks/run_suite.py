@@ -0,0 +1,140 @@
+"""
+Run the benchmark suite, write one JSON file per run and optionally compare it
+against a previous run (e.g. from the main branch) to catch regressions.
+
+    python benchmarks/run_suite.py --json bench_results/HEAD.json
+    python benchmarks/run_suite.py --json new.json --compare base.json --threshold 0.10
+
+Metric direction is taken from its name: "*_per_s" / "*speedup" are
+higher-is-better, "*_ms" / "*_s" are lower-is-better; anything else is
+reported but never fails the run. Exit status is 1 when any metric is worse
+than the baseline by more than --threshold (relative).
+"""
+from pathlib import Path
+import argparse
+import json
+import sys
+
+from common import environment_info, format_value, write_json
+
+
+def _suite():
+    import bench_api_predict
+    import bench_db_inserts
+    import bench_finetune
+    import bench_history_serialization
+    import bench_label_store
+    import bench_ml
+    import bench_prune
+    import bench_similarity
+    import bench_startup
+    import bench_upload
+
+    return {
+        "forward": lambda quick: bench_ml.run_forward(
+            batch_sizes=(1, 4) if quick else (1, 4, 8, 16), min_time=0.5 if quick else 2.0,
+        ),
+        "preprocess": lambda quick: bench_ml.run_preprocess(min_time=0.5 if quick else 2.0),
+        "dataset": lambda quick: bench_ml.run_dataset(n_images=32 if quick else 128),
+        "label_store": lambda quick: _flatten(
+            bench_label_store.run(sizes=(10_000,) if quick else (10_000, 1_000_000))
+        ),
+        "train_step": lambda quick: bench_ml.run_train_step(n_images=16 if quick else 64),
+        "eval_step": lambda quick: bench_ml.run_eval_step(n_images=16 if quick else 64, min_time=0.5 if quick else 1.0),
+        "finetune": lambda quick: _flatten(bench_finetune.run(
+            n_old=16 if quick else 64, n_new=8 if quick else 16, epochs=2 if quick else 10, full_epochs=100,
+        )),
+        "prune": lambda quick: _numeric(_flatten(bench_prune.run(
+            n_images=24 if quick else 48, sparsities=(0.5,) if quick else (0.25, 0.5, 0.75),
+            base_epochs=1 if quick else 2, latency_min_time=0.5 if quick else 1.0,
+        ))),
+        "augment": lambda quick: bench_ml.run_augment(min_time=0.5 if quick else 2.0),
+        "ensemble": lambda quick: bench_ml.run_ensemble(
+            n_models=(1, 3), n_views=(1, 8) if quick else (1, 4, 8), min_time=0.5 if quick else 2.0,
+        ),
+        "api_predict": lambda quick: bench_api_predict.run(n_requests=5 if quick else 30),
+        "history_serialization": lambda quick: _flatten(
+            bench_history_serialization.run(row_counts=(1000,) if quick else (1000, 10000))
+        ),
+        "upload": lambda quick: _flatten(bench_upload.run(sides=(480,) if quick else (480, 2048))),
+        "similarity": lambda quick: _flatten(
+            bench_similarity.run(sizes=(10_000,) if quick else (10_000, 100_000), n_queries=20)
+        ),
+        "startup": lambda quick: bench_startup.run(repeats=1 if quick else 3),
+        "db_inserts": lambda quick: _numeric(
+            bench_db_inserts.run(threads=4, rows=50 if quick else 300)
+        ),
+    }
+
+
+def _flatten(nested: dict) -> dict:
+    return {f"{outer}_{inner}": value for outer, d in nested.items() for inner, value in d.items()}
+
+
+def _numeric(d: dict) -> dict:
+    return {k: v for k, v in d.items() if isinstance(v, (int, float)) and not isinstance(v, bool)}
+
+
+def metric_direction(name: str) -> int:
+    """+1 if higher is better, -1 if lower is better, 0 if unknown."""
+    if name.endswith("_per_s") or name.endswith("speedup"):
+        return 1
+    if name.endswith("_ms") or name.endswith("_s") or "_ms_" in name:
+        return -1
+    return 0
+
+
+def compare(current: dict, baseline: dict, threshold: float) -> list[str]:
+    """Return human-readable regression messages (empty when none)."""
+    regressions = []
+    for bench, metrics in current.items():
+        for name, value in metrics.items():
+            base = baseline.get(bench, {}).get(name)
+            direction = metric_direction(name)
+            if base is None or value is None or direction == 0 or base == 0:
+                continue
+            change = (value - base) / abs(base) * direction  # < 0 means worse
+            status = "REGRESSION" if change < -threshold else "ok"
+            print(f"{bench:>22} | {name:<36} {base:12.3f} -> {value:12.3f} ({change:+.1%}) {status}")
+            if status == "REGRESSION":
+                regressions.append(f"{bench}.{name}: {base:.3f} -> {value:.3f} ({change:+.1%})")
+    return regressions
+
+
+def main():
+    suite = _suite()
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare against a baseline.")
+    parser.add_argument("benchmarks", nargs="*", help=f"Any of {', '.join(suite)} (default: all).")
+    parser.add_argument("--quick", action="store_true", help="Smaller sizes for a fast smoke run.")
+    parser.add_argument("--json", type=str, default=None, help="Write results to this JSON file.")
+    parser.add_argument("--compare", type=str, default=None, help="Baseline JSON from an earlier run.")
+    parser.add_argument("--threshold", type=float, default=0.10, help="Allowed relative slowdown (0.10 = 10%%).")
+    args = parser.parse_args()
+
+    unknown = set(args.benchmarks) - set(suite)
+    if unknown:
+        parser.error(f"unknown benchmark(s): {', '.join(sorted(unknown))}")
+
+    results = {}
+    for name in args.benchmarks or suite:
+        print(f"--- {name}")
+        results[name] = suite[name](args.quick)
+        for metric, value in results[name].items():
+            print(f"    {metric:<36} {format_value(value, '12.3f')}")
+
+    write_json({"environment": environment_info(), "quick": args.quick, "results": results}, args.json)
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text())
+        print(f"\n=== Comparison against {args.compare} (threshold {args.threshold:.0%}) ===")
+        regressions = compare(results, baseline.get("results", {}), args.threshold)
+        if regressions:
+            print("\nRegressions:")
+            for line in regressions:
+                print("  -", line)
+            sys.exit(1)
+        print("\nNo regressions beyond threshold.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Synthetic SEM-like data for benchmarks: 480x480 grayscale PNGs with random
+bright blobs on a noisy background, plus a labels CSV in the same format as
+data/raw/sem_mean_sizes.csv (filename, mean_size_nm).
+"""
+from pathlib import Path
+import io
+
+import numpy as np
+from PIL import Image
+
+
+IMAGE_SIZE = 480
+
+
+def synthetic_image(rng: np.random.Generator, size: int = IMAGE_SIZE) -> tuple[Image.Image, float]:
+    """Return a grayscale image and the mean blob diameter in pixels."""
+    img = rng.normal(60, 12, size=(size, size))
+    yy, xx = np.mgrid[0:size, 0:size]
+    n_particles = int(rng.integers(20, 60))
+    radius_mean = float(rng.uniform(3, 20))
+    diameters = []
+    for _ in range(n_particles):
+        r = max(1.0, rng.normal(radius_mean, radius_mean * 0.15))
+        cy, cx = rng.uniform(0, size, 2)
+        img[(yy - cy) ** 2 + (xx - cx) ** 2 <= r * r] = rng.uniform(170, 230)
+        diameters.append(2 * r)
+    img = np.clip(img, 0, 255).astype(np.uint8)
+    return Image.fromarray(img, mode="L"), float(np.mean(diameters))
+
+
+def synthetic_png_bytes(seed: int = 0, size: int = IMAGE_SIZE) -> bytes:
+    img, _ = synthetic_image(np.random.default_rng(seed), size)
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_synthetic_dataset(root: str | Path, n_images: int = 64, seed: int = 0) -> tuple[Path, Path]:
+    """
+    Write n_images PNGs to root/images and root/sem_mean_sizes.csv.
+    Returns (csv_path, images_dir). Existing files are reused.
+    """
+    root = Path(root)
+    images_dir = root / "images"
+    csv_path = root / "sem_mean_sizes.csv"
+    images_dir.mkdir(parents=True, exist_ok=True)
+
+    rng = np.random.default_rng(seed)
+    rows = ["filename,mean_size_nm"]
+    for i in range(n_images):
+        filename = f"synthetic_{i:06d}.png"
+        img, diameter_px = synthetic_image(rng)
+        img_path = images_dir / filename
+        if not img_path.exists():
+            img.save(img_path, format="PNG")
+        rows.append(f"{filename},{diameter_px * 2.5:.3f}")  # pretend 2.5 nm per pixel
+
+    csv_path.write_text("\n".join(rows) + "\n")
+    return csv_path, images_dir
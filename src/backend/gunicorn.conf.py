@@ -0,0 +1,46 @@
+"""
+Pre-fork WSGI serving (see prediction/prefork.py):
+
+    pip install gunicorn
+    cd src/backend && gunicorn -c gunicorn.conf.py
+
+SEM_WORKERS worker processes (default: one per core) share the model loaded
+by the parent and split the cores between their torch thread pools;
+SEM_WORKER_THREADS request threads per worker share that worker's pool.
+Leave SEM_WARMUP unset here: the parent already warms up in when_ready.
+"""
+import os
+
+wsgi_app = "sem_backend.wsgi:application"
+bind = os.environ.get("SEM_BIND", "0.0.0.0:8000")
+
+
+def _available_cores() -> int:
+    # Same fallback as prediction.prefork.available_cores (not importable
+    # before Django is set up)
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+workers = int(os.environ.get("SEM_WORKERS", str(_available_cores())))
+threads = int(os.environ.get("SEM_WORKER_THREADS", "2"))
+worker_class = "gthread" if threads > 1 else "sync"
+
+# Import Django and the app in the parent so the workers inherit them.
+preload_app = True
+
+
+def when_ready(server):
+    from prediction.prefork import preload
+
+    preload()
+    server.log.info("Model preloaded in the parent, forking %d workers", workers)
+
+
+def post_fork(server, worker):
+    from prediction.prefork import configure_worker
+
+    intra_op, inter_op = configure_worker(workers)
+    server.log.info("Worker %s: %d intra-op / %d inter-op torch threads", worker.pid, intra_op, inter_op)
@@ -1,9 +1,34 @@
 from django.contrib import admin
-from .models import MeanSizePrediction
+from .models import DriftWindow, MeanSizePrediction, PredictionEmbedding, ShadowPrediction
 
 
 @admin.register(MeanSizePrediction)
 class MeanSizePredictionAdmin(admin.ModelAdmin):
-    list_display = ("id", "original_filename", "predicted_mean_size_nm", "created_at")
+    list_display = ("id", "original_filename", "predicted_mean_size_nm", "predicted_std_nm", "model_version", "created_at")
     list_filter = ("created_at",)
-    search_fields = ("original_filename",)
+    search_fields = ("original_filename", "image_sha256")
+
+
+@admin.register(ShadowPrediction)
+class ShadowPredictionAdmin(admin.ModelAdmin):
+    list_display = ("id", "prediction", "model_version", "predicted_mean_size_nm",
+                    "primary_model_version", "primary_mean_size_nm", "forward_ms", "created_at")
+    list_filter = ("model_version", "created_at")
+    list_select_related = ("prediction",)
+    raw_id_fields = ("prediction",)
+
+
+@admin.register(PredictionEmbedding)
+class PredictionEmbeddingAdmin(admin.ModelAdmin):
+    list_display = ("prediction", "user", "model_version")
+    list_filter = ("model_version",)
+    list_select_related = ("prediction", "user")
+    raw_id_fields = ("prediction", "user")
+    exclude = ("vector",)
+
+
+@admin.register(DriftWindow)
+class DriftWindowAdmin(admin.ModelAdmin):
+    list_display = ("id", "model_version", "started_at", "ended_at", "count", "drifted")
+    list_filter = ("model_version", "drifted")
+    exclude = ("sketch",)
@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PredictionConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'prediction'
+
+    def ready(self):
+        from . import authentication, db
+        db.connect_signals()
+        authentication.connect_signals()
@@ -0,0 +1,289 @@
+"""
+Async (ASGI) versions of the predict, history and image endpoints.
+
+Enabled with SEM_ASYNC_VIEWS=1 (see prediction/urls.py) when serving
+sem_backend.asgi:application with an ASGI server, e.g.
+
+    uvicorn sem_backend.asgi:application --workers 2
+
+Under ASGI, Django reads request bodies on the event loop (spooled to a
+temporary file past FILE_UPLOAD_MAX_MEMORY_SIZE) before the view runs, so a
+slow upload costs a coroutine, not a thread. The views keep it that way:
+  - multipart parsing (with upload_handlers.ImageUploadHandler: hashing,
+    validation and decoding), file I/O and the cache-miss user lookup run
+    in threads via sync_to_async
+  - the forward pass runs on a dedicated, bounded inference executor
+    (SEM_INFERENCE_WORKERS threads), so it does not starve the default
+    sync_to_async pool
+  - the similarity index update and the drift monitor also run in
+    threads: no CPU-bound work or lock wait happens on the event loop
+  - MeanSizePrediction queries and the insert use the async ORM
+
+Behaviour (status codes, JSON bodies, throttling, admission control) matches
+the DRF views in views.py. The torch.profiler request window
+(SEM_PROFILE_REQUESTS) is only available on the sync views.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import exceptions
+
+from .authentication import CachedJWTAuthentication
+from .filters import MeanSizePredictionFilter
+from .inference import run_inference
+from .metrics import PREDICTION_STAGE_SECONDS, StageTimer
+from .models import MeanSizePrediction, PredictionEmbedding
+from .renderers import FastJSONRenderer
+from .serializers import HISTORY_VALUE_FIELDS, serialize_history_rows
+from .drift import drift_monitor
+from .shadow import shadow_runner
+from .similarity import encode_embedding, parse_k, similar_predictions, similarity_index
+from .throttling import InferenceRateThrottle, inference_admission
+from .upload_handlers import upload_rejection, use_image_upload_handler
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_inference_executor() -> ThreadPoolExecutor:
+    """Process-wide executor for CPU-bound inference (created on first use)."""
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=settings.SEM_INFERENCE_WORKERS,
+                    thread_name_prefix="sem-inference",
+                )
+    return _executor
+
+
+def _error(detail, status, headers=None) -> JsonResponse:
+    return JsonResponse({"detail": detail}, status=status, headers=headers)
+
+
+async def _authenticate(request):
+    """
+    Run the same JWT authentication as the DRF views and set request.user.
+    Returns an error response, or None on success.
+    """
+    authenticator = CachedJWTAuthentication()
+    try:
+        # Thread: a cache miss queries the user table.
+        result = await sync_to_async(authenticator.authenticate)(request)
+    except exceptions.AuthenticationFailed as e:
+        return _error(e.detail, 401, {"WWW-Authenticate": authenticator.authenticate_header(request)})
+
+    if result is None:
+        return _error(
+            "Authentication credentials were not provided.",
+            401,
+            {"WWW-Authenticate": authenticator.authenticate_header(request)},
+        )
+    request.user, request.auth = result
+    return None
+
+
+@csrf_exempt
+async def predict_mean_size_view(request):
+    """
+    POST /api/predict/ (async)
+    Same contract as views.predict_mean_size_view.
+    """
+    if request.method != "POST":
+        return _error(f'Method "{request.method}" not allowed.', 405, {"Allow": "POST"})
+
+    error = await _authenticate(request)
+    if error is not None:
+        return error
+
+    throttle = InferenceRateThrottle()
+    if not throttle.allow_request(request, None):
+        wait = throttle.wait()
+        return _error(
+            f"Request was throttled. Expected available in {int(wait + 1)} seconds.",
+            429,
+            {"Retry-After": str(int(wait + 1))},
+        )
+
+    if not inference_admission.try_acquire():
+        return JsonResponse(
+            {"error": "Inference capacity exhausted, please retry shortly."},
+            status=503,
+            headers={"Retry-After": str(settings.SEM_INFERENCE_RETRY_AFTER)},
+        )
+    try:
+        return await _predict_mean_size(request)
+    finally:
+        inference_admission.release()
+
+
+async def _predict_mean_size(request):
+    timer = StageTimer()
+
+    use_image_upload_handler(request)
+    with timer.span("upload"):
+        # Multipart parsing reads the spooled body: keep it off the event loop.
+        files = await sync_to_async(lambda: request.FILES, thread_sensitive=False)()
+    uploaded_file = files.get("image")
+
+    rejection = upload_rejection(request)
+    if rejection is not None:
+        return JsonResponse({"error": rejection.message}, status=rejection.status)
+
+    if uploaded_file is None:
+        return JsonResponse(
+            {"error": "No file provided. Please upload an image with field name 'image'."},
+            status=400,
+        )
+
+    loop = asyncio.get_running_loop()
+    try:
+        result = await loop.run_in_executor(
+            get_inference_executor(),
+            partial(run_inference, Path(uploaded_file.temporary_file_path()), timer, image=uploaded_file.image),
+        )
+
+        prediction_obj = MeanSizePrediction(
+            user=request.user,
+            original_filename=uploaded_file.name,
+            image_sha256=uploaded_file.sha256,
+            predicted_mean_size_nm=result.mean_size_nm,
+            predicted_std_nm=result.std_nm,
+            model_version=result.model_version,
+        )
+        with timer.span("media_save"):
+            await sync_to_async(prediction_obj.image.save, thread_sensitive=False)(
+                uploaded_file.name, uploaded_file, save=False,
+            )
+
+        prediction_obj.stage_timings_ms = timer.as_ms()
+        with timer.span("db_insert"):
+            await prediction_obj.asave()
+            embedding_obj = await PredictionEmbedding.objects.acreate(
+                prediction=prediction_obj,
+                user=request.user,
+                model_version=result.embedding_version,
+                vector=encode_embedding(result.embedding),
+            )
+
+    except Exception as e:
+        return JsonResponse({"error": f"Prediction failed: {e}"}, status=500)
+    finally:
+        # Deletes the temporary file now (unless storage already moved it into place)
+        uploaded_file.close()
+
+    timer.observe(PREDICTION_STAGE_SECONDS)
+    # Off the loop: waits for the user's index lock (held by searches) and
+    # may retrain / re-lay out the IVF index (seconds of NumPy work)
+    await sync_to_async(similarity_index.add, thread_sensitive=False)(embedding_obj)
+    # Saves a DriftWindow when this prediction closes one
+    await sync_to_async(drift_monitor.observe)(result)
+    shadow_runner.maybe_submit(result, prediction_obj)
+
+    response = JsonResponse(
+        {
+            "predicted_mean_size_nm": result.mean_size_nm,
+            "predicted_std_nm": result.std_nm,
+            "id": prediction_obj.id,
+            "created_at": prediction_obj.created_at.isoformat(),
+            "image_url": request.build_absolute_uri(prediction_obj.image.url),
+        },
+        status=200,
+    )
+    if settings.SEM_SERVER_TIMING:
+        response["Server-Timing"] = timer.server_timing_header()
+    return response
+
+
+async def prediction_history_view(request):
+    """
+    GET /api/history/ (async)
+    Same filters and output as views.PredictionHistoryView (without pagination).
+    """
+    if request.method != "GET":
+        return _error(f'Method "{request.method}" not allowed.', 405, {"Allow": "GET"})
+
+    error = await _authenticate(request)
+    if error is not None:
+        return error
+
+    queryset = MeanSizePrediction.objects.filter(user=request.user).order_by('-created_at')
+    filterset = MeanSizePredictionFilter(request.GET, queryset=queryset, request=request)
+    if not filterset.is_valid():
+        return JsonResponse(filterset.errors, status=400)
+
+    rows = [row async for row in filterset.qs.values(*HISTORY_VALUE_FIELDS)]
+    body = FastJSONRenderer().render(serialize_history_rows(rows, request))
+    return HttpResponse(body, content_type="application/json")
+
+
+async def similar_predictions_view(request, pk):
+    """
+    GET /api/history/<pk>/similar/ (async)
+    Same output as views.SimilarPredictionsView.
+    """
+    if request.method != "GET":
+        return _error(f'Method "{request.method}" not allowed.', 405, {"Allow": "GET"})
+
+    error = await _authenticate(request)
+    if error is not None:
+        return error
+
+    prediction = await MeanSizePrediction.objects.filter(pk=pk).only("user_id").afirst()
+    if prediction is None:
+        return _error("No MeanSizePrediction matches the given query.", 404)
+    if prediction.user_id != request.user.pk:
+        return _error("You do not have permission to view this prediction.", 403)
+    try:
+        k = parse_k(request.GET.get("k"))
+    except ValueError as e:
+        return JsonResponse({"k": [str(e)]}, status=400)
+
+    embedding = await PredictionEmbedding.objects.filter(prediction_id=pk).afirst()
+    if embedding is None:
+        return _error("No embedding stored for this prediction.", 404)
+
+    hits = await sync_to_async(similar_predictions)(embedding, k)
+    rows = serialize_history_rows([row for row, _ in hits], request)
+    for row, (_, score) in zip(rows, hits):
+        row["similarity"] = score
+    return HttpResponse(FastJSONRenderer().render(rows), content_type="application/json")
+
+
+async def prediction_image_view(request, pk):
+    """
+    GET /api/images/<pk>/ (async)
+    Streams back the stored image of one of the user's predictions.
+    """
+    if request.method != "GET":
+        return _error(f'Method "{request.method}" not allowed.', 405, {"Allow": "GET"})
+
+    error = await _authenticate(request)
+    if error is not None:
+        return error
+
+    prediction = await MeanSizePrediction.objects.filter(pk=pk).only("user_id", "image").afirst()
+    if prediction is None:
+        return _error("No MeanSizePrediction matches the given query.", 404)
+    if prediction.user_id != request.user.pk:
+        return _error("You do not have permission to view this image.", 403)
+    if not prediction.image:
+        return _error("Image not found for this prediction.", 404)
+
+    # SEM images are small (a few hundred KB): read them in a thread and send
+    # them in one piece instead of feeding a sync file iterator to the loop.
+    def read_image():
+        with prediction.image.open("rb") as f:
+            return f.read()
+
+    data = await sync_to_async(read_image, thread_sensitive=False)()
+    return HttpResponse(data, content_type=f"image/{prediction.image.name.split('.')[-1]}")
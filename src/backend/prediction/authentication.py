@@ -0,0 +1,62 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db.models.signals import post_delete, post_save
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+
+USER_CACHE_ALIAS = "auth"
+
+
+def user_cache_key(user_id) -> str:
+    return f"jwt-user:{user_id}"
+
+
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that keeps recently seen users in a short-TTL,
+    per-process cache (settings.CACHES["auth"]) instead of querying the
+    user table on every authenticated request.
+
+    Saving or deleting a user drops its cache entry; other processes pick up
+    the change once SEM_AUTH_USER_CACHE_TTL expires.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        cache = caches[USER_CACHE_ALIAS]
+        key = user_cache_key(user_id)
+        user = cache.get(key)
+
+        if user is None:
+            user = super().get_user(validated_token)
+            cache.set(key, user, timeout=settings.SEM_AUTH_USER_CACHE_TTL)
+            return user
+
+        # Same checks as JWTAuthentication.get_user, minus the query.
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
+
+
+def invalidate_cached_user(sender, instance, **kwargs):
+    caches[USER_CACHE_ALIAS].delete(user_cache_key(getattr(instance, api_settings.USER_ID_FIELD)))
+
+
+def connect_signals():
+    User = get_user_model()
+    post_save.connect(invalidate_cached_user, sender=User, dispatch_uid="prediction.user_cache_save")
+    post_delete.connect(invalidate_cached_user, sender=User, dispatch_uid="prediction.user_cache_delete")
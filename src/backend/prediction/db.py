@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.db.backends.signals import connection_created
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """
+    Tune every new SQLite connection with the pragmas from settings.SQLITE_PRAGMAS.
+
+    WAL lets readers proceed while one upload is writing, and busy_timeout makes
+    concurrent writers wait for the lock instead of raising "database is locked".
+    """
+    if connection.vendor != "sqlite":
+        return
+
+    pragmas = getattr(settings, "SQLITE_PRAGMAS", {})
+    if not pragmas:
+        return
+
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name} = {value}")
+
+
+def connect_signals():
+    connection_created.connect(apply_sqlite_pragmas, dispatch_uid="prediction.sqlite_pragmas")
@@ -0,0 +1,183 @@
+"""
+Input and prediction drift monitor.
+
+Each prediction adds its image's intensity histogram, its embedding and the
+predicted size to this worker's open window (a drift.DriftSketch from
+src/ml/drift.py: fixed-size arrays, O(1) per prediction). A window is
+closed after SEM_DRIFT_WINDOW_SIZE predictions or on the first prediction
+SEM_DRIFT_WINDOW_SECONDS after it was opened: it is then scored against the
+training-set reference of the model version (PSI / KS / embedding shift)
+and saved as a DriftWindow. Workers save their windows independently;
+/api/drift/ reads the latest windows and merges their sketches, so it never
+scans the prediction history.
+
+The reference of a checkpoint is <checkpoint stem>.drift.npz beside it
+(built with `python src/ml/drift.py --version <version>`), or
+SEM_DRIFT_REFERENCE. Without one, windows are still saved but not scored.
+"""
+from dataclasses import dataclass, field
+from pathlib import Path
+import threading
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import mlpath  # noqa: F401
+from .models import DriftWindow
+
+
+def is_drifted(scores: dict) -> bool:
+    if not scores:
+        return False
+    return (
+        max(scores["intensity_psi"], scores["prediction_psi"]) > settings.SEM_DRIFT_PSI_ALERT
+        or min(scores["intensity_ks_pvalue"], scores["prediction_ks_pvalue"]) < settings.SEM_DRIFT_KS_ALPHA
+        or scores["embedding_shift"] > settings.SEM_DRIFT_EMBEDDING_ALERT
+    )
+
+
+@dataclass
+class _OpenWindow:
+    sketch: object
+    started_at: object = field(default_factory=timezone.now)
+    opened: float = field(default_factory=time.monotonic)
+
+
+class DriftMonitor:
+    def __init__(self):
+        self._windows: dict[str, _OpenWindow] = {}
+        self._references: dict[Path, tuple[int, object]] = {}  # path -> (mtime, sketch)
+        self._reference_paths: dict[str, Path] = {}
+        self._lock = threading.Lock()
+
+    def reference(self, model_version: str):
+        """The DriftSketch of the version's training set, or None if there is none."""
+        from drift import DriftSketch  # type: ignore
+
+        path = Path(settings.SEM_DRIFT_REFERENCE) if settings.SEM_DRIFT_REFERENCE else self._reference_path(model_version)
+        if path is None:
+            return None
+        # Missing files are not cached, and a rebuilt file is reloaded, so a
+        # reference built after start-up is picked up without a restart.
+        try:
+            mtime = path.stat().st_mtime_ns
+        except FileNotFoundError:
+            self._references.pop(path, None)
+            return None
+        cached = self._references.get(path)
+        if cached is None or cached[0] != mtime:
+            cached = self._references[path] = (mtime, DriftSketch.load(path))
+        return cached[1]
+
+    def _reference_path(self, model_version: str) -> Path | None:
+        if model_version not in self._reference_paths:
+            # Not served by this worker yet: a registry version, if it is one
+            from drift import reference_path  # type: ignore
+            from registry import ModelRegistry  # type: ignore
+
+            try:
+                return reference_path(ModelRegistry(settings.SEM_MODEL_REGISTRY).checkpoint_path(model_version))
+            except KeyError:
+                return None
+        return self._reference_paths[model_version]
+
+    def score(self, model_version: str, sketch) -> dict:
+        from drift import compare  # type: ignore
+
+        reference = self.reference(model_version)
+        if reference is None or sketch.count == 0:
+            return {}
+        return compare(reference, sketch)
+
+    def observe(self, result) -> DriftWindow | None:
+        """Add one prediction; returns the DriftWindow if this closed one."""
+        if not settings.SEM_DRIFT_MONITOR or result.intensity_hist is None:
+            return None
+        from drift import DriftSketch, reference_path  # type: ignore
+
+        version = result.embedding_version
+        with self._lock:
+            if result.model_path is not None and version not in self._reference_paths:
+                self._reference_paths[version] = reference_path(result.model_path)
+            window = self._windows.get(version)
+            if window is None:
+                window = self._windows[version] = _OpenWindow(DriftSketch())
+            window.sketch.update(result.intensity_hist, result.embedding, result.mean_size_nm)
+            full = (
+                window.sketch.count >= settings.SEM_DRIFT_WINDOW_SIZE
+                or time.monotonic() - window.opened >= settings.SEM_DRIFT_WINDOW_SECONDS
+            )
+            if not full:
+                return None
+            del self._windows[version]
+        return self._close(version, window)
+
+    def _close(self, model_version: str, window: _OpenWindow) -> DriftWindow:
+        scores = self.score(model_version, window.sketch)
+        return DriftWindow.objects.create(
+            model_version=model_version,
+            started_at=window.started_at,
+            ended_at=timezone.now(),
+            count=window.sketch.count,
+            sketch=window.sketch.to_dict(),
+            scores=scores,
+            drifted=is_drifted(scores),
+        )
+
+    def open_window(self, model_version: str):
+        """(started_at, copy of the sketch) of this worker's open window, or None."""
+        from drift import DriftSketch  # type: ignore
+
+        with self._lock:
+            window = self._windows.get(model_version)
+            if window is None:
+                return None
+            return window.started_at, window.sketch.merge(DriftSketch())
+
+    def latest_version(self) -> str | None:
+        with self._lock:
+            if self._windows:
+                return next(reversed(self._windows))
+        return DriftWindow.objects.order_by("-ended_at").values_list("model_version", flat=True).first()
+
+    def report(self, model_version: str | None = None, windows: int = 24) -> dict:
+        """Scores of the last `windows` saved windows, of this worker's open one, and of all of them merged."""
+        from drift import DriftSketch  # type: ignore
+
+        model_version = model_version or self.latest_version()
+        rows = list(
+            DriftWindow.objects.filter(model_version=model_version)
+            .order_by("-ended_at")
+            .values("started_at", "ended_at", "count", "sketch", "scores", "drifted")[:windows]
+        )
+        combined = DriftSketch()
+        for row in rows:
+            combined = combined.merge(DriftSketch.from_dict(row.pop("sketch")))
+
+        open_window = self.open_window(model_version) if model_version else None
+        current = None
+        if open_window is not None:
+            started_at, sketch = open_window
+            scores = self.score(model_version, sketch)
+            current = {"started_at": started_at, "count": sketch.count, "scores": scores, "drifted": is_drifted(scores)}
+            combined = combined.merge(sketch)
+
+        combined_scores = self.score(model_version, combined)
+        reference = self.reference(model_version) if model_version else None
+        return {
+            "model_version": model_version,
+            "reference_count": reference.count if reference is not None else None,
+            "windows": rows,
+            "open_window": current,
+            "combined": {"count": combined.count, "scores": combined_scores, "drifted": is_drifted(combined_scores)},
+        }
+
+    def clear(self):
+        with self._lock:
+            self._windows.clear()
+            self._references.clear()
+            self._reference_paths.clear()
+
+
+drift_monitor = DriftMonitor()
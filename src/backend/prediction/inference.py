@@ -0,0 +1,188 @@
+"""
+Bridge between the Django views and the PyTorch code in src/ml.
+
+torch, torchvision and the src/ml modules take seconds to import, so nothing
+here imports them at module level: manage.py commands and the auth/history
+endpoints never load them, and an inference worker loads them on its first
+prediction, or at boot with SEM_WARMUP=1 (see warm_up, called from
+sem_backend/wsgi.py and asgi.py). Keep it that way: import ML code inside
+functions. `python benchmarks/bench_startup.py` checks that importing the
+URLconf does not pull in torch.
+"""
+from __future__ import annotations
+
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import TYPE_CHECKING
+import logging
+import threading
+import time
+
+from django.conf import settings
+
+from . import mlpath  # noqa: F401
+from .metrics import StageTimer
+from .model_server import model_server, shadow_model_server
+
+if TYPE_CHECKING:
+    import numpy as np
+    import torch
+
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class InferenceResult:
+    mean_size_nm: float
+    model_version: str
+    std_nm: float | None = None
+    # Preprocessed input, kept for the shadow model (see shadow.py)
+    image_tensor: torch.Tensor | None = field(default=None, repr=False)
+    forward_ms: float | None = None
+    # 256-d global_pool embedding from the served model (see similarity.py)
+    embedding: np.ndarray | None = field(default=None, repr=False)
+    embedding_version: str | None = None
+    # For the drift monitor (see drift.py): pixel counts per intensity bin, served checkpoint
+    intensity_hist: np.ndarray | None = field(default=None, repr=False)
+    model_path: Path | None = None
+
+
+def run_inference(image_path: Path, timer: StageTimer, image=None) -> InferenceResult:
+    """
+    Predict the mean size for one image, recording stage timings on timer.
+    Uses the model held by model_server (registry version or SEM_MODEL_PATH).
+    With SEM_ENSEMBLE_CHECKPOINTS and/or SEM_TTA_VIEWS > 1 the result also
+    carries the standard deviation over all ensemble/TTA predictions.
+    image: the PIL image if it was already decoded (see upload_handlers.py);
+    image_path is only read when it is None.
+    """
+    import torch
+    from torch.profiler import record_function
+    from drift import intensity_histograms  # type: ignore
+    from infer import image_to_tensor, preprocess_image  # type: ignore
+
+    with timer.span("model_load"), record_function("model_load"):
+        served = model_server.current()
+
+    with timer.span("decode"), record_function("decode"):
+        image_tensor = image_to_tensor(image) if image is not None else preprocess_image(Path(image_path))
+        intensity_hist = intensity_histograms(image_tensor)[0]
+
+    if settings.SEM_ENSEMBLE_CHECKPOINTS or settings.SEM_TTA_VIEWS > 1:
+        from ensemble import get_predictor  # type: ignore
+
+        model_paths = settings.SEM_ENSEMBLE_CHECKPOINTS or [served.path]
+        with timer.span("model_load"), record_function("model_load"):
+            predictor = get_predictor(model_paths, tta_views=settings.SEM_TTA_VIEWS)
+        with timer.span("forward"), record_function("forward"), torch.no_grad():
+            mean, std, _ = predictor.predict(image_tensor)
+            # The ensemble members embed into different spaces: the similarity
+            # search uses the served model's embedding (one extra pass).
+            embedding = served.model.embed(image_tensor.to(served.device))
+        version = predictor.version
+        if not settings.SEM_ENSEMBLE_CHECKPOINTS:
+            version = f"{served.version}+tta{settings.SEM_TTA_VIEWS}"
+        return InferenceResult(
+            mean_size_nm=float(mean.item()),
+            model_version=version,
+            std_nm=float(std.item()),
+            image_tensor=image_tensor,
+            forward_ms=timer.stages["forward"] * 1000,
+            embedding=embedding[0].float().cpu().numpy(),
+            embedding_version=served.version,
+            intensity_hist=intensity_hist,
+            model_path=served.path,
+        )
+
+    with timer.span("forward"), record_function("forward"), torch.no_grad():
+        preds, embedding = served.model.forward_with_embedding(image_tensor.to(served.device))
+        mean_size_nm = float(torch.clamp(preds, min=0.0).item())
+
+    return InferenceResult(
+        mean_size_nm=mean_size_nm,
+        model_version=served.version,
+        image_tensor=image_tensor,
+        forward_ms=timer.stages["forward"] * 1000,
+        embedding=embedding[0].float().cpu().numpy(),
+        embedding_version=served.version,
+        intensity_hist=intensity_hist,
+        model_path=served.path,
+    )
+
+
+def warm_up() -> float:
+    """
+    Import the ML stack, load the served (and shadow) model and run one
+    forward pass on a blank image, so the first real request of a worker
+    does not pay for it. Returns the time taken in seconds.
+    """
+    t0 = time.perf_counter()
+    import torch
+
+    served = model_server.current()
+    blank = torch.zeros(1, 1, 480, 480, device=served.device)
+    with torch.no_grad():
+        served.model(blank)
+        if settings.SEM_ENSEMBLE_CHECKPOINTS or settings.SEM_TTA_VIEWS > 1:
+            from ensemble import get_predictor  # type: ignore
+
+            model_paths = settings.SEM_ENSEMBLE_CHECKPOINTS or [served.path]
+            get_predictor(model_paths, tta_views=settings.SEM_TTA_VIEWS).predict(blank.cpu())
+        shadow = shadow_model_server.current() if settings.SEM_SHADOW_MODEL_VERSION else None
+        if shadow is not None:
+            shadow.model(blank.to(shadow.device))
+
+    elapsed = time.perf_counter() - t0
+    logger.info("Inference warm-up done in %.2f s (model %s)", elapsed, served.version)
+    return elapsed
+
+
+class RequestProfiler:
+    """
+    Profiles a window of prediction requests with torch.profiler when
+    SEM_PROFILE_REQUESTS > 0: SEM_PROFILE_SKIP requests are skipped, one is
+    used for warm-up, then SEM_PROFILE_REQUESTS are recorded and the Chrome
+    trace + operator table are written to SEM_PROFILE_DIR (prefix "backend").
+
+    Requests inside the window run one at a time so the trace stays readable;
+    after the window closes this is a no-op.
+    """
+
+    def __init__(self):
+        self._profiler = None
+        self._finished = False
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def request(self):
+        if settings.SEM_PROFILE_REQUESTS <= 0 or self._finished:
+            yield
+            return
+
+        with self._lock:
+            if self._finished:
+                yield
+                return
+            if self._profiler is None:
+                from profiling import StepProfiler  # type: ignore
+
+                self._profiler = StepProfiler(
+                    output_dir=settings.SEM_PROFILE_DIR,
+                    name="backend",
+                    wait=settings.SEM_PROFILE_SKIP,
+                    warmup=1,
+                    active=settings.SEM_PROFILE_REQUESTS,
+                )
+                self._profiler.__enter__()
+            try:
+                yield
+            finally:
+                self._profiler.step()
+                if self._profiler.done:
+                    self._profiler.__exit__(None, None, None)
+                    self._finished = True
+
+
+request_profiler = RequestProfiler()
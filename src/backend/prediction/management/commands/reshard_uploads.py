@@ -0,0 +1,90 @@
+from concurrent.futures import ThreadPoolExecutor
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from prediction.models import MeanSizePrediction
+from prediction.storage import is_sharded, shard_name
+
+
+class Command(BaseCommand):
+    help = (
+        "Move existing sem_uploads files from the old flat layout into the "
+        "hash-sharded directory layout and update MeanSizePrediction.image."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=8, help="Parallel file moves.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Rows updated per DB batch.")
+        parser.add_argument("--dry-run", action="store_true", help="Only report what would move.")
+
+    def handle(self, *args, **options):
+        field = MeanSizePrediction._meta.get_field("image")
+        storage = field.storage
+        upload_dir = field.upload_to
+
+        pending = [
+            (pk, name)
+            for pk, name in MeanSizePrediction.objects.values_list("pk", "image").iterator()
+            if name and not is_sharded(name, upload_dir)
+        ]
+        self.stdout.write(f"{len(pending)} file(s) to re-shard with {options['workers']} worker(s).")
+
+        if options["dry_run"] or not pending:
+            return
+
+        def move(item):
+            pk, name = item
+            try:
+                return pk, self._move_file(storage, name)
+            except FileNotFoundError:
+                return pk, None
+            finally:
+                close_old_connections()
+
+        moved = []
+        missing = 0
+        batch_size = options["batch_size"]
+
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for pk, new_name in pool.map(move, pending):
+                if new_name is None:
+                    missing += 1
+                    continue
+                moved.append(MeanSizePrediction(pk=pk, image=new_name))
+                if len(moved) >= batch_size:
+                    MeanSizePrediction.objects.bulk_update(moved, ["image"])
+                    moved.clear()
+
+        if moved:
+            MeanSizePrediction.objects.bulk_update(moved, ["image"])
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Re-sharded {len(pending) - missing} file(s); {missing} missing on storage."
+        ))
+
+    @staticmethod
+    def _move_file(storage, name: str) -> str:
+        target = storage.get_available_name(shard_name(name))
+
+        # Local filesystem: a rename is much cheaper than copy + delete.
+        try:
+            src_path = storage.path(name)
+            dst_path = storage.path(target)
+        except NotImplementedError:
+            src_path = dst_path = None
+
+        if src_path is not None:
+            if not os.path.exists(src_path):
+                raise FileNotFoundError(src_path)
+            os.makedirs(os.path.dirname(dst_path), exist_ok=True)
+            os.replace(src_path, dst_path)
+            return target
+
+        if not storage.exists(name):
+            raise FileNotFoundError(name)
+        with storage.open(name, "rb") as f:
+            target = storage.save(target, f)
+        storage.delete(name)
+        return target
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Avg, Count, F, Max
+from django.db.models.functions import Abs
+
+from prediction.models import ShadowPrediction
+
+
+class Command(BaseCommand):
+    help = "Compare shadow-model predictions with the served model's (see prediction/shadow.py)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--model-version", type=str, default=None, help="Only this shadow model version.")
+
+    def handle(self, *args, **options):
+        rows = ShadowPrediction.objects.all()
+        if options["model_version"]:
+            rows = rows.filter(model_version=options["model_version"])
+
+        summary = (
+            rows.values("model_version", "primary_model_version")
+            .annotate(
+                n=Count("id"),
+                mean_abs_diff=Avg(Abs(F("predicted_mean_size_nm") - F("primary_mean_size_nm"))),
+                max_abs_diff=Max(Abs(F("predicted_mean_size_nm") - F("primary_mean_size_nm"))),
+                shadow_forward_ms=Avg("forward_ms"),
+                primary_forward_ms=Avg("primary_forward_ms"),
+            )
+            .order_by("model_version", "primary_model_version")
+        )
+
+        if not summary:
+            self.stdout.write("No shadow predictions recorded.")
+            return
+
+        for row in summary:
+            primary_ms = row["primary_forward_ms"]
+            self.stdout.write(
+                f"{row['model_version']} vs {row['primary_model_version']}: n={row['n']}, "
+                f"mean |diff|={row['mean_abs_diff']:.3f} nm, max |diff|={row['max_abs_diff']:.3f} nm, "
+                f"forward {row['shadow_forward_ms']:.1f} ms vs "
+                + (f"{primary_ms:.1f} ms" if primary_ms is not None else "n/a")
+            )
@@ -0,0 +1,17 @@
+import prediction.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0002_meansizeprediction_user'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='meansizeprediction',
+            name='image',
+            field=models.ImageField(storage=prediction.storage.get_upload_storage, upload_to='sem_uploads/'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import migrations
+
+
+# Functional indexes on LOWER(username) / LOWER(email) for the user model, used by
+# EmailOrUsernameModelBackend's case-insensitive login lookup. The user table belongs
+# to another app, so the indexes are created with raw DDL (supported by SQLite >= 3.9
+# and PostgreSQL).
+INDEXES = [
+    ("prediction_user_username_lower", "username"),
+    ("prediction_user_email_lower", "email"),
+]
+
+
+def create_indexes(apps, schema_editor):
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    qn = schema_editor.quote_name
+    table = User._meta.db_table
+    for index_name, field_name in INDEXES:
+        column = User._meta.get_field(field_name).column
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {qn(index_name)} ON {qn(table)} (LOWER({qn(column)}))"
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    qn = schema_editor.quote_name
+    for index_name, _ in INDEXES:
+        schema_editor.execute(f"DROP INDEX IF EXISTS {qn(index_name)}")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0003_meansizeprediction_sharded_storage'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0004_user_lower_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meansizeprediction',
+            name='stage_timings_ms',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
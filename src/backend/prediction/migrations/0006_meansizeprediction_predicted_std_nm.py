@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0005_meansizeprediction_stage_timings_ms'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meansizeprediction',
+            name='predicted_std_nm',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,29 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0006_meansizeprediction_predicted_std_nm'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShadowPrediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(max_length=50)),
+                ('predicted_mean_size_nm', models.FloatField()),
+                ('forward_ms', models.FloatField()),
+                ('primary_model_version', models.CharField(max_length=50)),
+                ('primary_mean_size_nm', models.FloatField()),
+                ('primary_forward_ms', models.FloatField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('prediction', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shadow_predictions', to='prediction.meansizeprediction')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_version', 'created_at'], name='shadow_version_created_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0007_shadowprediction'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='meansizeprediction',
+            name='image_sha256',
+            field=models.CharField(blank=True, db_index=True, max_length=64),
+        ),
+    ]
@@ -0,0 +1,27 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('prediction', '0009_predictionembedding'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DriftWindow',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('model_version', models.CharField(max_length=50)),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('count', models.PositiveIntegerField()),
+                ('sketch', models.JSONField()),
+                ('scores', models.JSONField(default=dict)),
+                ('drifted', models.BooleanField(default=False)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['model_version', 'ended_at'], name='drift_version_ended_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,13 @@
+"""
+Makes the flat modules in src/ml (infer, model, registry, ...) importable.
+Import this before any of them.
+"""
+from pathlib import Path
+import sys
+
+# Small hack to import from src/ml
+CURRENT_FILE = Path(__file__).resolve()
+SRC_DIR = CURRENT_FILE.parents[2]  # .../src
+ML_DIR = SRC_DIR / "ml"
+if str(ML_DIR) not in sys.path:
+    sys.path.append(str(ML_DIR))
@@ -0,0 +1,113 @@
+"""
+In-process model serving with zero-downtime version swaps.
+
+ModelServer keeps the loaded SemMeanSizeCNN in memory (instead of loading
+the checkpoint on every request) and tracks the model registry
+(src/ml/registry.py, SEM_MODEL_REGISTRY):
+
+  - the served version is SEM_MODEL_VERSION if set, else the registry's
+    active version, else SEM_MODEL_PATH (versioned by content hash)
+  - at most every SEM_MODEL_POLL_INTERVAL seconds a request checks whether
+    that changed; the new checkpoint is loaded by that one request while
+    everyone else keeps using the current model, then the reference is
+    swapped in one assignment
+  - callers take a ServedModel snapshot for the whole request, so in-flight
+    requests finish on the model they started with
+
+Switch versions with `python src/ml/registry.py activate <version>`; every
+worker process picks it up within the poll interval.
+
+torch and the model code are imported on the first load, not with this
+module (see inference.py).
+"""
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING
+import threading
+import time
+
+from django.conf import settings
+
+from . import mlpath  # noqa: F401
+
+from registry import ModelRegistry  # type: ignore  # noqa: E402
+
+if TYPE_CHECKING:
+    import torch
+
+
+@dataclass(frozen=True)
+class ServedModel:
+    version: str
+    path: Path
+    model: torch.nn.Module
+    device: torch.device
+
+
+class ModelServer:
+    """
+    version_setting names the setting that pins a registry version. With
+    follow_active=True an empty pin means "the registry's active version"
+    (falling back to SEM_MODEL_PATH); with follow_active=False an empty pin
+    means no model (used for the optional shadow model).
+    """
+
+    def __init__(self, version_setting: str = "SEM_MODEL_VERSION", follow_active: bool = True):
+        self.version_setting = version_setting
+        self.follow_active = follow_active
+        self._served: ServedModel | None = None
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+
+    def _desired(self) -> tuple[str, Path] | None:
+        registry = ModelRegistry(settings.SEM_MODEL_REGISTRY)
+        version = getattr(settings, self.version_setting) or None
+        if version is None and self.follow_active:
+            version = registry.active_version()
+            if version is None:
+                from infer import checkpoint_version  # type: ignore
+
+                path = Path(settings.SEM_MODEL_PATH)
+                return checkpoint_version(path), path
+        if version is None:
+            return None
+        return version, registry.checkpoint_path(version)
+
+    def _refresh(self):
+        self._checked_at = time.monotonic()
+        desired = self._desired()
+        if desired is None:
+            self._served = None
+            return
+        version, path = desired
+        if self._served is None or self._served.version != version:
+            from infer import load_model  # type: ignore
+
+            model, device = load_model(model_path=path)
+            self._served = ServedModel(version=version, path=path, model=model, device=device)
+
+    def current(self) -> ServedModel | None:
+        """The model to use for one request (None only for an unset shadow model)."""
+        due = time.monotonic() - self._checked_at >= settings.SEM_MODEL_POLL_INTERVAL
+        if self._served is None or due:
+            # The first load blocks; later refreshes are done by whichever
+            # request gets the lock, the others keep serving the current model.
+            if self._lock.acquire(blocking=self._served is None):
+                try:
+                    if self._served is None or time.monotonic() - self._checked_at >= settings.SEM_MODEL_POLL_INTERVAL:
+                        self._refresh()
+                finally:
+                    self._lock.release()
+        return self._served
+
+    def reload(self) -> ServedModel | None:
+        """Re-resolve the version right away (e.g. after changing settings or the registry)."""
+        with self._lock:
+            self._refresh()
+        return self._served
+
+
+model_server = ModelServer()
+shadow_model_server = ModelServer("SEM_SHADOW_MODEL_VERSION", follow_active=False)
@@ -1,6 +1,8 @@
 from django.db import models
 from django.contrib.auth import get_user_model 
 
+from .storage import get_upload_storage
+
 User = get_user_model() # Get the currently active user model
 
 class MeanSizePrediction(models.Model):
@@ -10,23 +12,105 @@ class MeanSizePrediction(models.Model):
     # Link to the User model
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='predictions')
 
-    # The uploaded SEM image file (saved in MEDIA_ROOT/sem_uploads/)
-    image = models.ImageField(upload_to="sem_uploads/")
+    # The uploaded SEM image file (saved under sem_uploads/<shard>/<shard>/ by the
+    # storage configured in STORAGES["sem_uploads"])
+    image = models.ImageField(upload_to="sem_uploads/", storage=get_upload_storage)
 
     # Original filename from the upload
     original_filename = models.CharField(max_length=255)
 
+    # SHA-256 of the uploaded bytes, computed while they streamed in
+    image_sha256 = models.CharField(max_length=64, blank=True, db_index=True)
+
     # Model output (mean size in nm)
     predicted_mean_size_nm = models.FloatField()
 
+    # Standard deviation over ensemble members / TTA views (nm); null for a
+    # single-model, single-view prediction
+    predicted_std_nm = models.FloatField(null=True, blank=True)
+
     magnification = models.CharField(max_length=100, blank=True)
     notes = models.TextField(blank=True)
 
-    # For future: if we decide to retrain or change model
+    # Checkpoint that produced the prediction (name + content hash)
     model_version = models.CharField(max_length=50, blank=True)
 
+    # Per-stage latency of the request in ms (upload, model_load, decode, forward,
+    # media_save, total). The DB insert itself is only reported in /metrics.
+    stage_timings_ms = models.JSONField(default=dict, blank=True)
+
     # Auto timestamp when the prediction was created
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self) -> str:
         return f"{self.original_filename} -> {self.predicted_mean_size_nm:.2f} nm"
+
+
+class PredictionEmbedding(models.Model):
+    """
+    The served model's 256-d global_pool embedding of a prediction's image,
+    stored as 512 bytes of little-endian float16 (see similarity.py).
+    Kept out of MeanSizePrediction so history queries never read it.
+    """
+    prediction = models.OneToOneField(
+        MeanSizePrediction, on_delete=models.CASCADE, primary_key=True, related_name='embedding',
+    )
+    # Denormalised from the prediction: the similarity index loads one user's rows at a time
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    # Registry version / checkpoint that produced it; only same-version vectors are comparable
+    model_version = models.CharField(max_length=50)
+    vector = models.BinaryField()
+
+    class Meta:
+        indexes = [models.Index(fields=['user', 'model_version', 'prediction'], name='embedding_user_version_idx')]
+
+    def __str__(self) -> str:
+        return f"Embedding of prediction {self.prediction_id} ({self.model_version})"
+
+
+class ShadowPrediction(models.Model):
+    """
+    Prediction of a candidate (shadow) model on a sampled live request,
+    logged next to the served model's answer for offline comparison.
+    Never returned to users.
+    """
+    prediction = models.ForeignKey(MeanSizePrediction, on_delete=models.CASCADE, related_name='shadow_predictions')
+
+    model_version = models.CharField(max_length=50)
+    predicted_mean_size_nm = models.FloatField()
+    forward_ms = models.FloatField()
+
+    # Served model's output and forward latency for the same input
+    primary_model_version = models.CharField(max_length=50)
+    primary_mean_size_nm = models.FloatField()
+    primary_forward_ms = models.FloatField(null=True, blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['model_version', 'created_at'], name='shadow_version_created_idx')]
+
+    def __str__(self) -> str:
+        return (f"{self.model_version}: {self.predicted_mean_size_nm:.2f} nm "
+                f"vs {self.primary_model_version}: {self.primary_mean_size_nm:.2f} nm")
+
+
+class DriftWindow(models.Model):
+    """
+    Input/prediction statistics of one window of live predictions of one
+    worker process (prediction.drift), with its drift scores against the
+    training-set reference. Windows merge by adding their sketches.
+    """
+    model_version = models.CharField(max_length=50)
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    count = models.PositiveIntegerField()
+    sketch = models.JSONField()            # drift.DriftSketch.to_dict()
+    scores = models.JSONField(default=dict)  # empty when the version has no reference
+    drifted = models.BooleanField(default=False)
+
+    class Meta:
+        indexes = [models.Index(fields=['model_version', 'ended_at'], name='drift_version_ended_idx')]
+
+    def __str__(self) -> str:
+        return f"{self.model_version} {self.started_at:%Y-%m-%d %H:%M} ({self.count} predictions)"
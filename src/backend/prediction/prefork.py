@@ -0,0 +1,84 @@
+"""
+Pre-fork serving: load the model once in the parent, then fork the workers.
+
+With N independent worker processes every one of them imports torch, loads
+its own SemMeanSizeCNN and starts an intra-op thread pool as wide as the
+machine, so N workers run N x cores compute threads and hold N copies of
+the Python/torch heap. In pre-fork mode (gunicorn with preload_app, see
+src/backend/gunicorn.conf.py):
+
+  - preload() runs in the parent: it imports the ML stack, loads the served
+    (and shadow/ensemble) models with one intra-op thread, freezes them
+    (eval, no grad, weights moved to shared memory with share_memory())
+    and calls gc.freeze(), so the children's garbage collector never writes
+    to — and un-shares — the objects they inherited copy-on-write
+  - configure_worker() runs in each child after the fork and gives it
+    cores // workers intra-op threads and one inter-op thread
+
+Models loaded later (a registry version swap) are private to each worker.
+benchmarks/bench_prefork.py reports memory (RSS/PSS) and throughput per
+worker count for this mode and for independently loaded workers.
+"""
+import gc
+import os
+
+from . import mlpath  # noqa: F401
+from .inference import warm_up
+from .model_server import model_server, shadow_model_server
+
+
+def available_cores() -> int:
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:  # not on Linux
+        return os.cpu_count() or 1
+
+
+def thread_partition(workers: int, cores: int | None = None) -> tuple[int, int]:
+    """(intra-op, inter-op) threads per worker so that workers x intra-op <= cores."""
+    cores = available_cores() if cores is None else cores
+    return max(1, cores // max(1, workers)), 1
+
+
+def _freeze(model):
+    model.eval()
+    model.requires_grad_(False)
+    model.share_memory()
+
+
+def preload():
+    """Load and freeze everything the workers will share. Call in the parent, before forking."""
+    import torch
+    from django.conf import settings
+
+    # No intra-op pool in the parent: an OpenMP team created before fork()
+    # is not usable in the children.
+    torch.set_num_threads(1)
+    warm_up()
+
+    _freeze(model_server.current().model)
+    if settings.SEM_SHADOW_MODEL_VERSION:
+        _freeze(shadow_model_server.current().model)
+    if settings.SEM_ENSEMBLE_CHECKPOINTS or settings.SEM_TTA_VIEWS > 1:
+        from ensemble import get_predictor  # type: ignore
+
+        model_paths = settings.SEM_ENSEMBLE_CHECKPOINTS or [model_server.current().path]
+        for model in get_predictor(model_paths, tta_views=settings.SEM_TTA_VIEWS).models:
+            _freeze(model)
+
+    gc.collect()
+    gc.freeze()
+
+
+def configure_worker(workers: int, cores: int | None = None) -> tuple[int, int]:
+    """Set this (forked) worker's share of the cores. Returns (intra-op, inter-op) threads."""
+    import torch
+
+    intra_op, inter_op = thread_partition(workers, cores)
+    torch.set_num_threads(intra_op)
+    try:
+        torch.set_num_interop_threads(inter_op)
+    except RuntimeError:
+        # Can only be set before the inter-op pool is first used.
+        pass
+    return intra_op, inter_op
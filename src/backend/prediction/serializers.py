@@ -5,13 +5,25 @@ from django.contrib.auth import get_user_model
 from .models import MeanSizePrediction
 from django.contrib.auth.backends import ModelBackend
 from django.db.models import Q
+from django.db.models.functions import Lower
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
 
 class EmailOrUsernameModelBackend(ModelBackend):
     def authenticate(self, request, username=None, password=None, **kwargs):
         UserModel = get_user_model()
+        if username is None:
+            username = kwargs.get(UserModel.USERNAME_FIELD)
+        if username is None:
+            return None
         try:
-            # Use __iexact for case-insensitive matching
-            user = UserModel.objects.get(Q(username__iexact=username) | Q(email__iexact=username))
+            # Case-insensitive match written as LOWER(col) = 'value' so it can use
+            # the functional indexes from migration 0004 (__iexact can't).
+            user = (
+                UserModel.objects
+                .alias(username_lower=Lower("username"), email_lower=Lower("email"))
+                .get(Q(username_lower=username.lower()) | Q(email_lower=username.lower()))
+            )
             if user.check_password(password):
                 return user
         except UserModel.DoesNotExist:
@@ -84,6 +96,7 @@ class MeanSizePredictionSerializer(serializers.ModelSerializer):
         fields = [
             'id',
             'predicted_mean_size_nm', # Corrected field name
+            'predicted_std_nm',
             'created_at',
             'image_url',
             'original_filename',
@@ -94,4 +107,53 @@ class MeanSizePredictionSerializer(serializers.ModelSerializer):
         request = self.context.get('request')
         if obj.image and request:
             return request.build_absolute_uri(obj.image.url)
-        return None
\ No newline at end of file
+        return None
+
+
+# Fast path for history listings: works on .values() rows instead of model
+# instances and builds image URLs from one precomputed prefix. The output is
+# identical to MeanSizePredictionSerializer.
+HISTORY_VALUE_FIELDS = (
+    'id', 'predicted_mean_size_nm', 'predicted_std_nm', 'created_at', 'image', 'original_filename',
+)
+
+
+def _format_datetime(value):
+    # Same format as DRF's DateTimeField (ISO 8601, UTC as "Z").
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def image_url_builder(request, storage):
+    """
+    Return a callable mapping a stored image name to its absolute URL.
+
+    For filesystem storage every URL is base_url + quoted name, so the
+    absolute prefix is computed once per request; other backends (e.g. S3
+    with signed URLs) fall back to storage.url() per file. Without a request
+    there is no absolute URL: None, like MeanSizePredictionSerializer.
+    """
+    if request is None:
+        return lambda name: None
+    if isinstance(storage, FileSystemStorage):
+        prefix = request.build_absolute_uri(storage.base_url)
+        return lambda name: prefix + filepath_to_uri(name).lstrip('/')
+    return lambda name: request.build_absolute_uri(storage.url(name))
+
+
+def serialize_history_rows(rows, request):
+    """Serialize MeanSizePrediction .values(*HISTORY_VALUE_FIELDS) rows."""
+    image_url = image_url_builder(request, MeanSizePrediction._meta.get_field('image').storage)
+    return [
+        {
+            'id': row['id'],
+            'predicted_mean_size_nm': row['predicted_mean_size_nm'],
+            'predicted_std_nm': row['predicted_std_nm'],
+            'created_at': _format_datetime(row['created_at']),
+            'image_url': image_url(row['image']) if row['image'] else None,
+            'original_filename': row['original_filename'],
+        }
+        for row in rows
+    ]
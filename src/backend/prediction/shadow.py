@@ -0,0 +1,90 @@
+"""
+Shadow mode: run a candidate model on a sample of live predictions.
+
+With SEM_SHADOW_MODEL_VERSION set to a registry version, a fraction
+SEM_SHADOW_SAMPLE_RATE of successful /api/predict/ requests hand their
+preprocessed input to a single background thread, which runs the candidate
+and stores a ShadowPrediction (its output and forward latency next to the
+served model's). The response never waits for it: when more than
+SEM_SHADOW_MAX_PENDING jobs are queued, new samples are dropped.
+
+Compare with `python manage.py shadow_report`.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from .metrics import SHADOW_PREDICTIONS
+from .model_server import shadow_model_server
+from .models import ShadowPrediction
+
+
+logger = logging.getLogger(__name__)
+
+
+class ShadowRunner:
+    def __init__(self):
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+
+    def _submit(self, fn, *args):
+        # Created by the caller under self._lock (one thread, one pool)
+        return self._executor.submit(fn, *args)
+
+    def maybe_submit(self, result, prediction) -> bool:
+        """Queue a shadow run for a saved prediction; returns whether it was sampled."""
+        if not settings.SEM_SHADOW_MODEL_VERSION or result.image_tensor is None:
+            return False
+        if random.random() >= settings.SEM_SHADOW_SAMPLE_RATE:
+            return False
+
+        with self._lock:
+            if self._pending >= settings.SEM_SHADOW_MAX_PENDING:
+                SHADOW_PREDICTIONS.inc(outcome="dropped")
+                return False
+            self._pending += 1
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="sem-shadow")
+
+        self._submit(self._run, result, prediction.pk)
+        return True
+
+    def _run(self, result, prediction_id):
+        import torch
+
+        try:
+            served = shadow_model_server.current()
+            if served is None:
+                return
+            t0 = time.perf_counter()
+            with torch.no_grad():
+                preds = served.model(result.image_tensor.to(served.device))
+                mean_size_nm = float(torch.clamp(preds, min=0.0).item())
+            forward_ms = (time.perf_counter() - t0) * 1000
+
+            ShadowPrediction.objects.create(
+                prediction_id=prediction_id,
+                model_version=served.version,
+                predicted_mean_size_nm=mean_size_nm,
+                forward_ms=forward_ms,
+                primary_model_version=result.model_version,
+                primary_mean_size_nm=result.mean_size_nm,
+                primary_forward_ms=result.forward_ms,
+            )
+            SHADOW_PREDICTIONS.inc(outcome="ok")
+        except Exception:
+            SHADOW_PREDICTIONS.inc(outcome="error")
+            logger.exception("Shadow prediction failed for prediction %s", prediction_id)
+        finally:
+            with self._lock:
+                self._pending -= 1
+            close_old_connections()
+
+
+shadow_runner = ShadowRunner()
@@ -0,0 +1,287 @@
+"""
+"Find similar micrographs" over a user's prediction history.
+
+Every prediction stores the served model's 256-d global_pool embedding
+(PredictionEmbedding, float16). Similarity is cosine similarity, and only
+embeddings from the same model version are compared (different checkpoints
+embed into different spaces).
+
+EmbeddingIndex is a NumPy k-NN index over L2-normalised float16 rows:
+
+  - exact: one blocked float32 matmul over all rows + argpartition, used
+    while the index has fewer than SEM_SIMILARITY_IVF_MIN rows
+  - IVF: above that, k-means centroids (~sqrt(n) lists) are trained on a
+    sample and the rows are stored grouped by list; a query scans only the
+    SEM_SIMILARITY_NPROBE lists closest to it. Rows added later are assigned
+    a list right away but appended to a tail (a query picks out the tail
+    rows of its lists), which is regrouped into the lists once it grows past
+    a quarter of the index; the centroids are retrained when the index has
+    doubled since training.
+
+SimilarityIndex keeps one EmbeddingIndex per (user, model version) in this
+process, LRU-bounded by SEM_SIMILARITY_CACHE_USERS. It is built from the
+database on first use and then updated incrementally: predictions made by
+this process are added on insert, and every query first pulls in rows with
+a higher primary key (made by other workers). Deleted predictions are
+dropped from the results when the rows are fetched.
+"""
+from collections import OrderedDict
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .models import MeanSizePrediction, PredictionEmbedding
+from .serializers import HISTORY_VALUE_FIELDS
+
+
+EMBEDDING_DIM = 256
+# Rows converted to float32 per matmul block (bounds the temporary memory)
+SCAN_BLOCK = 32768
+
+
+def encode_embedding(vector) -> bytes:
+    """256 floats -> 512 bytes (little-endian float16) for PredictionEmbedding.vector."""
+    return np.asarray(vector, dtype="<f2").reshape(EMBEDDING_DIM).tobytes()
+
+
+def decode_embeddings(blobs) -> np.ndarray:
+    """PredictionEmbedding.vector blobs -> (n, 256) float16."""
+    return np.frombuffer(b"".join(blobs), dtype="<f2").reshape(-1, EMBEDDING_DIM)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32).reshape(-1, EMBEDDING_DIM)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _scan(rows: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Cosine scores of float16 unit rows against a float32 unit query."""
+    scores = np.empty(len(rows), dtype=np.float32)
+    for start in range(0, len(rows), SCAN_BLOCK):
+        block = rows[start:start + SCAN_BLOCK]
+        scores[start:start + len(block)] = block.astype(np.float32) @ query
+    return scores
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, best first."""
+    if len(scores) > k:
+        positions = np.argpartition(-scores, k - 1)[:k]
+    else:
+        positions = np.arange(len(scores))
+    return positions[np.argsort(-scores[positions], kind="stable")]
+
+
+def kmeans(vectors: np.ndarray, n_clusters: int, iterations: int = 8, seed: int = 0) -> np.ndarray:
+    """Spherical k-means on unit float32 rows; returns unit centroids (n_clusters, dim)."""
+    rng = np.random.default_rng(seed)
+    centroids = vectors[rng.choice(len(vectors), n_clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(vectors @ centroids.T, axis=1)
+        sums = np.zeros_like(centroids)
+        np.add.at(sums, assignment, vectors)
+        empty = ~sums.any(axis=1)
+        sums[empty] = vectors[rng.choice(len(vectors), int(empty.sum()))]
+        centroids = _normalize(sums)
+    return centroids
+
+
+class EmbeddingIndex:
+    """Cosine k-NN over int64 ids and 256-d vectors (exact, or IVF once large)."""
+
+    def __init__(self, ivf_min: int = 100_000, nprobe: int = 16, train_sample: int = 64):
+        self.ivf_min = ivf_min
+        self.nprobe = nprobe
+        self.train_sample = train_sample  # rows sampled per centroid for k-means
+        self._ids = np.empty(0, dtype=np.int64)
+        self._rows = np.empty((0, EMBEDDING_DIM), dtype=np.float16)
+        self._size = 0
+        # IVF state: list of every row; rows [0, _offsets[-1]) are grouped by
+        # list, the rest (added since the last layout) is the tail
+        self._centroids = None
+        self._lists = np.empty(0, dtype=np.int32)
+        self._offsets = None
+        self._trained_size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    @property
+    def is_ivf(self) -> bool:
+        return self._centroids is not None
+
+    def add(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64).reshape(-1)
+        rows = _normalize(vectors).astype(np.float16)
+        start, needed = self._size, self._size + len(ids)
+        if needed > len(self._ids):
+            capacity = max(needed, 2 * len(self._ids), 1024)
+            self._ids = np.resize(self._ids, capacity)
+            self._lists = np.resize(self._lists, capacity)
+            grown = np.empty((capacity, EMBEDDING_DIM), dtype=np.float16)
+            grown[:start] = self._rows[:start]
+            self._rows = grown
+        self._ids[start:needed] = ids
+        self._rows[start:needed] = rows
+        self._size = needed
+
+        if self._size >= self.ivf_min and (not self.is_ivf or self._size >= 2 * self._trained_size):
+            self._train()
+        elif self.is_ivf:
+            self._lists[start:needed] = self._assign(rows)
+            if self._size - self._offsets[-1] > self._offsets[-1] // 4:
+                self._layout()
+
+    def _assign(self, rows: np.ndarray) -> np.ndarray:
+        """Nearest centroid of each float16 unit row."""
+        lists = np.empty(len(rows), dtype=np.int32)
+        for start in range(0, len(rows), SCAN_BLOCK):
+            block = rows[start:start + SCAN_BLOCK].astype(np.float32)
+            lists[start:start + len(block)] = np.argmax(block @ self._centroids.T, axis=1)
+        return lists
+
+    def _train(self):
+        n = self._size
+        n_lists = min(int(np.clip(np.sqrt(n), 16, 4096)), n)
+        sample_size = min(n, n_lists * self.train_sample)
+        sample = np.random.default_rng(0).choice(n, sample_size, replace=False)
+        self._centroids = kmeans(self._rows[sample].astype(np.float32), n_lists)
+        self._lists[:n] = self._assign(self._rows[:n])
+        self._trained_size = n
+        self._layout()
+
+    def _layout(self):
+        """Regroup all rows by list (the tail becomes empty)."""
+        n = self._size
+        order = np.argsort(self._lists[:n], kind="stable")
+        self._ids[:n] = self._ids[:n][order]
+        self._rows[:n] = self._rows[:n][order]
+        self._lists[:n] = self._lists[:n][order]
+        counts = np.bincount(self._lists[:n], minlength=len(self._centroids))
+        self._offsets = np.concatenate([[0], np.cumsum(counts)])
+
+    def search(self, query, k: int = 10, exclude_id: int | None = None) -> tuple[np.ndarray, np.ndarray]:
+        """(ids, cosine similarities) of the k nearest rows, best first."""
+        query = _normalize(query)[0]
+        wanted = k + (exclude_id is not None)
+
+        if not self.is_ivf:
+            ids, scores = self._ids[:self._size], _scan(self._rows[:self._size], query)
+        else:
+            lists = _top_k(self._centroids @ query, min(self.nprobe, len(self._centroids)))
+            spans = [(self._offsets[i], self._offsets[i + 1]) for i in lists]
+            grouped = self._offsets[-1]
+            tail = grouped + np.flatnonzero(np.isin(self._lists[grouped:self._size], lists))
+            ids = np.concatenate([self._ids[a:b] for a, b in spans] + [self._ids[tail]])
+            scores = np.concatenate([_scan(self._rows[a:b], query) for a, b in spans]
+                                    + [_scan(self._rows[tail], query)])
+
+        best = _top_k(scores, wanted)
+        ids, scores = ids[best], scores[best]
+        if exclude_id is not None:
+            keep = ids != exclude_id
+            ids, scores = ids[keep], scores[keep]
+        return ids[:k], scores[:k]
+
+
+class _UserIndex:
+    def __init__(self):
+        self.index = EmbeddingIndex(
+            ivf_min=settings.SEM_SIMILARITY_IVF_MIN, nprobe=settings.SEM_SIMILARITY_NPROBE,
+        )
+        self.last_pk = 0
+        # Added on insert but not yet seen by sync() (which reads pk > last_pk)
+        self.added_ahead: set[int] = set()
+        self.lock = threading.Lock()
+
+    def add(self, pk: int, vector: bytes):
+        if pk > self.last_pk and pk not in self.added_ahead:
+            self.index.add([pk], decode_embeddings([vector]))
+            self.added_ahead.add(pk)
+
+    def sync(self, user_id: int, model_version: str):
+        """Pull in rows inserted since the last sync (by any worker)."""
+        rows = (
+            PredictionEmbedding.objects
+            .filter(user_id=user_id, model_version=model_version, pk__gt=self.last_pk)
+            .order_by("pk")
+            .values_list("pk", "vector")
+        )
+        ids, blobs = [], []
+        for pk, vector in rows.iterator(chunk_size=10_000):
+            self.last_pk = pk
+            if pk in self.added_ahead:
+                self.added_ahead.discard(pk)
+                continue
+            ids.append(pk)
+            blobs.append(bytes(vector))
+        if ids:
+            self.index.add(ids, decode_embeddings(blobs))
+
+
+class SimilarityIndex:
+    def __init__(self):
+        self._indexes: OrderedDict[tuple[int, str], _UserIndex] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _entry(self, user_id: int, model_version: str, create: bool = True) -> _UserIndex | None:
+        key = (user_id, model_version)
+        with self._lock:
+            entry = self._indexes.get(key)
+            if entry is not None:
+                self._indexes.move_to_end(key)
+            elif create:
+                entry = self._indexes[key] = _UserIndex()
+                while len(self._indexes) > settings.SEM_SIMILARITY_CACHE_USERS:
+                    self._indexes.popitem(last=False)
+            return entry
+
+    def add(self, embedding: PredictionEmbedding):
+        """Add a just-saved embedding to its user's index, if that index is loaded."""
+        entry = self._entry(embedding.user_id, embedding.model_version, create=False)
+        if entry is None:
+            return
+        with entry.lock:
+            entry.add(embedding.pk, bytes(embedding.vector))
+
+    def search(self, embedding: PredictionEmbedding, k: int = 10) -> list[tuple[int, float]]:
+        """[(prediction id, cosine similarity)] of the user's k most similar predictions."""
+        entry = self._entry(embedding.user_id, embedding.model_version)
+        with entry.lock:
+            entry.sync(embedding.user_id, embedding.model_version)
+            ids, scores = entry.index.search(
+                decode_embeddings([bytes(embedding.vector)])[0], k, exclude_id=embedding.pk,
+            )
+        return [(int(pk), float(score)) for pk, score in zip(ids, scores)]
+
+    def clear(self):
+        with self._lock:
+            self._indexes.clear()
+
+
+similarity_index = SimilarityIndex()
+
+
+def parse_k(value, default: int = 10) -> int:
+    """The ?k= query parameter: 1..SEM_SIMILARITY_MAX_K (ValueError otherwise)."""
+    k = default if value in (None, "") else int(value)
+    if not 1 <= k <= settings.SEM_SIMILARITY_MAX_K:
+        raise ValueError(f"k must be between 1 and {settings.SEM_SIMILARITY_MAX_K}.")
+    return k
+
+
+def similar_predictions(embedding: PredictionEmbedding, k: int = 10) -> list[tuple[dict, float]]:
+    """
+    The k predictions of the same user most similar to embedding's, best first,
+    as (.values(*HISTORY_VALUE_FIELDS) row, cosine similarity) pairs.
+    """
+    hits = similarity_index.search(embedding, k)
+    rows = {
+        row["id"]: row
+        for row in MeanSizePrediction.objects
+        .filter(user_id=embedding.user_id, pk__in=[pk for pk, _ in hits])
+        .values(*HISTORY_VALUE_FIELDS)
+    }
+    return [(rows[pk], score) for pk, score in hits if pk in rows]
@@ -0,0 +1,68 @@
+import hashlib
+import posixpath
+import re
+
+from django.core.files.storage import FileSystemStorage, storages
+
+try:
+    from storages.backends.s3 import S3Storage
+except ImportError:  # django-storages is optional (only needed for SEM_UPLOAD_STORAGE=s3)
+    S3Storage = None
+
+
+# sem_uploads/ab/cd/<filename>: 2 levels of 256 directories = 65,536 leaf dirs
+SHARD_DEPTH = 2
+SHARD_WIDTH = 2
+_SHARD_DIR_RE = re.compile(rf"^[0-9a-f]{{{SHARD_WIDTH}}}$")
+
+
+def shard_name(name: str) -> str:
+    """
+    Map "sem_uploads/foo.png" -> "sem_uploads/3f/a2/foo.png".
+
+    The shard directories come from a hash of the file name, so uploads spread
+    evenly instead of piling up in one flat directory.
+    """
+    dirname, basename = posixpath.split(name)
+    digest = hashlib.sha1(basename.encode("utf-8")).hexdigest()
+    shards = [digest[i * SHARD_WIDTH:(i + 1) * SHARD_WIDTH] for i in range(SHARD_DEPTH)]
+    return posixpath.join(dirname, *shards, basename)
+
+
+def is_sharded(name: str, upload_dir: str = "sem_uploads") -> bool:
+    """True if name already lives in a shard directory below upload_dir."""
+    parts = name.split("/")
+    root = upload_dir.strip("/").split("/")
+    if parts[:len(root)] != root:
+        return False
+    shard_parts = parts[len(root):-1]
+    return len(shard_parts) == SHARD_DEPTH and all(_SHARD_DIR_RE.match(p) for p in shard_parts)
+
+
+class ShardedStorageMixin:
+    """
+    Storage mixin that places every new file in a hash-prefixed subdirectory.
+    Collisions are still resolved by the backend's get_available_name().
+    """
+
+    def generate_filename(self, filename):
+        return shard_name(super().generate_filename(filename))
+
+
+class ShardedFileSystemStorage(ShardedStorageMixin, FileSystemStorage):
+    pass
+
+
+if S3Storage is not None:
+    class ShardedS3Storage(ShardedStorageMixin, S3Storage):
+        pass
+
+
+def get_upload_storage():
+    """
+    Storage used by MeanSizePrediction.image (STORAGES["sem_uploads"] in settings).
+
+    Passed to the field as a callable so the backend can be switched through
+    settings without a new migration.
+    """
+    return storages["sem_uploads"]
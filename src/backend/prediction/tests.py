@@ -6,3 +6,692 @@ class BasicTest(TestCase):
     def test_app_is_working(self):
         self.assertTrue(True)
 
+
+from django.conf import settings
+from django.db import connection
+
+
+class SQLitePragmaTest(TestCase):
+    def test_busy_timeout_applied_on_connect(self):
+        if connection.vendor != "sqlite" or not settings.SQLITE_PRAGMAS:
+            self.skipTest("SQLite WAL profile not active")
+        with connection.cursor() as cursor:
+            cursor.execute("PRAGMA busy_timeout")
+            self.assertEqual(cursor.fetchone()[0], settings.SQLITE_PRAGMAS["busy_timeout"])
+
+
+import shutil
+import tempfile
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import storages
+from django.core.management import call_command
+from django.test import override_settings
+
+from .models import MeanSizePrediction
+from .storage import is_sharded, shard_name
+
+try:
+    import boto3
+    from moto import mock_aws
+    from storages.backends.s3 import S3Storage  # noqa: F401
+    HAS_S3_STACK = True
+except ImportError:
+    HAS_S3_STACK = False
+
+
+class TempMediaMixin:
+    def setUp(self):
+        super().setUp()
+        self.media_root = tempfile.mkdtemp()
+        self.media_override = override_settings(MEDIA_ROOT=self.media_root)
+        self.media_override.enable()
+
+    def tearDown(self):
+        self.media_override.disable()
+        shutil.rmtree(self.media_root, ignore_errors=True)
+        super().tearDown()
+
+
+class ShardedStorageTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.user = get_user_model().objects.create_user(username="alice", password="pw")
+
+    def test_upload_is_sharded(self):
+        prediction = MeanSizePrediction.objects.create(
+            user=self.user,
+            image=ContentFile(b"png-bytes", name="sample.png"),
+            original_filename="sample.png",
+            predicted_mean_size_nm=10.0,
+        )
+        self.assertEqual(prediction.image.name, shard_name("sem_uploads/sample.png"))
+        self.assertTrue(is_sharded(prediction.image.name))
+        self.assertTrue(prediction.image.storage.exists(prediction.image.name))
+
+    def test_reshard_command_moves_flat_files(self):
+        storage = storages["sem_uploads"]
+        flat_name = storage.save("sem_uploads/legacy.png", ContentFile(b"old"))
+        # bypass generate_filename to mimic a pre-sharding row
+        self.assertEqual(flat_name, "sem_uploads/legacy.png")
+        prediction = MeanSizePrediction.objects.create(
+            user=self.user, image=flat_name, original_filename="legacy.png", predicted_mean_size_nm=1.0,
+        )
+
+        call_command("reshard_uploads", "--workers", "2", stdout=StringIO())
+
+        prediction.refresh_from_db()
+        self.assertTrue(is_sharded(prediction.image.name))
+        self.assertFalse(storage.exists(flat_name))
+        with prediction.image.open("rb") as f:
+            self.assertEqual(f.read(), b"old")
+
+
+@skipUnless(HAS_S3_STACK, "boto3, moto and django-storages are required")
+class ShardedS3StorageTest(TestCase):
+    def test_s3_upload_is_sharded(self):
+        config = {
+            "BACKEND": "prediction.storage.ShardedS3Storage",
+            "OPTIONS": {
+                "bucket_name": "sem-test",
+                "region_name": "us-east-1",
+                "access_key": "testing",
+                "secret_key": "testing",
+                "file_overwrite": False,
+            },
+        }
+        with mock_aws():
+            boto3.client("s3", region_name="us-east-1").create_bucket(Bucket="sem-test")
+            with override_settings(STORAGES={**settings.STORAGES, "sem_uploads": config}):
+                storage = storages["sem_uploads"]
+                name = storage.save(storage.generate_filename("sem_uploads/s3.png"), ContentFile(b"x"))
+                self.assertEqual(name, shard_name("sem_uploads/s3.png"))
+                self.assertTrue(storage.exists(name))
+
+
+from django.core.cache import caches
+from django.db.models import Q
+from django.db.models.functions import Lower
+from rest_framework.test import APIClient
+
+from .authentication import USER_CACHE_ALIAS, user_cache_key
+
+
+class EmailOrUsernameLoginTest(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="Alice", email="Alice@Example.com", password="s3cret-pass",
+        )
+        self.client = APIClient()
+
+    def test_login_with_email_is_case_insensitive(self):
+        response = self.client.post("/api/token/", {"username": "alice@example.COM", "password": "s3cret-pass"})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("access", response.json())
+
+    def test_lookup_uses_lower_indexes(self):
+        if connection.vendor != "sqlite":
+            self.skipTest("EXPLAIN QUERY PLAN output is SQLite specific")
+        qs = (
+            get_user_model().objects
+            .alias(username_lower=Lower("username"), email_lower=Lower("email"))
+            .filter(Q(username_lower="alice") | Q(email_lower="alice"))
+        )
+        self.assertIn("prediction_user_username_lower", qs.explain())
+
+
+class CachedJWTAuthenticationTest(TestCase):
+    def setUp(self):
+        caches[USER_CACHE_ALIAS].clear()
+        self.user = get_user_model().objects.create_user(username="bob", password="s3cret-pass")
+        token = self.client.post("/api/token/", {"username": "bob", "password": "s3cret-pass"}).json()["access"]
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {token}")
+
+    def test_user_is_cached_after_first_request(self):
+        self.assertEqual(self.client.get("/api/user/").status_code, 200)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get("/api/user/").json()["username"], "bob")
+
+    def test_saving_user_invalidates_cache(self):
+        self.client.get("/api/user/")
+        self.user.is_active = False
+        self.user.save()
+        self.assertIsNone(caches[USER_CACHE_ALIAS].get(user_cache_key(self.user.pk)))
+        self.assertEqual(self.client.get("/api/user/").status_code, 401)
+
+
+from .metrics import INFERENCE_REQUESTS
+from .throttling import THROTTLE_CACHE_ALIAS, inference_admission
+
+
+class AuthenticatedAPITestCase(TestCase):
+    username = "carol"
+
+    def setUp(self):
+        super().setUp()
+        caches[USER_CACHE_ALIAS].clear()
+        self.user = get_user_model().objects.create_user(username=self.username, password="s3cret-pass")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+
+@override_settings(SEM_INFERENCE_RATE=0.01, SEM_INFERENCE_BURST=2, SEM_INFERENCE_MAX_INFLIGHT=1)
+class InferenceAdmissionTest(AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        caches[THROTTLE_CACHE_ALIAS].clear()
+
+    def test_token_bucket_returns_429_with_retry_after(self):
+        # Requests without an image still consume a token and fail fast with 400.
+        for _ in range(2):
+            self.assertEqual(self.client.post("/api/predict/").status_code, 400)
+
+        shed_before = INFERENCE_REQUESTS.value(outcome="rate_limited")
+        response = self.client.post("/api/predict/")
+        self.assertEqual(response.status_code, 429)
+        self.assertIn("Retry-After", response)
+        self.assertEqual(INFERENCE_REQUESTS.value(outcome="rate_limited"), shed_before + 1)
+
+    def test_requests_beyond_inflight_limit_get_503(self):
+        self.assertTrue(inference_admission.try_acquire())
+        try:
+            response = self.client.post("/api/predict/")
+        finally:
+            inference_admission.release()
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], str(settings.SEM_INFERENCE_RETRY_AFTER))
+
+    def test_metrics_endpoint_exports_admission_counters(self):
+        self.client.post("/api/predict/")
+        body = self.client.get("/metrics").content.decode()
+        self.assertIn('sem_inference_requests_total{outcome="accepted"}', body)
+
+
+from rest_framework.test import APIRequestFactory
+
+from .serializers import HISTORY_VALUE_FIELDS, MeanSizePredictionSerializer, serialize_history_rows
+
+
+class HistorySerializationTest(TempMediaMixin, AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        for i in range(3):
+            MeanSizePrediction.objects.create(
+                user=self.user,
+                image=ContentFile(b"png", name=f"hist {i}.png"),
+                original_filename=f"hist {i}.png",
+                predicted_mean_size_nm=10.0 + i,
+            )
+
+    def test_fast_rows_match_model_serializer(self):
+        request = APIRequestFactory().get("/api/history/")
+        qs = MeanSizePrediction.objects.filter(user=self.user).order_by("-created_at")
+        expected = MeanSizePredictionSerializer(qs, many=True, context={"request": request}).data
+        fast = serialize_history_rows(qs.values(*HISTORY_VALUE_FIELDS), request)
+        self.assertEqual([dict(row) for row in expected], fast)
+
+        # No request (shell, management commands): no image URL, as before
+        qs_rows = qs.values(*HISTORY_VALUE_FIELDS)
+        expected = MeanSizePredictionSerializer(qs, many=True).data
+        self.assertEqual([dict(row) for row in expected], serialize_history_rows(qs_rows, None))
+        self.assertIsNone(expected[0]["image_url"])
+
+    def test_history_endpoint_filters(self):
+        response = self.client.get("/api/history/", {"min_size": 11})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(sorted(r["predicted_mean_size_nm"] for r in response.json()), [11.0, 12.0])
+
+
+import io
+import json
+from pathlib import Path
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+
+from .metrics import PREDICTION_STAGE_SECONDS
+
+
+def make_png_upload(name="sem.png", size=(480, 480)):
+    buffer = io.BytesIO()
+    Image.new("L", size, color=128).save(buffer, format="PNG")
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type="image/png")
+
+
+@override_settings(SEM_INFERENCE_RATE=0, SEM_SERVER_TIMING=True)
+class PredictInstrumentationTest(TempMediaMixin, AuthenticatedAPITestCase):
+    def test_predict_records_stage_timings(self):
+        forward_before = PREDICTION_STAGE_SECONDS.count(stage="forward")
+
+        response = self.client.post("/api/predict/", {"image": make_png_upload()}, format="multipart")
+        self.assertEqual(response.status_code, 200, response.content)
+
+        prediction = MeanSizePrediction.objects.get(pk=response.json()["id"])
+        self.assertTrue(prediction.model_version.startswith("best_sem_meansize_cnn-"))
+        for stage in ("upload", "model_load", "decode", "forward", "media_save", "total"):
+            self.assertIn(stage, prediction.stage_timings_ms)
+
+        self.assertIn("forward;dur=", response["Server-Timing"])
+        self.assertEqual(PREDICTION_STAGE_SECONDS.count(stage="forward"), forward_before + 1)
+        self.assertIn('sem_prediction_stage_seconds_bucket{stage="db_insert",le="+Inf"}',
+                      self.client.get("/metrics").content.decode())
+
+    def test_tta_prediction_stores_uncertainty(self):
+        with override_settings(SEM_TTA_VIEWS=4):
+            response = self.client.post("/api/predict/", {"image": make_png_upload()}, format="multipart")
+        self.assertEqual(response.status_code, 200, response.content)
+
+        prediction = MeanSizePrediction.objects.get(pk=response.json()["id"])
+        self.assertIsNotNone(prediction.predicted_std_nm)
+        self.assertGreaterEqual(prediction.predicted_std_nm, 0.0)
+        self.assertEqual(response.json()["predicted_std_nm"], prediction.predicted_std_nm)
+        self.assertTrue(prediction.model_version.endswith("+tta4"))
+
+
+from .inference import RequestProfiler
+
+
+@override_settings(SEM_INFERENCE_RATE=0)
+class RequestProfilerTest(TempMediaMixin, AuthenticatedAPITestCase):
+    def test_profiles_configured_request_window(self):
+        profile_dir = Path(self.media_root) / "profiles"
+        with override_settings(SEM_PROFILE_REQUESTS=1, SEM_PROFILE_SKIP=0, SEM_PROFILE_DIR=profile_dir), \
+                mock.patch("prediction.views.request_profiler", RequestProfiler()):
+            for _ in range(3):  # warm-up + 1 recorded + 1 after the window
+                response = self.client.post("/api/predict/", {"image": make_png_upload()}, format="multipart")
+                self.assertEqual(response.status_code, 200)
+
+        self.assertTrue((profile_dir / "backend_trace.json").exists())
+        self.assertIn("ConvBlock(1->16)", (profile_dir / "backend_top_ops.txt").read_text() +
+                      (profile_dir / "backend_trace.json").read_text())
+
+
+from django.test import AsyncRequestFactory
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views
+
+
+@override_settings(SEM_INFERENCE_RATE=0)
+class AsyncViewsTest(TempMediaMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        caches[USER_CACHE_ALIAS].clear()
+        self.user = get_user_model().objects.create_user(username="dave", password="s3cret-pass")
+        self.factory = AsyncRequestFactory()
+        self.auth = {"Authorization": f"Bearer {AccessToken.for_user(self.user)}"}
+
+    async def test_predict_history_and_image_round_trip(self):
+        response = await async_views.predict_mean_size_view(
+            self.factory.post("/api/predict/", {"image": make_png_upload()}, headers=self.auth)
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        prediction_id = json.loads(response.content)["id"]
+        prediction = await MeanSizePrediction.objects.aget(pk=prediction_id)
+        self.assertEqual(prediction.user_id, self.user.pk)
+        self.assertIn("forward", prediction.stage_timings_ms)
+
+        history = json.loads((await async_views.prediction_history_view(self.factory.get("/api/history/", headers=self.auth))).content)
+        self.assertEqual([row["id"] for row in history], [prediction_id])
+
+        image = await async_views.prediction_image_view(self.factory.get("/", headers=self.auth), pk=prediction_id)
+        self.assertEqual(image.status_code, 200)
+        self.assertTrue(image.content.startswith(b"\x89PNG"))
+
+        similar = await async_views.similar_predictions_view(self.factory.get("/", headers=self.auth), pk=prediction_id)
+        self.assertEqual(json.loads(similar.content), [])
+
+    async def test_requires_valid_token_and_ownership(self):
+        anonymous = await async_views.prediction_history_view(self.factory.get("/api/history/"))
+        self.assertEqual(anonymous.status_code, 401)
+
+        other = await get_user_model().objects.acreate(username="eve")
+        prediction = await MeanSizePrediction.objects.acreate(
+            user=other, original_filename="x.png", predicted_mean_size_nm=1.0, image="sem_uploads/x.png",
+        )
+        response = await async_views.prediction_image_view(self.factory.get("/", headers=self.auth), pk=prediction.pk)
+        self.assertEqual(response.status_code, 403)
+
+
+import torch
+
+from . import mlpath  # noqa: F401
+from .model_server import model_server
+from .models import ShadowPrediction
+from .shadow import shadow_runner
+from registry import ModelRegistry  # type: ignore  # noqa: E402
+
+
+@override_settings(SEM_INFERENCE_RATE=0, SEM_MODEL_POLL_INTERVAL=0)
+class ModelRegistryServingTest(TempMediaMixin, AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        self.registry_root = Path(self.media_root) / "registry"
+        self.registry = ModelRegistry(self.registry_root)
+        self.v1 = self.registry.register(settings.SEM_MODEL_PATH, metrics={"test_mae": 1.0}, activate=True)
+        candidate = Path(self.media_root) / "candidate.pt"
+        state = torch.load(settings.SEM_MODEL_PATH)
+        torch.save({k: v + 0.01 if v.is_floating_point() else v for k, v in state.items()}, candidate)
+        self.v2 = self.registry.register(candidate, parent=self.v1)
+        self.registry_override = override_settings(SEM_MODEL_REGISTRY=self.registry_root)
+        self.registry_override.enable()
+
+    def tearDown(self):
+        self.registry_override.disable()
+        model_server.reload()
+        super().tearDown()
+
+    def predict(self):
+        response = self.client.post("/api/predict/", {"image": make_png_upload()}, format="multipart")
+        self.assertEqual(response.status_code, 200, response.content)
+        return MeanSizePrediction.objects.get(pk=response.json()["id"])
+
+    def test_activating_a_version_swaps_the_served_model(self):
+        self.assertEqual(self.predict().model_version, self.v1)
+        in_flight = model_server.current()
+
+        self.registry.set_active(self.v2)
+        self.assertEqual(self.predict().model_version, self.v2)
+        # A request that started on v1 keeps its own model reference
+        self.assertEqual(in_flight.version, self.v1)
+        self.assertIsNot(in_flight.model, model_server.current().model)
+
+    def test_shadow_model_logs_predictions_without_changing_responses(self):
+        with override_settings(SEM_SHADOW_MODEL_VERSION=self.v2, SEM_SHADOW_SAMPLE_RATE=1.0), \
+                mock.patch.object(shadow_runner, "_submit", lambda fn, *args: fn(*args)):
+            prediction = self.predict()
+
+        self.assertEqual(prediction.model_version, self.v1)
+        shadow = ShadowPrediction.objects.get(prediction=prediction)
+        self.assertEqual(shadow.model_version, self.v2)
+        self.assertEqual(shadow.primary_model_version, self.v1)
+        self.assertEqual(shadow.primary_mean_size_nm, prediction.predicted_mean_size_nm)
+
+        out = StringIO()
+        call_command("shadow_report", stdout=out)
+        self.assertIn(f"{self.v2} vs {self.v1}: n=1", out.getvalue())
+
+    def test_shadow_model_also_runs_behind_tta(self):
+        with override_settings(SEM_SHADOW_MODEL_VERSION=self.v2, SEM_SHADOW_SAMPLE_RATE=1.0, SEM_TTA_VIEWS=2), \
+                mock.patch.object(shadow_runner, "_submit", lambda fn, *args: fn(*args)):
+            prediction = self.predict()
+
+        shadow = ShadowPrediction.objects.get(prediction=prediction)
+        self.assertEqual(shadow.primary_model_version, f"{self.v1}+tta2")
+
+
+import os
+import subprocess
+import sys
+
+from .inference import warm_up
+
+
+class LazyMLImportTest(TestCase):
+    def test_urlconf_does_not_import_torch(self):
+        # A fresh interpreter: this test process has imported torch already.
+        code = (
+            "import sys, django; django.setup(); import sem_backend.urls; "
+            "print(sorted(m for m in ('torch', 'torchvision', 'pandas') if m in sys.modules))"
+        )
+        out = subprocess.run(
+            [sys.executable, "-c", code], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, "DJANGO_SETTINGS_MODULE": "sem_backend.settings"},
+        )
+        self.assertEqual(out.stdout.strip(), "[]")
+
+    def test_warm_up_loads_the_served_model(self):
+        self.assertGreater(warm_up(), 0)
+        self.assertIsNotNone(model_server.current())
+
+
+import gc
+
+from .prefork import configure_worker, preload, thread_partition
+
+
+class PreforkTest(TestCase):
+    def setUp(self):
+        threads = torch.get_num_threads()
+        self.addCleanup(torch.set_num_threads, threads)
+        self.addCleanup(gc.unfreeze)
+
+    def test_thread_partition_never_oversubscribes(self):
+        self.assertEqual(thread_partition(4, cores=8), (2, 1))
+        self.assertEqual(thread_partition(3, cores=8), (2, 1))
+        self.assertEqual(thread_partition(16, cores=8), (1, 1))
+
+    def test_preload_freezes_the_served_model_in_shared_memory(self):
+        preload()
+        model = model_server.current().model
+        self.assertFalse(model.training)
+        for param in model.parameters():
+            self.assertTrue(param.is_shared())
+            self.assertFalse(param.requires_grad)
+        self.assertEqual(configure_worker(2, cores=4)[0], 2)
+        self.assertEqual(torch.get_num_threads(), 2)
+
+
+import hashlib
+
+from .inference import run_inference
+from .upload_handlers import UPLOAD_HEADER_BYTES
+
+
+@override_settings(SEM_INFERENCE_RATE=0)
+class StreamingUploadValidationTest(TempMediaMixin, AuthenticatedAPITestCase):
+    def post(self, name, data):
+        upload = SimpleUploadedFile(name, data, content_type="image/png")
+        with mock.patch("prediction.views.run_inference", wraps=run_inference) as infer:
+            response = self.client.post("/api/predict/", {"image": upload}, format="multipart")
+        return response, infer
+
+    def png_bytes(self, size=(480, 480)):
+        buffer = io.BytesIO()
+        Image.effect_noise(size, 40).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def assertRejected(self, response, infer, status, message):
+        self.assertEqual(response.status_code, status, response.content)
+        self.assertIn(message, response.json()["error"])
+        infer.assert_not_called()
+        self.assertFalse(MeanSizePrediction.objects.exists())
+
+    def test_valid_upload_is_hashed_and_decoded_once(self):
+        data = self.png_bytes()
+        with mock.patch("infer.preprocess_image") as preprocess_from_disk:
+            response, _ = self.post("sem.png", data)
+        self.assertEqual(response.status_code, 200, response.content)
+        preprocess_from_disk.assert_not_called()
+        prediction = MeanSizePrediction.objects.get(pk=response.json()["id"])
+        self.assertEqual(prediction.image_sha256, hashlib.sha256(data).hexdigest())
+
+    def compressed_tiff_bytes(self, size=(480, 480)):
+        # libtiff writes the IFD (the header PIL needs) after the image data
+        buffer = io.BytesIO()
+        Image.effect_noise(size, 40).save(buffer, format="TIFF", compression="tiff_lzw")
+        return buffer.getvalue()
+
+    def test_accepts_tiffs_whose_header_is_at_the_end(self):
+        data = self.compressed_tiff_bytes()
+        self.assertGreater(len(data), UPLOAD_HEADER_BYTES)
+        response, infer = self.post("sem.tif", data)
+        self.assertEqual(response.status_code, 200, response.content)
+        infer.assert_called_once()
+        prediction = MeanSizePrediction.objects.get(pk=response.json()["id"])
+        self.assertEqual(prediction.image_sha256, hashlib.sha256(data).hexdigest())
+
+    @override_settings(SEM_UPLOAD_MAX_PIXELS=480 * 480 - 1)
+    def test_checks_pixels_of_tiffs_whose_header_is_at_the_end(self):
+        response, infer = self.post("sem.tif", self.compressed_tiff_bytes())
+        self.assertRejected(response, infer, 400, "480x480 exceed")
+
+    def test_rejects_non_images(self):
+        response, infer = self.post("sem.png", b"%PDF-1.4 " + b"x" * 200_000)
+        self.assertRejected(response, infer, 400, "not a supported image")
+
+    def test_rejects_truncated_images(self):
+        data = self.png_bytes()
+        response, infer = self.post("sem.png", data[: len(data) // 2])
+        self.assertRejected(response, infer, 400, "truncated or corrupt")
+
+    @override_settings(SEM_UPLOAD_MAX_PIXELS=480 * 480 - 1)
+    def test_rejects_too_many_pixels_from_the_header(self):
+        response, infer = self.post("sem.png", self.png_bytes())
+        self.assertRejected(response, infer, 400, "480x480 exceed")
+
+    @override_settings(SEM_UPLOAD_MAX_BYTES=100_000)
+    def test_rejects_oversized_uploads(self):
+        response, infer = self.post("sem.png", self.png_bytes())
+        self.assertRejected(response, infer, 413, "exceeds 100000 bytes")
+
+
+import numpy as np
+
+from .models import PredictionEmbedding
+from .similarity import EmbeddingIndex, similarity_index
+
+
+class EmbeddingIndexTest(TestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        centers = rng.standard_normal((50, 256))
+        self.vectors = centers[rng.integers(0, 50, 5000)] + 0.3 * rng.standard_normal((5000, 256))
+        self.queries = self.vectors[:20] + 0.05 * rng.standard_normal((20, 256))
+
+    def test_exact_search_matches_brute_force(self):
+        index = EmbeddingIndex(ivf_min=10**9)
+        index.add(np.arange(5000) + 1, self.vectors)
+        # Rows are stored as float16
+        unit = (self.vectors / np.linalg.norm(self.vectors, axis=1, keepdims=True)).astype(np.float16)
+        for query in self.queries:
+            ids, scores = index.search(query, k=5)
+            expected = unit.astype(np.float32) @ (query / np.linalg.norm(query))
+            np.testing.assert_allclose(scores, np.sort(expected)[::-1][:5], atol=1e-4)
+            np.testing.assert_allclose(scores, expected[ids - 1], atol=1e-4)
+            self.assertTrue(np.all(np.diff(scores) <= 0))
+        ids, _ = index.search(self.vectors[0], k=5, exclude_id=1)
+        self.assertNotIn(1, ids)
+        self.assertEqual(len(ids), 5)
+
+    def test_ivf_recall_with_incremental_adds(self):
+        exact, ivf = EmbeddingIndex(ivf_min=10**9), EmbeddingIndex(ivf_min=2000, nprobe=8)
+        for start in range(0, 5000, 500):  # trained at 2000, retrained at 4000, tail in between
+            batch = slice(start, start + 500)
+            exact.add(np.arange(5000)[batch], self.vectors[batch])
+            ivf.add(np.arange(5000)[batch], self.vectors[batch])
+        self.assertTrue(ivf.is_ivf)
+        self.assertEqual(len(ivf), 5000)
+        recall = np.mean([
+            len(set(exact.search(q, k=10)[0]) & set(ivf.search(q, k=10)[0])) / 10 for q in self.queries
+        ])
+        self.assertGreaterEqual(recall, 0.9)
+
+
+@override_settings(SEM_INFERENCE_RATE=0)
+class SimilarPredictionsTest(TempMediaMixin, AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        similarity_index.clear()
+        self.addCleanup(similarity_index.clear)
+
+    def predict(self, image):
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        upload = SimpleUploadedFile("sem.png", buffer.getvalue(), content_type="image/png")
+        response = self.client.post("/api/predict/", {"image": upload}, format="multipart")
+        self.assertEqual(response.status_code, 200, response.content)
+        return response.json()["id"]
+
+    def test_similar_endpoint_ranks_the_users_predictions(self):
+        first = self.predict(Image.effect_noise((480, 480), 40))
+        same = self.predict(Image.effect_noise((480, 480), 40))
+        blank = self.predict(Image.new("L", (480, 480), 0))
+        embedding = PredictionEmbedding.objects.get(prediction_id=first)
+        self.assertEqual(len(embedding.vector), 512)
+
+        response = self.client.get(f"/api/history/{first}/similar/", {"k": 5})
+        self.assertEqual(response.status_code, 200, response.content)
+        rows = response.json()
+        self.assertEqual([row["id"] for row in rows], [same, blank])
+        self.assertGreater(rows[0]["similarity"], rows[1]["similarity"])
+
+        # Loaded index is updated on insert
+        later = self.predict(Image.effect_noise((480, 480), 40))
+        ids = [row["id"] for row in self.client.get(f"/api/history/{first}/similar/").json()]
+        self.assertEqual(set(ids), {same, later, blank})
+
+        self.assertEqual(self.client.get(f"/api/history/{first}/similar/", {"k": 0}).status_code, 400)
+        other = get_user_model().objects.create_user(username="erin", password="s3cret-pass")
+        self.client.force_authenticate(other)
+        self.assertEqual(self.client.get(f"/api/history/{first}/similar/").status_code, 403)
+
+
+from .drift import drift_monitor
+from .models import DriftWindow
+
+
+@override_settings(SEM_INFERENCE_RATE=0, SEM_DRIFT_WINDOW_SIZE=2)
+class DriftMonitorTest(TempMediaMixin, AuthenticatedAPITestCase):
+    def setUp(self):
+        super().setUp()
+        from drift import build_reference
+        from infer import image_to_tensor
+
+        drift_monitor.clear()
+        self.addCleanup(drift_monitor.clear)
+        # "Training set": noisy micrographs
+        images = torch.cat([image_to_tensor(Image.effect_noise((480, 480), 40)) for _ in range(8)])
+        reference = build_reference(model_server.current().model, [(images, torch.zeros(8))])
+        path = Path(self.media_root) / "reference.drift.npz"
+        reference.save(path)
+        settings_override = override_settings(SEM_DRIFT_REFERENCE=str(path))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+    def predict(self, image):
+        buffer = io.BytesIO()
+        image.save(buffer, format="PNG")
+        upload = SimpleUploadedFile("sem.png", buffer.getvalue(), content_type="image/png")
+        response = self.client.post("/api/predict/", {"image": upload}, format="multipart")
+        self.assertEqual(response.status_code, 200, response.content)
+
+    def test_windows_are_scored_against_the_reference(self):
+        for _ in range(2):
+            self.predict(Image.effect_noise((480, 480), 40))
+        for _ in range(2):
+            self.predict(Image.new("L", (480, 480), 20))  # another instrument: dark, flat
+        self.predict(Image.new("L", (480, 480), 20))
+
+        same, shifted = DriftWindow.objects.order_by("ended_at")
+        self.assertEqual((same.count, shifted.count), (2, 2))
+        self.assertLess(same.scores["intensity_psi"], 0.2)
+        self.assertGreater(shifted.scores["intensity_psi"], 0.2)
+        self.assertTrue(shifted.drifted)
+
+        self.client.force_authenticate(get_user_model().objects.create_user(username="staff", password="x", is_staff=True))
+        report = self.client.get("/api/drift/", {"windows": 1}).json()
+        self.assertEqual(report["reference_count"], 8)
+        self.assertEqual(len(report["windows"]), 1)
+        self.assertTrue(report["windows"][0]["drifted"])
+        self.assertEqual(report["open_window"]["count"], 1)
+        self.assertEqual(report["combined"]["count"], 3)
+
+        self.client.force_authenticate(self.user)
+        self.assertEqual(self.client.get("/api/drift/").status_code, 403)
+
+    def test_reference_built_after_start_up_is_picked_up(self):
+        from drift import DriftSketch
+
+        path = Path(settings.SEM_DRIFT_REFERENCE)
+        reference = DriftSketch.load(path)
+        path.unlink()
+        self.assertIsNone(drift_monitor.reference("v1"))
+
+        reference.save(path)  # `python src/ml/drift.py ...` run later
+        self.assertEqual(drift_monitor.reference("v1").count, 8)
@@ -0,0 +1,95 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from rest_framework.throttling import BaseThrottle
+
+from .metrics import INFERENCE_REQUESTS
+
+
+THROTTLE_CACHE_ALIAS = "throttle"
+
+
+class InferenceRateThrottle(BaseThrottle):
+    """
+    Per-user token bucket for the inference endpoint.
+
+    Each user gets SEM_INFERENCE_BURST tokens refilled at SEM_INFERENCE_RATE
+    tokens/second; a request without a token is rejected with 429 and a
+    Retry-After of the time until the next token. Buckets live in the
+    per-process CACHES["throttle"], so limits apply per worker process.
+    """
+
+    _lock = threading.Lock()
+
+    def __init__(self):
+        self._wait = None
+
+    def get_cache_key(self, request) -> str:
+        if request.user and request.user.is_authenticated:
+            return f"inference-bucket:user:{request.user.pk}"
+        return f"inference-bucket:ip:{self.get_ident(request)}"
+
+    def allow_request(self, request, view):
+        rate = settings.SEM_INFERENCE_RATE
+        burst = settings.SEM_INFERENCE_BURST
+        if rate <= 0:
+            return True
+
+        cache = caches[THROTTLE_CACHE_ALIAS]
+        key = self.get_cache_key(request)
+        now = time.monotonic()
+        # Enough time for an empty bucket to refill completely.
+        timeout = int(burst / rate) + 1
+
+        with self._lock:
+            tokens, last = cache.get(key, (float(burst), now))
+            tokens = min(float(burst), tokens + (now - last) * rate)
+            allowed = tokens >= 1.0
+            if allowed:
+                tokens -= 1.0
+            cache.set(key, (tokens, now), timeout=timeout)
+
+        if not allowed:
+            self._wait = (1.0 - tokens) / rate
+            INFERENCE_REQUESTS.inc(outcome="rate_limited")
+        return allowed
+
+    def wait(self):
+        return self._wait
+
+
+class AdmissionController:
+    """
+    Global (per-process) cap on concurrent inference requests.
+
+    try_acquire() never blocks: when SEM_INFERENCE_MAX_INFLIGHT requests are
+    already running, the caller should shed the request with a 503 instead of
+    queueing it behind the busy workers.
+    """
+
+    def __init__(self):
+        self._inflight = 0
+        self._lock = threading.Lock()
+
+    @property
+    def inflight(self) -> int:
+        return self._inflight
+
+    def try_acquire(self) -> bool:
+        limit = settings.SEM_INFERENCE_MAX_INFLIGHT
+        with self._lock:
+            if limit > 0 and self._inflight >= limit:
+                INFERENCE_REQUESTS.inc(outcome="overloaded")
+                return False
+            self._inflight += 1
+        INFERENCE_REQUESTS.inc(outcome="accepted")
+        return True
+
+    def release(self):
+        with self._lock:
+            self._inflight -= 1
+
+
+inference_admission = AdmissionController()
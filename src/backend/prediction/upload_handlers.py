@@ -0,0 +1,161 @@
+"""
+Streaming upload handler for /api/predict/.
+
+Django's default handlers buffer an upload (in memory or a tempfile) and the
+view then copied it to another tempfile and decoded it, so a corrupt,
+non-image or oversized upload was only noticed after all of that.
+ImageUploadHandler does the work while the chunks arrive instead:
+
+  - the SHA-256 of the file is computed incrementally
+  - the header is sniffed with PIL as soon as enough bytes are in (format,
+    width x height) and checked against SEM_UPLOAD_FORMATS and
+    SEM_UPLOAD_MAX_PIXELS (decompression bombs) before any pixel is decoded.
+    Some valid files cannot be sniffed from their start: LZW/Deflate TIFFs
+    written by libtiff/PIL keep their directory at the end of the file. If
+    the header has not parsed within UPLOAD_HEADER_BYTES, the same checks
+    run on the complete temporary file instead, still before decoding
+  - more than SEM_UPLOAD_MAX_BYTES are never accepted
+  - when the last chunk is in, the image is decoded from the temporary file
+    the chunks were written to, so a truncated or corrupt file fails at
+    upload time. (PIL.ImageFile.Parser cannot decode PNG incrementally: it
+    buffers the whole file in memory until close(), quadratically.)
+
+A bad upload stops the multipart parser right away (the rest of the body is
+not read) and the reason is left on the request for upload_rejection().
+Memory per upload is bounded: chunks go straight to the temporary file
+(which is also what gets stored) and at most UPLOAD_HEADER_BYTES are
+buffered for sniffing; the decoded image itself is capped by
+SEM_UPLOAD_MAX_PIXELS.
+
+The uploaded file gets sha256, image_format and image attributes (the
+decoded PIL image, used by run_inference instead of decoding again).
+"""
+from dataclasses import dataclass
+import hashlib
+import io
+import warnings
+
+from django.conf import settings
+from django.core.files.uploadhandler import StopUpload, TemporaryFileUploadHandler
+from PIL import Image
+
+
+# Stop sniffing if the header has not parsed after this many bytes (the
+# checks are then deferred to the complete file).
+UPLOAD_HEADER_BYTES = 64 * 1024
+IMAGE_FIELD = "image"
+
+
+@dataclass(frozen=True)
+class UploadRejection:
+    status: int
+    message: str
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    chunk_size = 64 * 1024
+
+    def handle_raw_input(self, input_data, META, content_length, boundary, encoding=None):
+        self.request_length = content_length
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.validate = field_name == IMAGE_FIELD
+        self.sha256 = hashlib.sha256()
+        self.header = bytearray()
+        self.image_format = None
+        # Body larger than the file limit plus room for the multipart framing:
+        # reject before reading any of the file.
+        request_length = getattr(self, "request_length", None) or 0
+        if self.validate and request_length > settings.SEM_UPLOAD_MAX_BYTES + UPLOAD_HEADER_BYTES:
+            self.reject(413, f"Upload exceeds {settings.SEM_UPLOAD_MAX_BYTES} bytes.")
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.validate:
+            if start + len(raw_data) > settings.SEM_UPLOAD_MAX_BYTES:
+                self.reject(413, f"Upload exceeds {settings.SEM_UPLOAD_MAX_BYTES} bytes.")
+            self.sha256.update(raw_data)
+            if self.header is not None:
+                self.header += raw_data
+                self.sniff(final=False)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        if not self.validate:
+            return super().file_complete(file_size)
+
+        if self.header is not None:
+            # The whole file is in the header buffer
+            self.sniff(final=True)
+
+        file = super().file_complete(file_size)
+        if self.image_format is None:
+            # Header not found within UPLOAD_HEADER_BYTES: check the complete file
+            self.image_format = self.probe(file)
+            if self.image_format is None:
+                self.reject_unsupported()
+            file.seek(0)
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                image = Image.open(file, formats=[self.image_format])
+                image.load()
+        except Exception:
+            self.reject(400, "Uploaded image is truncated or corrupt.")
+        file.seek(0)
+        file.sha256 = self.sha256.hexdigest()
+        file.image_format = self.image_format
+        file.image = image
+        return file
+
+    def sniff(self, final: bool):
+        """Validate the header once it parses (and stop buffering it)."""
+        image_format = self.probe(io.BytesIO(self.header))
+        if image_format is None:
+            if final:
+                self.reject_unsupported()
+            if len(self.header) >= UPLOAD_HEADER_BYTES:
+                self.header = None  # file_complete checks the whole file
+            return
+        self.image_format = image_format
+        self.header = None
+
+    def probe(self, fp) -> str | None:
+        """
+        PIL format of the image in fp if its header parses, None if it does
+        not; rejects too many pixels. Reads the header only, decodes nothing.
+        """
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore")
+                # Only the allowed formats' plugins ever see the bytes.
+                with Image.open(fp, formats=settings.SEM_UPLOAD_FORMATS) as probe:
+                    image_format, (width, height) = probe.format, probe.size
+        except Image.DecompressionBombError:
+            self.reject(400, "Image dimensions exceed the allowed limit.")
+        except Exception:
+            return None
+
+        if width * height > settings.SEM_UPLOAD_MAX_PIXELS:
+            self.reject(400, f"Image dimensions {width}x{height} exceed the allowed limit.")
+        return image_format
+
+    def reject_unsupported(self):
+        self.reject(400, f"Uploaded file is not a supported image ({', '.join(settings.SEM_UPLOAD_FORMATS)}).")
+
+    def reject(self, status: int, message: str):
+        self.request.upload_rejection = UploadRejection(status, message)
+        raise StopUpload(connection_reset=True)
+
+
+def use_image_upload_handler(request):
+    """
+    Parse the request's multipart body with ImageUploadHandler. Must run before
+    request.FILES / request.data are first accessed. Accepts Django and DRF requests.
+    """
+    http_request = getattr(request, "_request", request)
+    http_request.upload_handlers = [ImageUploadHandler(http_request)]
+
+
+def upload_rejection(request) -> UploadRejection | None:
+    return getattr(getattr(request, "_request", request), "upload_rejection", None)
@@ -1,15 +1,30 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
 from rest_framework_simplejwt.views import (
     TokenObtainPairView,
     TokenRefreshView,
     TokenVerifyView,
 )
 
-urlpatterns = [
-    path("predict/", views.predict_mean_size_view, name="predict-mean-size"),
-    path("images/<int:pk>/", views.PredictionImageView.as_view(), name="prediction-image"), # New path for images
-    path("history/", views.PredictionHistoryView.as_view(), name="prediction-history"), # New path for history
+if settings.SEM_ASYNC_VIEWS:
+    # Async versions for ASGI deployments (see async_views.py)
+    prediction_urlpatterns = [
+        path("predict/", async_views.predict_mean_size_view, name="predict-mean-size"),
+        path("images/<int:pk>/", async_views.prediction_image_view, name="prediction-image"),
+        path("history/", async_views.prediction_history_view, name="prediction-history"),
+        path("history/<int:pk>/similar/", async_views.similar_predictions_view, name="prediction-similar"),
+    ]
+else:
+    prediction_urlpatterns = [
+        path("predict/", views.predict_mean_size_view, name="predict-mean-size"),
+        path("images/<int:pk>/", views.PredictionImageView.as_view(), name="prediction-image"), # New path for images
+        path("history/", views.PredictionHistoryView.as_view(), name="prediction-history"), # New path for history
+        path("history/<int:pk>/similar/", views.SimilarPredictionsView.as_view(), name="prediction-similar"),
+    ]
+
+urlpatterns = prediction_urlpatterns + [
+    path("drift/", views.DriftView.as_view(), name="drift"),
 
     # User Authentication
     path('user/', views.get_current_user, name='get_current_user'),
@@ -1,30 +1,34 @@
 from pathlib import Path
-import os
-import tempfile
 
-from django.http import JsonResponse, FileResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse, FileResponse
 from django.shortcuts import get_object_or_404
-from rest_framework.decorators import api_view, parser_classes, permission_classes
+from rest_framework.decorators import api_view, parser_classes, permission_classes, throttle_classes
 from rest_framework.parsers import MultiPartParser, FormParser
+from rest_framework.renderers import BrowsableAPIRenderer
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.views import APIView 
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework import generics 
 
 # Django model
-from .models import MeanSizePrediction
-from .serializers import UserRegisterSerializer, MeanSizePredictionSerializer, UserSerializer
-
-# Small hack to import from src/ml
-import sys
-CURRENT_FILE = Path(__file__).resolve()
-SRC_DIR = CURRENT_FILE.parents[2]  # .../src
-ML_DIR = SRC_DIR / "ml"
-if str(ML_DIR) not in sys.path:
-    sys.path.append(str(ML_DIR))
-
-from infer import predict_mean_size  # type: ignore
+from .models import MeanSizePrediction, PredictionEmbedding
+from .serializers import (
+    HISTORY_VALUE_FIELDS,
+    MeanSizePredictionSerializer,
+    UserRegisterSerializer,
+    UserSerializer,
+    serialize_history_rows,
+)
+from .renderers import FastJSONRenderer
+from .metrics import PREDICTION_STAGE_SECONDS, REGISTRY, StageTimer
+from .throttling import InferenceRateThrottle, inference_admission
+from .inference import request_profiler, run_inference
+from .drift import drift_monitor
+from .shadow import shadow_runner
+from .similarity import encode_embedding, parse_k, similar_predictions, similarity_index
+from .upload_handlers import upload_rejection, use_image_upload_handler
 
 
 @api_view(['GET'])
@@ -38,16 +42,58 @@ def get_current_user(request):
     return Response(serializer.data)
 
 
+def metrics_view(request):
+    """
+    GET /metrics
+    Prometheus text exposition of this worker process's counters.
+    """
+    return HttpResponse(REGISTRY.render(), content_type="text/plain; version=0.0.4; charset=utf-8")
+
+
 @api_view(["POST"])
 @parser_classes([MultiPartParser, FormParser])
 @permission_classes([IsAuthenticated])
+@throttle_classes([InferenceRateThrottle])
 def predict_mean_size_view(request):
     """
     POST /api/predict/
     Body: multipart/form-data with field "image" = uploaded PNG
     Response: {"mean_size_nm": float, "id": int, "created_at": str}
+
+    Uploads that are not a valid image (SEM_UPLOAD_FORMATS, at most
+    SEM_UPLOAD_MAX_PIXELS) get 400, larger than SEM_UPLOAD_MAX_BYTES 413;
+    both are detected while the upload streams in (upload_handlers.py).
+    Per-user requests beyond the token bucket get 429; when the worker is
+    already running SEM_INFERENCE_MAX_INFLIGHT predictions the request is
+    shed with 503. Both carry a Retry-After header.
     """
-    uploaded_file = request.FILES.get("image")
+    if not inference_admission.try_acquire():
+        response = JsonResponse(
+            {"error": "Inference capacity exhausted, please retry shortly."},
+            status=503,
+        )
+        response["Retry-After"] = str(settings.SEM_INFERENCE_RETRY_AFTER)
+        return response
+
+    try:
+        with request_profiler.request():
+            return _predict_mean_size(request)
+    finally:
+        inference_admission.release()
+
+
+def _predict_mean_size(request):
+    timer = StageTimer()
+
+    # Hash, validate and decode the image while the body is read; the file is
+    # spooled to a temporary file that inference reads directly.
+    use_image_upload_handler(request)
+    with timer.span("upload"):
+        uploaded_file = request.FILES.get("image")
+
+    rejection = upload_rejection(request)
+    if rejection is not None:
+        return JsonResponse({"error": rejection.message}, status=rejection.status)
 
     if uploaded_file is None:
         return JsonResponse(
@@ -55,47 +101,61 @@ def predict_mean_size_view(request):
             status=400,
         )
 
-    # Save uploaded image to a temporary file for the PyTorch inference code
-    suffix = os.path.splitext(uploaded_file.name)[1] or ".png"
-
-    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-        for chunk in uploaded_file.chunks():
-            tmp.write(chunk)
-        temp_path = Path(tmp.name)
-
     try:
-        # 1) Run PyTorch model on the temp file
-        mean_size_nm = predict_mean_size(image_path=temp_path)
+        # 1) Run PyTorch model on the decoded upload
+        result = run_inference(Path(uploaded_file.temporary_file_path()), timer, image=uploaded_file.image)
 
         # 2) Save prediction + the *uploaded file* into the database
-        prediction_obj = MeanSizePrediction.objects.create(
+        prediction_obj = MeanSizePrediction(
             user=request.user, # Associate with the authenticated user
-            image=uploaded_file,                 # ImageField will store it under MEDIA_ROOT/sem_uploads/
             original_filename=uploaded_file.name,
-            predicted_mean_size_nm=mean_size_nm,
+            image_sha256=uploaded_file.sha256,
+            predicted_mean_size_nm=result.mean_size_nm,
+            predicted_std_nm=result.std_nm,
+            model_version=result.model_version,
             # magnification="",  # fill later
             # notes="",
-            # model_version="v1", 
         )
+        with timer.span("media_save"):
+            # ImageField storage puts it under sem_uploads/<shard>/<shard>/
+            prediction_obj.image.save(uploaded_file.name, uploaded_file, save=False)
+
+        # Stored timings cover everything up to the insert itself.
+        prediction_obj.stage_timings_ms = timer.as_ms()
+        with timer.span("db_insert"):
+            prediction_obj.save()
+            embedding_obj = PredictionEmbedding.objects.create(
+                prediction=prediction_obj,
+                user=request.user,
+                model_version=result.embedding_version,
+                vector=encode_embedding(result.embedding),
+            )
 
     except Exception as e:
-        # Clean up temp file, then return error
-        temp_path.unlink(missing_ok=True)
         return JsonResponse({"error": f"Prediction failed: {e}"}, status=500)
+    finally:
+        # Deletes the temporary file now (unless storage already moved it into place)
+        uploaded_file.close()
 
-    # Clean up temporary file used only for inference
-    temp_path.unlink(missing_ok=True)
+    timer.observe(PREDICTION_STAGE_SECONDS)
+    similarity_index.add(embedding_obj)
+    drift_monitor.observe(result)
+    shadow_runner.maybe_submit(result, prediction_obj)
 
     # 3) Return response with prediction and DB id
-    return JsonResponse(
+    response = JsonResponse(
         {
-            "predicted_mean_size_nm": mean_size_nm, # Changed key name here
+            "predicted_mean_size_nm": result.mean_size_nm, # Changed key name here
+            "predicted_std_nm": result.std_nm,
             "id": prediction_obj.id,
             "created_at": prediction_obj.created_at.isoformat(),
             "image_url": request.build_absolute_uri(prediction_obj.image.url),
         },
         status=200,
     )
+    if settings.SEM_SERVER_TIMING:
+        response["Server-Timing"] = timer.server_timing_header()
+    return response
 
 
 class UserRegisterView(APIView):
@@ -133,7 +193,70 @@ class PredictionHistoryView(generics.ListAPIView):
     permission_classes = [IsAuthenticated]
     filter_backends = [DjangoFilterBackend]
     filterset_class = MeanSizePredictionFilter
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
 
     def get_queryset(self):
         # Filter predictions to only include those belonging to the authenticated user
         return MeanSizePrediction.objects.filter(user=self.request.user).order_by('-created_at')
+
+    def list(self, request, *args, **kwargs):
+        # Serialize straight from .values() rows; building a model instance and a
+        # serializer field tree per row dominates large history pages.
+        rows = self.filter_queryset(self.get_queryset()).values(*HISTORY_VALUE_FIELDS)
+
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(serialize_history_rows(page, request))
+        return Response(serialize_history_rows(rows, request))
+
+
+class SimilarPredictionsView(APIView):
+    """
+    GET /api/history/<pk>/similar/?k=10
+    The user's predictions whose images are most similar to prediction pk's
+    (cosine similarity of the model embeddings, see similarity.py).
+    """
+    permission_classes = [IsAuthenticated]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request, pk, format=None):
+        prediction = get_object_or_404(MeanSizePrediction.objects.only("user_id"), pk=pk)
+        if prediction.user_id != request.user.pk:
+            return Response({"detail": "You do not have permission to view this prediction."},
+                            status=status.HTTP_403_FORBIDDEN)
+        try:
+            k = parse_k(request.query_params.get("k"))
+        except ValueError as e:
+            return Response({"k": [str(e)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        embedding = PredictionEmbedding.objects.filter(prediction_id=pk).first()
+        if embedding is None:
+            return Response({"detail": "No embedding stored for this prediction."},
+                            status=status.HTTP_404_NOT_FOUND)
+
+        hits = similar_predictions(embedding, k)
+        rows = serialize_history_rows([row for row, _ in hits], request)
+        for row, (_, score) in zip(rows, hits):
+            row["similarity"] = score
+        return Response(rows)
+
+
+class DriftView(APIView):
+    """
+    GET /api/drift/?windows=24&model_version=
+    Drift scores of the latest saved windows of live predictions, of this
+    worker's open window and of all of them merged (see drift.py). Staff only:
+    the windows cover every user's uploads.
+    """
+    permission_classes = [IsAdminUser]
+    renderer_classes = [FastJSONRenderer, BrowsableAPIRenderer]
+
+    def get(self, request, format=None):
+        try:
+            windows = int(request.query_params.get("windows", 24))
+        except ValueError:
+            windows = 0
+        if not 1 <= windows <= 1000:
+            return Response({"windows": ["Must be an integer between 1 and 1000."]},
+                            status=status.HTTP_400_BAD_REQUEST)
+        return Response(drift_monitor.report(request.query_params.get("model_version") or None, windows))
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -73,7 +74,7 @@ CORS_ALLOWED_ORIGINS = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'prediction.authentication.CachedJWTAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated', # Default to require authentication
@@ -102,6 +103,111 @@ SIMPLE_JWT = {
     'TOKEN_OBTAIN_PAIR_SERIALIZER': 'prediction.serializers.CustomTokenObtainPairSerializer',
 }
 
+# Per-process caches. "auth" holds users looked up from JWTs for a few seconds so
+# authenticated requests skip the user-table query (see prediction.authentication).
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "auth": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "sem-auth-users",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+    "throttle": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "sem-throttle",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    },
+}
+
+SEM_AUTH_USER_CACHE_TTL = int(os.environ.get("SEM_AUTH_USER_CACHE_TTL", "30"))  # seconds
+
+# Inference admission (prediction.throttling), enforced per worker process:
+# each user gets a token bucket of SEM_INFERENCE_BURST requests refilled at
+# SEM_INFERENCE_RATE requests/second (429 when empty), and at most
+# SEM_INFERENCE_MAX_INFLIGHT predictions run at once (503 beyond that; 0 = no cap).
+SEM_INFERENCE_RATE = float(os.environ.get("SEM_INFERENCE_RATE", "0.5"))
+SEM_INFERENCE_BURST = int(os.environ.get("SEM_INFERENCE_BURST", "10"))
+SEM_INFERENCE_MAX_INFLIGHT = int(os.environ.get("SEM_INFERENCE_MAX_INFLIGHT", str(os.cpu_count() or 1)))
+SEM_INFERENCE_RETRY_AFTER = int(os.environ.get("SEM_INFERENCE_RETRY_AFTER", "2"))  # seconds, for 503s
+
+# Serve predict/history/images with the async views in prediction/async_views.py (use
+# with sem_backend.asgi). Their forward passes run on a dedicated pool of
+# SEM_INFERENCE_WORKERS threads.
+SEM_ASYNC_VIEWS = os.environ.get("SEM_ASYNC_VIEWS", "0").lower() in ("1", "true", "yes")
+SEM_INFERENCE_WORKERS = int(os.environ.get("SEM_INFERENCE_WORKERS", str(max(1, (os.cpu_count() or 1) // 2))))
+
+# Model served by /api/predict/ (prediction.model_server): SEM_MODEL_VERSION from the registry
+# in SEM_MODEL_REGISTRY (src/ml/registry.py) if set, else the registry's active version, else
+# the checkpoint at SEM_MODEL_PATH. Workers re-check the registry every SEM_MODEL_POLL_INTERVAL
+# seconds and swap models without dropping in-flight requests.
+SEM_MODEL_PATH = Path(os.environ.get("SEM_MODEL_PATH", BASE_DIR.parents[1] / "models" / "best_sem_meansize_cnn.pt"))
+SEM_MODEL_REGISTRY = Path(os.environ.get("SEM_MODEL_REGISTRY", BASE_DIR.parents[1] / "models" / "registry"))
+SEM_MODEL_VERSION = os.environ.get("SEM_MODEL_VERSION", "")
+SEM_MODEL_POLL_INTERVAL = float(os.environ.get("SEM_MODEL_POLL_INTERVAL", "5"))
+
+# torch and the model are imported lazily, on the first prediction. With SEM_WARMUP=1 the
+# WSGI/ASGI entry points load them (and run one forward pass) at worker start instead.
+SEM_WARMUP = os.environ.get("SEM_WARMUP", "0").lower() in ("1", "true", "yes")
+
+# /api/predict/ uploads are validated while they stream in (prediction.upload_handlers):
+# at most SEM_UPLOAD_MAX_BYTES, one of SEM_UPLOAD_FORMATS (PIL format names), and at most
+# SEM_UPLOAD_MAX_PIXELS pixels (width x height, checked from the header before decoding).
+SEM_UPLOAD_MAX_BYTES = int(os.environ.get("SEM_UPLOAD_MAX_BYTES", str(20 * 1024 * 1024)))
+SEM_UPLOAD_FORMATS = [f.strip().upper() for f in os.environ.get("SEM_UPLOAD_FORMATS", "PNG,TIFF,JPEG,BMP").split(",") if f.strip()]
+SEM_UPLOAD_MAX_PIXELS = int(os.environ.get("SEM_UPLOAD_MAX_PIXELS", str(4096 * 4096)))
+
+# /api/history/<id>/similar/ (prediction.similarity): per-user cosine k-NN over the stored
+# embeddings. Exact below SEM_SIMILARITY_IVF_MIN embeddings per user, IVF (scanning the
+# SEM_SIMILARITY_NPROBE closest lists) above; at most SEM_SIMILARITY_CACHE_USERS indexes are
+# kept in memory per process and at most SEM_SIMILARITY_MAX_K results returned.
+SEM_SIMILARITY_IVF_MIN = int(os.environ.get("SEM_SIMILARITY_IVF_MIN", "100000"))
+SEM_SIMILARITY_NPROBE = int(os.environ.get("SEM_SIMILARITY_NPROBE", "16"))
+SEM_SIMILARITY_CACHE_USERS = int(os.environ.get("SEM_SIMILARITY_CACHE_USERS", "32"))
+SEM_SIMILARITY_MAX_K = int(os.environ.get("SEM_SIMILARITY_MAX_K", "100"))
+
+# Drift monitor (prediction.drift): every prediction updates this worker's sketch of input
+# intensities, embeddings and predictions. A window is closed (scored against the checkpoint's
+# training reference, see src/ml/drift.py, and saved as a DriftWindow) after
+# SEM_DRIFT_WINDOW_SIZE predictions, or on the first prediction SEM_DRIFT_WINDOW_SECONDS after
+# it was opened. SEM_DRIFT_REFERENCE overrides the reference file ("" = <checkpoint>.drift.npz).
+# A window is flagged as drifted when a PSI exceeds SEM_DRIFT_PSI_ALERT, a KS p-value is below
+# SEM_DRIFT_KS_ALPHA or the embedding shift (in reference standard deviations) exceeds
+# SEM_DRIFT_EMBEDDING_ALERT.
+SEM_DRIFT_MONITOR = os.environ.get("SEM_DRIFT_MONITOR", "1").lower() in ("1", "true", "yes")
+SEM_DRIFT_WINDOW_SIZE = int(os.environ.get("SEM_DRIFT_WINDOW_SIZE", "200"))
+SEM_DRIFT_WINDOW_SECONDS = float(os.environ.get("SEM_DRIFT_WINDOW_SECONDS", "3600"))
+SEM_DRIFT_REFERENCE = os.environ.get("SEM_DRIFT_REFERENCE", "")
+SEM_DRIFT_PSI_ALERT = float(os.environ.get("SEM_DRIFT_PSI_ALERT", "0.2"))
+SEM_DRIFT_KS_ALPHA = float(os.environ.get("SEM_DRIFT_KS_ALPHA", "0.01"))
+SEM_DRIFT_EMBEDDING_ALERT = float(os.environ.get("SEM_DRIFT_EMBEDDING_ALERT", "0.5"))
+
+# Shadow mode (prediction.shadow): run registry version SEM_SHADOW_MODEL_VERSION on a
+# SEM_SHADOW_SAMPLE_RATE fraction of predictions in the background ("" = off) and log the
+# results as ShadowPrediction rows; at most SEM_SHADOW_MAX_PENDING runs are queued.
+SEM_SHADOW_MODEL_VERSION = os.environ.get("SEM_SHADOW_MODEL_VERSION", "")
+SEM_SHADOW_SAMPLE_RATE = float(os.environ.get("SEM_SHADOW_SAMPLE_RATE", "0.1"))
+SEM_SHADOW_MAX_PENDING = int(os.environ.get("SEM_SHADOW_MAX_PENDING", "8"))
+
+# Uncertainty estimate (src/ml/ensemble.py): SEM_ENSEMBLE_CHECKPOINTS is a comma-separated
+# list of checkpoints to average instead of SEM_MODEL_PATH, SEM_TTA_VIEWS the number of
+# flip/rotation views per image (1-8). With one model and one view the prediction has no
+# standard deviation (stored as null).
+SEM_ENSEMBLE_CHECKPOINTS = [
+    Path(p.strip()) for p in os.environ.get("SEM_ENSEMBLE_CHECKPOINTS", "").split(",") if p.strip()
+]
+SEM_TTA_VIEWS = int(os.environ.get("SEM_TTA_VIEWS", "1"))
+
+# Add a Server-Timing header (per-stage latency) to /api/predict/ responses.
+SEM_SERVER_TIMING = os.environ.get("SEM_SERVER_TIMING", str(DEBUG)).lower() in ("1", "true", "yes")
+
+# torch.profiler window over live /api/predict/ requests (prediction.inference.RequestProfiler):
+# skip SEM_PROFILE_SKIP requests, warm up on one, then record SEM_PROFILE_REQUESTS (0 = off).
+SEM_PROFILE_REQUESTS = int(os.environ.get("SEM_PROFILE_REQUESTS", "0"))
+SEM_PROFILE_SKIP = int(os.environ.get("SEM_PROFILE_SKIP", "1"))
+SEM_PROFILE_DIR = Path(os.environ.get("SEM_PROFILE_DIR", BASE_DIR / "profiles"))
+
 ROOT_URLCONF = 'sem_backend.urls'
 
 TEMPLATES = [
@@ -125,15 +231,95 @@ WSGI_APPLICATION = 'sem_backend.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
-DATABASES = {
-    "default": {
-        "ENGINE": "django.db.backends.sqlite3",
-        "NAME": BASE_DIR / "db.sqlite3",
+# SEM_DB_ENGINE selects the database without code changes:
+#   "sqlite"   (default) -> local file, tuned via SQLITE_PRAGMAS below
+#   "postgres"           -> PostgreSQL with a psycopg connection pool
+SEM_DB_ENGINE = os.environ.get("SEM_DB_ENGINE", "sqlite").lower()
+
+if SEM_DB_ENGINE == "postgres":
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.postgresql",
+            "NAME": os.environ.get("SEM_DB_NAME", "sem_backend"),
+            "USER": os.environ.get("SEM_DB_USER", "postgres"),
+            "PASSWORD": os.environ.get("SEM_DB_PASSWORD", ""),
+            "HOST": os.environ.get("SEM_DB_HOST", "localhost"),
+            "PORT": os.environ.get("SEM_DB_PORT", "5432"),
+            # The pool owns connection reuse, so persistent connections must stay off.
+            "CONN_MAX_AGE": 0,
+            "OPTIONS": {
+                "pool": {
+                    "min_size": int(os.environ.get("SEM_DB_POOL_MIN", "2")),
+                    "max_size": int(os.environ.get("SEM_DB_POOL_MAX", "10")),
+                    "timeout": float(os.environ.get("SEM_DB_POOL_TIMEOUT", "10")),
+                },
+            },
+        }
     }
-}
+else:
+    DATABASES = {
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": os.environ.get("SEM_DB_NAME", BASE_DIR / "db.sqlite3"),
+            # Keep connections open between requests instead of reconnecting each time.
+            "CONN_MAX_AGE": int(os.environ.get("SEM_DB_CONN_MAX_AGE", "60")),
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {
+                # Seconds the sqlite3 driver waits on a locked database.
+                "timeout": 20,
+                # Take the write lock at BEGIN so concurrent writers queue on
+                # busy_timeout instead of failing with "database is locked".
+                "transaction_mode": "IMMEDIATE",
+            },
+        }
+    }
+
+# Applied on every new SQLite connection by prediction.db (connection_created hook).
+# Set SEM_SQLITE_PROFILE=default to keep SQLite's stock rollback-journal behaviour.
+SEM_SQLITE_PROFILE = os.environ.get("SEM_SQLITE_PROFILE", "wal").lower()
+SQLITE_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",           # safe with WAL, avoids an fsync per commit
+    "cache_size": -64000,              # negative = KiB -> 64 MB page cache
+    "mmap_size": 268435456,            # 256 MB memory-mapped I/O
+    "busy_timeout": 20000,             # ms to wait for the write lock
+    "temp_store": "MEMORY",
+} if SEM_SQLITE_PROFILE == "wal" else {}
 
 MEDIA_URL = "media/"
-MEDIA_ROOT = BASE_DIR / "media"
+MEDIA_ROOT = Path(os.environ.get("SEM_MEDIA_ROOT", BASE_DIR / "media"))
+
+# Where uploaded SEM images are stored (MeanSizePrediction.image):
+#   "filesystem" (default) -> MEDIA_ROOT/sem_uploads/<ab>/<cd>/<file>
+#   "s3"                   -> S3-compatible bucket (AWS, MinIO, ...); needs django-storages[s3]
+SEM_UPLOAD_STORAGE = os.environ.get("SEM_UPLOAD_STORAGE", "filesystem").lower()
+
+if SEM_UPLOAD_STORAGE == "s3":
+    SEM_UPLOADS_STORAGE_CONFIG = {
+        "BACKEND": "prediction.storage.ShardedS3Storage",
+        "OPTIONS": {
+            "bucket_name": os.environ.get("SEM_S3_BUCKET", "sem-uploads"),
+            "endpoint_url": os.environ.get("SEM_S3_ENDPOINT_URL") or None,  # e.g. http://localhost:9000 for MinIO
+            "access_key": os.environ.get("SEM_S3_ACCESS_KEY") or None,
+            "secret_key": os.environ.get("SEM_S3_SECRET_KEY") or None,
+            "region_name": os.environ.get("SEM_S3_REGION") or None,
+            "file_overwrite": False,
+        },
+    }
+else:
+    SEM_UPLOADS_STORAGE_CONFIG = {
+        "BACKEND": "prediction.storage.ShardedFileSystemStorage",
+    }
+
+STORAGES = {
+    "default": {
+        "BACKEND": "django.core.files.storage.FileSystemStorage",
+    },
+    "staticfiles": {
+        "BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage",
+    },
+    "sem_uploads": SEM_UPLOADS_STORAGE_CONFIG,
+}
 
 
 
@@ -4,12 +4,15 @@ from django.contrib import admin
 from django.conf import settings
 from django.conf.urls.static import static
 
+from prediction.views import metrics_view
+
 def home(request):
     return HttpResponse("SEM Mean Size API – go to /api/predict/")
 
 urlpatterns = [
     path("", home),
     path("admin/", admin.site.urls),
+    path("metrics", metrics_view, name="metrics"),
     path("api/", include("prediction.urls")),
 ]
 
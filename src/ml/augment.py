@@ -0,0 +1,138 @@
+import torch
+import torch.nn as nn
+
+
+class BatchAugment(nn.Module):
+    """
+    Vectorized augmentation applied to a whole collated batch on the training
+    device, after the DataLoader (so workers only decode + normalize).
+
+    Every sample gets its own random parameters, but each op is a handful of
+    tensor ops over the full batch instead of a per-image PIL transform:
+      - horizontal / vertical flips
+      - 90° rotations (square images only)
+      - brightness / contrast jitter (additive shift, scale around the image mean)
+      - random crops rescaled back to the input size (separable bilinear,
+        equivalent to affine_grid + grid_sample but about 2x cheaper on CPU)
+
+    Flips, rotations and intensity jitter leave the mean particle size alone.
+    A crop of side fraction s rescaled to full size magnifies particles by 1/s,
+    so with scale_targets=True the targets are divided by s to stay consistent.
+
+    Expects images of shape (B, C, H, W) normalized to [-1, 1] (see
+    get_default_transforms) and targets of shape (B,).
+    """
+
+    def __init__(
+        self,
+        flip_p: float = 0.5,
+        rot90: bool = True,
+        brightness: float = 0.1,
+        contrast: float = 0.1,
+        crop_p: float = 0.5,
+        crop_scale: tuple[float, float] = (0.7, 1.0),
+        scale_targets: bool = True,
+        generator: torch.Generator | None = None,
+    ):
+        super().__init__()
+        if not 0.0 < crop_scale[0] <= crop_scale[1] <= 1.0:
+            raise ValueError(f"crop_scale must satisfy 0 < min <= max <= 1, got {crop_scale}")
+
+        self.flip_p = flip_p
+        self.rot90 = rot90
+        self.brightness = brightness
+        self.contrast = contrast
+        self.crop_p = crop_p
+        self.crop_scale = crop_scale
+        self.scale_targets = scale_targets
+        self.generator = generator
+
+    def _rand(self, *shape) -> torch.Tensor:
+        # Parameters are drawn on the CPU (optionally seeded) and moved with
+        # the batch; they are tiny compared to the images.
+        return torch.rand(*shape, generator=self.generator)
+
+    @staticmethod
+    def _where(mask: torch.Tensor, a: torch.Tensor, b: torch.Tensor) -> torch.Tensor:
+        return torch.where(mask.view(-1, 1, 1, 1), a, b)
+
+    def forward(self, images: torch.Tensor, targets: torch.Tensor):
+        if not self.training:
+            return images, targets
+
+        batch_size = images.size(0)
+        device = images.device
+
+        # A per-sample transpose plus the two flips below covers all 4
+        # rotations (and their mirrors) of the dihedral group.
+        if self.rot90 and images.size(-1) == images.size(-2):
+            transpose = (self._rand(batch_size) < 0.5).to(device)
+            images = self._where(transpose, images.transpose(-1, -2), images)
+
+        # Flips and crops are both axis-aligned affine maps, so they share a
+        # single resampling pass: a flip is just a negative scale.
+        flip = self._rand(2, batch_size) < self.flip_p
+        sign_y = 1 - 2 * flip[0].float()
+        sign_x = 1 - 2 * flip[1].float()
+        scale, ty, tx = self._crop_params(batch_size)
+
+        if flip.any() or (scale < 1).any():
+            images = self._resample_rows(images, scale * sign_y, ty)
+            images = self._resample_rows(images.transpose(-1, -2), scale * sign_x, tx).transpose(-1, -2)
+            if self.scale_targets:
+                targets = targets / scale.to(device=targets.device, dtype=targets.dtype)
+
+        if self.brightness > 0 or self.contrast > 0:
+            jitter = self._rand(2, batch_size).to(device=device, dtype=images.dtype) * 2 - 1
+            contrast = (1 + self.contrast * jitter[0]).view(-1, 1, 1, 1)
+            shift = (self.brightness * 2 * jitter[1]).view(-1, 1, 1, 1)  # [-1, 1] range is 2 wide
+            mean = images.mean(dim=(1, 2, 3), keepdim=True)
+            # (x - mean) * contrast + mean + shift, as a single fused pass
+            images = torch.addcmul(mean * (1 - contrast) + shift, images, contrast).clamp_(-1.0, 1.0)
+
+        return images, targets
+
+    def _crop_params(self, batch_size: int):
+        """
+        Per-sample crop side fraction s and center offsets (ty, tx), in the
+        normalized [-1, 1] coordinates of F.affine_grid. Samples that are not
+        cropped get s = 1 and zero offsets (the identity).
+        """
+        lo, hi = self.crop_scale
+        params = self._rand(4, batch_size)
+        apply = params[0] < self.crop_p
+        scale = torch.where(apply, lo + (hi - lo) * params[1], torch.ones(batch_size))
+        ty = (params[2] * 2 - 1) * (1 - scale)
+        tx = (params[3] * 2 - 1) * (1 - scale)
+        return scale, ty, tx
+
+    @staticmethod
+    def _resample_rows(x: torch.Tensor, scale: torch.Tensor, offset: torch.Tensor) -> torch.Tensor:
+        """
+        Linearly resample the rows (dim -2) of x at per-sample positions
+        scale * u + offset, u being the output row centers in [-1, 1]. Matches
+        grid_sample(align_corners=False, padding_mode="border") along one axis.
+        """
+        n, _, size, _ = x.shape
+        u = (torch.arange(size, dtype=torch.float32) * 2 + 1) / size - 1        # output row centers in [-1, 1]
+        src = ((scale[:, None] * u + offset[:, None] + 1) * size - 1) / 2       # [N, size] source rows
+        # Snap positions that are pixel centers up to float rounding, so that
+        # identity rows and pure flips copy pixels exactly.
+        src = torch.where((src - src.round()).abs() < 1e-3, src.round(), src).clamp(0, size - 1)
+        i0 = src.floor().long()
+        i1 = (i0 + 1).clamp(max=size - 1)
+        w = (src - i0).to(device=x.device, dtype=x.dtype).view(n, size, 1, 1)
+
+        # One advanced-indexing pass copies both neighbour rows as contiguous
+        # blocks, which is much cheaper than a gather with an expanded index.
+        batch = torch.arange(n, device=x.device)[:, None]
+        rows = x.permute(0, 2, 1, 3)[batch, torch.cat([i0, i1], dim=1).to(x.device)]  # [N, 2*size, C, W]
+        lower, upper = rows.split(size, dim=1)
+        return torch.lerp(lower, upper, w).permute(0, 2, 1, 3)
+
+    def extra_repr(self) -> str:
+        return (
+            f"flip_p={self.flip_p}, rot90={self.rot90}, brightness={self.brightness}, "
+            f"contrast={self.contrast}, crop_p={self.crop_p}, crop_scale={self.crop_scale}, "
+            f"scale_targets={self.scale_targets}"
+        )
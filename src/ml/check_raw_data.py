@@ -1,5 +1,12 @@
 from pathlib import Path
 from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+import argparse
+import csv
+import hashlib
+import json
+import os
 
 import pandas as pd
 from PIL import Image
@@ -10,114 +17,262 @@ PROJECT_ROOT = Path(__file__).resolve().parents[2]  # .../capstone2-sem-mean-siz
 RAW_DIR = PROJECT_ROOT / "data" / "raw"
 IMAGES_DIR = RAW_DIR / "images"
 CSV_PATH = RAW_DIR / "sem_mean_sizes.csv"
+MANIFEST_PATH = RAW_DIR / "manifest.csv"
+REPORT_PATH = RAW_DIR / "validation_report.json"
 
+EXPECTED_SIZE = (480, 480)
+
+MANIFEST_FIELDS = [
+    "filename", "file_size", "mtime_ns", "width", "height", "mode", "format", "hash", "label", "error",
+]
+
+
+def inspect_image(img_path: Path, compute_hash: bool = True) -> dict:
+    """
+    Read only the image header (Pillow opens lazily, no pixel decode) plus an
+    optional content hash. Runs in worker processes, so it must stay picklable.
+    """
+    entry = {"filename": img_path.name, "width": "", "height": "", "mode": "", "format": "", "hash": "", "error": ""}
+    try:
+        with Image.open(img_path) as img:
+            entry["width"], entry["height"] = img.size
+            entry["mode"] = img.mode
+            entry["format"] = img.format or ""
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+
+    if compute_hash and not entry["error"]:
+        digest = hashlib.blake2b(digest_size=16)
+        with open(img_path, "rb") as f:
+            for block in iter(lambda: f.read(1 << 20), b""):
+                digest.update(block)
+        entry["hash"] = digest.hexdigest()
+    return entry
+
+
+def load_manifest(manifest_path: Path) -> dict[str, dict]:
+    if not manifest_path.exists():
+        return {}
+    with open(manifest_path, newline="") as f:
+        return {row["filename"]: row for row in csv.DictReader(f)}
+
+
+def save_manifest(manifest_path: Path, entries: dict[str, dict]):
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = manifest_path.with_suffix(manifest_path.suffix + ".tmp")
+    with open(tmp_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=MANIFEST_FIELDS)
+        writer.writeheader()
+        for name in sorted(entries):
+            writer.writerow({k: entries[name].get(k, "") for k in MANIFEST_FIELDS})
+    os.replace(tmp_path, manifest_path)
 
-def main():
-    print("=== Checking raw SEM data ===")
-    print(f"Project root : {PROJECT_ROOT}")
-    print(f"Images folder: {IMAGES_DIR}")
-    print(f"CSV path     : {CSV_PATH}\n")
 
-    # --- Basic existence checks ---
-    if not IMAGES_DIR.exists():
-        raise SystemExit(f"[ERROR] Images folder not found: {IMAGES_DIR}")
+def scan_images(
+    images_dir: Path,
+    manifest_path: Path,
+    workers: int | None = None,
+    compute_hash: bool = True,
+) -> tuple[dict[str, dict], int]:
+    """
+    Return ({filename: manifest entry}, n_rechecked) for every PNG in images_dir.
 
-    if not CSV_PATH.exists():
-        raise SystemExit(f"[ERROR] CSV file not found: {CSV_PATH}")
+    Files whose size and mtime match the previous manifest are reused as-is;
+    only new or changed files are opened, in a process pool.
+    """
+    previous = load_manifest(manifest_path)
+    entries = {}
+    to_check = []
 
-    # --- Load CSV ---
-    df = pd.read_csv(CSV_PATH)
+    with os.scandir(images_dir) as it:
+        for dir_entry in it:
+            if not dir_entry.name.endswith(".png") or not dir_entry.is_file():
+                continue
+            stat = dir_entry.stat()
+            old = previous.get(dir_entry.name)
+            if (
+                old is not None
+                and old["file_size"] == str(stat.st_size)
+                and old["mtime_ns"] == str(stat.st_mtime_ns)
+                and (old["hash"] or not compute_hash or old["error"])
+            ):
+                entries[dir_entry.name] = dict(old)
+            else:
+                to_check.append((Path(dir_entry.path), stat))
+
+    if to_check:
+        paths = [path for path, _ in to_check]
+        chunksize = max(1, len(paths) // ((workers or os.cpu_count() or 1) * 8))
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(inspect_image, paths, [compute_hash] * len(paths), chunksize=chunksize)
+            for (path, stat), entry in zip(to_check, results):
+                entry["file_size"] = stat.st_size
+                entry["mtime_ns"] = stat.st_mtime_ns
+                entries[path.name] = entry
+
+    return entries, len(to_check)
+
+
+def validate_raw_data(
+    images_dir: Path = IMAGES_DIR,
+    csv_path: Path = CSV_PATH,
+    manifest_path: Path = MANIFEST_PATH,
+    report_path: Path | None = REPORT_PATH,
+    workers: int | None = None,
+    compute_hash: bool = True,
+) -> dict:
+    """
+    Validate the raw SEM dataset and return a machine-readable report.
+
+    The manifest (filename, file size, mtime, dimensions, mode, format, hash,
+    label) is updated in place; the report lists "valid_filenames" that
+    SemMeanSizeDataset(report_path=...) can use to skip per-item checks.
+    """
+    images_dir = Path(images_dir)
+    csv_path = Path(csv_path)
+
+    if not images_dir.exists():
+        raise SystemExit(f"[ERROR] Images folder not found: {images_dir}")
+
+    if not csv_path.exists():
+        raise SystemExit(f"[ERROR] CSV file not found: {csv_path}")
+
+    # --- CSV checks ---
+    df = pd.read_csv(csv_path)
 
     required_cols = {"filename", "mean_size_nm"}
     missing_cols = required_cols - set(df.columns)
     if missing_cols:
         raise SystemExit(f"[ERROR] CSV missing columns: {missing_cols}")
 
-    print(f"Loaded {len(df)} rows from CSV.\n")
-
-    # --- Clean up filename column (strip spaces) ---
     df["filename"] = df["filename"].astype(str).str.strip()
-
-    # --- Check duplicates in filenames ---
-    dup_mask = df["filename"].duplicated(keep=False)
-    if dup_mask.any():
-        print("[WARNING] Duplicate filenames in CSV:")
-        print(df.loc[dup_mask, "filename"].value_counts())
-    else:
-        print("[OK] No duplicate filenames in CSV.")
-
-    # --- Check mean_size_nm is numeric and positive ---
     numeric_sizes = pd.to_numeric(df["mean_size_nm"], errors="coerce")
-    non_numeric = numeric_sizes.isna()
-    if non_numeric.any():
-        print("\n[ERROR] Non-numeric values in mean_size_nm at rows:")
-        print(df.index[non_numeric].tolist())
-    else:
-        print("[OK] All mean_size_nm values are numeric.")
+    df["mean_size_nm"] = numeric_sizes
 
-    negative_or_zero = numeric_sizes <= 0
-    if negative_or_zero.any():
-        print("\n[WARNING] Non-positive mean_size_nm values at rows:")
-        print(df.loc[negative_or_zero, ["filename", "mean_size_nm"]])
-    else:
-        print("[OK] All mean_size_nm values are > 0.")
+    duplicate_filenames = sorted(df.loc[df["filename"].duplicated(keep=False), "filename"].unique())
+    non_numeric_rows = df.index[numeric_sizes.isna()].tolist()
+    non_positive = df.loc[numeric_sizes <= 0, "filename"].tolist()
+
+    # --- Image checks (incremental) ---
+    entries, n_rechecked = scan_images(images_dir, Path(manifest_path), workers=workers, compute_hash=compute_hash)
 
-    df["mean_size_nm"] = numeric_sizes  # replace with cleaned numeric values
+    labels = dict(zip(df["filename"], df["mean_size_nm"]))
+    for name, entry in entries.items():
+        label = labels.get(name)
+        entry["label"] = "" if label is None or pd.isna(label) else repr(float(label))
+    save_manifest(Path(manifest_path), entries)
 
-    # --- Check files exist on disk ---
-    all_image_files = {p.name for p in IMAGES_DIR.glob("*.png")}
+    all_image_files = set(entries)
     csv_files = set(df["filename"])
+    unreadable = {name: e["error"] for name, e in entries.items() if e["error"]}
+    non_png = sorted(name for name, e in entries.items() if not e["error"] and e["format"] != "PNG")
+    size_counter = Counter(
+        f"{e['width']}x{e['height']}" for e in entries.values() if not e["error"]
+    )
 
-    missing_images = csv_files - all_image_files
-    extra_images = all_image_files - csv_files
+    valid_filenames = sorted(
+        name for name, label in labels.items()
+        if name in entries and name not in unreadable and not pd.isna(label)
+    )
 
-    if missing_images:
-        print("\n[ERROR] These filenames are in CSV but missing as PNG files:")
-        for name in sorted(missing_images):
-            print("  -", name)
-    else:
-        print("[OK] Every CSV filename has a matching PNG image.")
+    report = {
+        "generated_at": datetime.now(timezone.utc).isoformat(),
+        "images_dir": str(images_dir.resolve()),
+        "csv_path": str(csv_path.resolve()),
+        "expected_size": f"{EXPECTED_SIZE[0]}x{EXPECTED_SIZE[1]}",
+        "counts": {
+            "csv_rows": int(len(df)),
+            "images": len(all_image_files),
+            "rechecked": n_rechecked,
+            "valid": len(valid_filenames),
+        },
+        "sizes": dict(size_counter),
+        "duplicate_filenames": duplicate_filenames,
+        "non_numeric_rows": non_numeric_rows,
+        "non_positive": non_positive,
+        "missing_images": sorted(csv_files - all_image_files),
+        "extra_images": sorted(all_image_files - csv_files),
+        "unreadable": unreadable,
+        "non_png": non_png,
+        "valid_filenames": valid_filenames,
+    }
 
-    if extra_images:
-        print("\n[WARNING] These PNG files exist but are NOT listed in CSV:")
-        for name in sorted(extra_images):
-            print("  -", name)
-    else:
-        print("[OK] No extra images without labels.\n")
-
-    # --- Check image format & resolution ---
-    print("\nChecking image format & resolution (this may take a moment)...")
-    size_counter = Counter()
-    non_png_files = []
-
-    for img_name in all_image_files:
-        img_path = IMAGES_DIR / img_name
-        try:
-            with Image.open(img_path) as img:
-                size_counter[img.size] += 1
-                if img.format != "PNG":
-                    non_png_files.append(img_name)
-        except Exception as e:
-            print(f"[ERROR] Could not open image {img_name}: {e}")
+    if report_path is not None:
+        report_path = Path(report_path)
+        report_path.parent.mkdir(parents=True, exist_ok=True)
+        report_path.write_text(json.dumps(report, indent=2))
+
+    return report
+
+
+def print_report(report: dict):
+    counts = report["counts"]
+    print(f"Loaded {counts['csv_rows']} rows from CSV, found {counts['images']} PNG files "
+          f"({counts['rechecked']} new or changed since the last run).\n")
+
+    def section(items, ok_msg, bad_msg, level="WARNING"):
+        if items:
+            print(f"\n[{level}] {bad_msg}")
+            for item in items:
+                print("  -", item)
+        else:
+            print(f"[OK] {ok_msg}")
+
+    section(report["duplicate_filenames"], "No duplicate filenames in CSV.", "Duplicate filenames in CSV:")
+    section(report["non_numeric_rows"], "All mean_size_nm values are numeric.",
+            "Non-numeric values in mean_size_nm at rows:", level="ERROR")
+    section(report["non_positive"], "All mean_size_nm values are > 0.", "Non-positive mean_size_nm values for:")
+    section(report["missing_images"], "Every CSV filename has a matching PNG image.",
+            "These filenames are in CSV but missing as PNG files:", level="ERROR")
+    section(report["extra_images"], "No extra images without labels.",
+            "These PNG files exist but are NOT listed in CSV:")
+    section([f"{name}: {err}" for name, err in report["unreadable"].items()], "All images could be opened.",
+            "Could not open these images:", level="ERROR")
 
     print("\nImage sizes found (width x height : count):")
-    for size, count in size_counter.items():
-        print(f"  {size[0]}x{size[1]} : {count}")
+    for size, count in report["sizes"].items():
+        print(f"  {size} : {count}")
 
-    expected_size = (480, 480)
-    if size_counter and expected_size not in size_counter:
-        print(f"\n[WARNING] No images with expected size {expected_size[0]}x{expected_size[1]}.")
+    expected = report["expected_size"]
+    if report["sizes"] and expected not in report["sizes"]:
+        print(f"\n[WARNING] No images with expected size {expected}.")
     else:
-        print(f"[OK] At least some images have the expected size {expected_size[0]}x{expected_size[1]}.")
+        print(f"[OK] At least some images have the expected size {expected}.")
 
-    if non_png_files:
-        print("\n[WARNING] These files are not PNG format according to Pillow:")
-        for name in non_png_files:
-            print("  -", name)
-    else:
-        print("[OK] All images are PNG format according to Pillow.")
+    section(report["non_png"], "All images are PNG format according to Pillow.",
+            "These files are not PNG format according to Pillow:")
+
+    print(f"\n{counts['valid']} labelled, readable images are usable for training.")
+
+
+def main(argv=None) -> dict:
+    parser = argparse.ArgumentParser(description="Validate the raw SEM images and labels CSV.")
+    parser.add_argument("--images-dir", type=Path, default=IMAGES_DIR)
+    parser.add_argument("--csv", type=Path, default=CSV_PATH)
+    parser.add_argument("--manifest", type=Path, default=MANIFEST_PATH,
+                        help="Cached per-image manifest; only new/changed files are re-checked.")
+    parser.add_argument("--report", type=Path, default=REPORT_PATH, help="Where to write the JSON report.")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count).")
+    parser.add_argument("--no-hash", action="store_true", help="Skip content hashing (header reads only).")
+    args = parser.parse_args(argv)
+
+    print("=== Checking raw SEM data ===")
+    print(f"Project root : {PROJECT_ROOT}")
+    print(f"Images folder: {args.images_dir}")
+    print(f"CSV path     : {args.csv}\n")
 
+    report = validate_raw_data(
+        images_dir=args.images_dir,
+        csv_path=args.csv,
+        manifest_path=args.manifest,
+        report_path=args.report,
+        workers=args.workers,
+        compute_hash=not args.no_hash,
+    )
+    print_report(report)
+    print(f"\nReport written to: {args.report}")
     print("\n=== Data check finished ===")
+    return report
 
 
 if __name__ == "__main__":
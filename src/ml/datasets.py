@@ -1,9 +1,12 @@
 from pathlib import Path
+import json
 
+import numpy as np
 import pandas as pd
 from PIL import Image
 
 import torch
+from torch.profiler import record_function
 from torch.utils.data import Dataset
 from torchvision import transforms
 
@@ -11,7 +14,8 @@ from torchvision import transforms
 def get_default_transforms(train: bool = True):
     """
     Returns the default torchvision transforms for SEM images.
-    train=True: includes data augmentation (optional, minimal for now).
+    train=True: currently the same as train=False; augmentation runs per batch
+    after the DataLoader instead (see augment.BatchAugment / train.py --augment).
     """
 
     base_transforms = [
@@ -20,12 +24,8 @@ def get_default_transforms(train: bool = True):
     ]
 
     if train:
-        # NOTE: anyone clones our repo can add light augmentations here later, e.g.:
-        # augmentations = [
-        #     transforms.RandomHorizontalFlip(),
-        #     transforms.RandomVerticalFlip(),
-        # ]
-        # return transforms.Compose(augmentations + base_transforms)
+        # NOTE: per-image PIL augmentations here would run in every worker for
+        # every sample; batch-level ones (augment.BatchAugment) are much cheaper.
         return transforms.Compose(base_transforms)
     else:
         return transforms.Compose(base_transforms)
@@ -38,6 +38,10 @@ class SemMeanSizeDataset(Dataset):
     Assumes:
       - Images are in PNG format under images_dir (e.g. data/raw/images/)
       - Labels are in a CSV with columns: filename, mean_size_nm
+
+    If report_path points to a report from check_raw_data.py, only the
+    filenames it lists as valid are used and the per-item exists() check is
+    skipped (the validator already confirmed the files are there and readable).
     """
 
     def __init__(
@@ -45,6 +49,7 @@ class SemMeanSizeDataset(Dataset):
         csv_path: str | Path,
         images_dir: str | Path,
         transform=None,
+        report_path: str | Path | None = None,
     ):
         super().__init__()
 
@@ -71,29 +76,43 @@ class SemMeanSizeDataset(Dataset):
         df["filename"] = df["filename"].astype(str).str.strip()
         df["mean_size_nm"] = pd.to_numeric(df["mean_size_nm"], errors="raise")
 
-        self.df = df.reset_index(drop=True)
+        self.check_files = True
+        if report_path is not None:
+            report = json.loads(Path(report_path).read_text())
+            if Path(report["images_dir"]) != self.images_dir.resolve():
+                raise ValueError(
+                    f"Validation report {report_path} was made for {report['images_dir']}, "
+                    f"not {self.images_dir.resolve()}"
+                )
+            df = df[df["filename"].isin(set(report["valid_filenames"]))]
+            self.check_files = False
+
+        # Keep labels in compact arrays instead of the DataFrame: fixed-width
+        # UTF-8 filenames and a float32 tensor pickle as two flat buffers, so
+        # DataLoader workers start fast and indexing costs no pandas overhead.
+        self.filenames = np.array([name.encode("utf-8") for name in df["filename"]], dtype=np.bytes_)
+        self.targets = torch.from_numpy(df["mean_size_nm"].to_numpy(dtype=np.float32))
 
     def __len__(self):
-        return len(self.df)
+        return len(self.filenames)
 
     def __getitem__(self, idx: int):
-        row = self.df.iloc[idx]
-        filename = row["filename"]
-        mean_size = float(row["mean_size_nm"])
+        filename = self.filenames[idx].decode("utf-8")
+        target = self.targets[idx]  # 0-d float32 tensor
 
         img_path = self.images_dir / filename
-        if not img_path.exists():
+        if self.check_files and not img_path.exists():
             raise FileNotFoundError(f"Image file not found: {img_path}")
 
         # Load image as grayscale
-        with Image.open(img_path) as img:
-            img = img.convert("L")  # 'L' = 8-bit grayscale
+        with record_function("dataset.decode"):
+            with Image.open(img_path) as img:
+                img = img.convert("L")  # 'L' = 8-bit grayscale
 
         if self.transform is not None:
-            img = self.transform(img)
+            with record_function("dataset.transform"):
+                img = self.transform(img)
 
         # img: torch.Tensor [1, 480, 480]
-        # mean_size: scalar float (we'll convert to tensor here)
-        target = torch.tensor(mean_size, dtype=torch.float32)
-
+        # target: scalar float32 tensor (mean size in nm)
         return img, target
@@ -0,0 +1,106 @@
+"""
+Helpers for DistributedDataParallel training on CPU nodes (gloo backend).
+
+train.py calls init_distributed() at start-up: when launched by torchrun
+(which sets RANK / WORLD_SIZE / MASTER_ADDR / MASTER_PORT) it joins the
+process group, otherwise everything here degrades to single-process no-ops,
+so the same code path serves both modes.
+
+Single machine, 4 processes:
+    torchrun --standalone --nproc_per_node 4 src/ml/train.py --epochs 10
+
+Several nodes (run on each, with its own --node_rank):
+    torchrun --nnodes 3 --nproc_per_node 1 --node_rank 0 \
+        --rdzv_backend c10d --rdzv_endpoint head-node:29500 src/ml/train.py
+"""
+from datetime import timedelta
+import math
+import os
+
+import torch
+import torch.distributed as dist
+from torch.utils.data import Sampler
+
+
+def init_distributed(backend: str = "gloo", timeout_s: float = 1800) -> tuple[int, int]:
+    """
+    Join the default process group if running under torchrun.
+    Returns (rank, world_size); (0, 1) when not distributed.
+    """
+    if dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+
+    world_size = int(os.environ.get("WORLD_SIZE", 1))
+    if world_size <= 1 or not dist.is_available():
+        return 0, 1
+
+    dist.init_process_group(backend=backend, timeout=timedelta(seconds=timeout_s))
+    return dist.get_rank(), dist.get_world_size()
+
+
+def cleanup_distributed():
+    if dist.is_initialized():
+        dist.destroy_process_group()
+
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+
+def get_rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+
+def is_main_process() -> bool:
+    return get_rank() == 0
+
+
+def print0(*args, **kwargs):
+    """print() on rank 0 only."""
+    if is_main_process():
+        print(*args, **kwargs)
+
+
+def barrier():
+    if is_distributed():
+        dist.barrier()
+
+
+def all_reduce_sum(values: list[float]) -> list[float]:
+    """Sum a few Python scalars over all ranks (one collective call)."""
+    if not is_distributed():
+        return list(values)
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor, op=dist.ReduceOp.SUM)
+    return tensor.tolist()
+
+
+def unwrap_model(model: torch.nn.Module) -> torch.nn.Module:
+    """The underlying model of a DDP wrapper (checkpoints never carry the "module." prefix)."""
+    return model.module if isinstance(model, torch.nn.parallel.DistributedDataParallel) else model
+
+
+class UnpaddedDistributedSampler(Sampler):
+    """
+    Evaluation sampler: rank r gets indices r, r + world, r + 2 * world, ...
+
+    Unlike DistributedSampler it never pads by repeating samples, so summing
+    per-rank error totals and counts with all_reduce_sum gives exactly the
+    single-process metrics. Ranks may differ by one sample, which is fine for
+    no-grad evaluation (there is no gradient all-reduce to keep in lockstep).
+    """
+
+    def __init__(self, dataset, rank: int | None = None, world_size: int | None = None):
+        self.dataset = dataset
+        self.rank = get_rank() if rank is None else rank
+        self.world_size = get_world_size() if world_size is None else world_size
+
+    def __iter__(self):
+        return iter(range(self.rank, len(self.dataset), self.world_size))
+
+    def __len__(self):
+        return max(0, math.ceil((len(self.dataset) - self.rank) / self.world_size))
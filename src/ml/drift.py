@@ -0,0 +1,232 @@
+"""
+Input and prediction drift sketches for SemMeanSizeCNN.
+
+A DriftSketch summarises a set of images in fixed-size arrays, so it is
+updated in O(1) per image and two sketches merge by addition:
+
+  - intensity: histogram of the preprocessed pixel values (after
+    Normalize, so in [-1, 1]), each image contributing its normalised
+    histogram -- a new detector, contrast or brightness setting shows up here
+  - embedding: count, sum and sum of squares of the 256-d global_pool
+    embedding (SemMeanSizeCNN.embed) -- per-dimension mean and variance of
+    what the regressor sees
+  - prediction: histogram of the predicted mean size on log-spaced bins
+
+compare() scores a sketch (a window of live traffic) against a reference
+(the training set): PSI and a binned two-sample Kolmogorov-Smirnov test for
+the two histograms (with the number of images as sample size), and the mean
+standardised shift of the embedding means.
+
+The sketch and the tests only need NumPy; torch is imported inside the
+functions that compute the statistics of a batch, so the backend can use
+this module without loading it.
+
+Build the reference for a checkpoint from the training split:
+    python drift.py --model models/best_sem_meansize_cnn.pt
+(writes models/best_sem_meansize_cnn.drift.npz next to the checkpoint).
+"""
+from pathlib import Path
+import argparse
+import math
+
+import numpy as np
+
+
+EMBEDDING_DIM = 256
+INTENSITY_EDGES = np.linspace(-1.0, 1.0, 65)
+# Predicted sizes: 0.5 nm .. 2 um, with under/overflow bins
+PREDICTION_EDGES = np.concatenate([[-np.inf], np.geomspace(0.5, 2000.0, 47), [np.inf]])
+REFERENCE_SUFFIX = ".drift.npz"
+
+
+def reference_path(checkpoint_path: str | Path) -> Path:
+    """Where the drift reference of a checkpoint lives: <checkpoint stem>.drift.npz beside it."""
+    checkpoint_path = Path(checkpoint_path)
+    return checkpoint_path.with_name(checkpoint_path.stem + REFERENCE_SUFFIX)
+
+
+def _prediction_bins(mean_sizes_nm):
+    bins = np.searchsorted(PREDICTION_EDGES, mean_sizes_nm, side="right") - 1
+    return np.clip(bins, 0, len(PREDICTION_EDGES) - 2)
+
+
+class DriftSketch:
+    FIELDS = ("count", "intensity", "prediction", "embedding_sum", "embedding_sumsq")
+
+    def __init__(self):
+        self.count = 0
+        self.intensity = np.zeros(len(INTENSITY_EDGES) - 1)
+        self.prediction = np.zeros(len(PREDICTION_EDGES) - 1)
+        self.embedding_sum = np.zeros(EMBEDDING_DIM)
+        self.embedding_sumsq = np.zeros(EMBEDDING_DIM)
+
+    def update(self, intensity_hist, embedding, mean_size_nm: float):
+        """Add one image: its intensity histogram (counts), embedding and prediction."""
+        intensity_hist = np.asarray(intensity_hist, dtype=np.float64)
+        embedding = np.asarray(embedding, dtype=np.float64)
+        self.count += 1
+        self.intensity += intensity_hist / max(intensity_hist.sum(), 1.0)
+        self.prediction[_prediction_bins(mean_size_nm)] += 1
+        self.embedding_sum += embedding
+        self.embedding_sumsq += embedding * embedding
+
+    def update_batch(self, intensity_hists, embeddings, mean_sizes_nm):
+        """update() for (N, bins), (N, 256) and (N,) arrays."""
+        intensity_hists = np.asarray(intensity_hists, dtype=np.float64)
+        embeddings = np.asarray(embeddings, dtype=np.float64)
+        mean_sizes_nm = np.asarray(mean_sizes_nm, dtype=np.float64).reshape(-1)
+        self.count += len(mean_sizes_nm)
+        self.intensity += (intensity_hists / np.maximum(intensity_hists.sum(axis=1, keepdims=True), 1.0)).sum(axis=0)
+        self.prediction += np.bincount(_prediction_bins(mean_sizes_nm), minlength=len(self.prediction))
+        self.embedding_sum += embeddings.sum(axis=0)
+        self.embedding_sumsq += (embeddings * embeddings).sum(axis=0)
+
+    def merge(self, other: "DriftSketch") -> "DriftSketch":
+        merged = DriftSketch()
+        for name in self.FIELDS:
+            setattr(merged, name, getattr(self, name) + getattr(other, name))
+        return merged
+
+    @property
+    def embedding_mean(self) -> np.ndarray:
+        return self.embedding_sum / max(self.count, 1)
+
+    @property
+    def embedding_var(self) -> np.ndarray:
+        return np.maximum(self.embedding_sumsq / max(self.count, 1) - self.embedding_mean ** 2, 0.0)
+
+    def to_dict(self) -> dict:
+        """JSON-serialisable form (see from_dict)."""
+        return {name: (getattr(self, name).tolist() if name != "count" else self.count) for name in self.FIELDS}
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DriftSketch":
+        sketch = cls()
+        sketch.count = int(data["count"])
+        for name in cls.FIELDS[1:]:
+            setattr(sketch, name, np.asarray(data[name], dtype=np.float64))
+        return sketch
+
+    def save(self, path: str | Path):
+        np.savez(path, **{name: getattr(self, name) for name in self.FIELDS})
+
+    @classmethod
+    def load(cls, path: str | Path) -> "DriftSketch":
+        with np.load(path) as data:
+            return cls.from_dict({name: data[name] for name in cls.FIELDS})
+
+
+def psi(reference, current, eps: float = 1e-4) -> float:
+    """Population stability index between two histograms (counts or mass)."""
+    p = np.asarray(reference, dtype=np.float64)
+    q = np.asarray(current, dtype=np.float64)
+    p = np.maximum(p / max(p.sum(), eps), eps)
+    q = np.maximum(q / max(q.sum(), eps), eps)
+    return float(np.sum((q - p) * np.log(q / p)))
+
+
+def kolmogorov_sf(x: float) -> float:
+    """P(K > x) for the Kolmogorov distribution (asymptotic KS p-value)."""
+    if x <= 0:
+        return 1.0
+    if x < 0.2:
+        return 1.0  # to within 1e-20
+    total = sum((-1) ** (j - 1) * math.exp(-2.0 * j * j * x * x) for j in range(1, 101))
+    return float(min(max(2.0 * total, 0.0), 1.0))
+
+
+def ks_binned(reference, current, n_reference: int, n_current: int) -> tuple[float, float]:
+    """
+    Two-sample KS statistic (max CDF difference over the bin edges) and its
+    asymptotic p-value for histograms of n_reference and n_current samples.
+    """
+    if n_reference == 0 or n_current == 0:
+        return 0.0, 1.0
+    p = np.cumsum(reference) / max(np.sum(reference), 1e-12)
+    q = np.cumsum(current) / max(np.sum(current), 1e-12)
+    statistic = float(np.max(np.abs(p - q)))
+    n_eff = n_reference * n_current / (n_reference + n_current)
+    return statistic, kolmogorov_sf((math.sqrt(n_eff) + 0.12 + 0.11 / math.sqrt(n_eff)) * statistic)
+
+
+def embedding_shift(reference: DriftSketch, current: DriftSketch) -> float:
+    """Mean over dimensions of |mean difference| / reference std."""
+    if current.count == 0:
+        return 0.0
+    std = np.sqrt(reference.embedding_var) + 1e-6
+    return float(np.mean(np.abs(current.embedding_mean - reference.embedding_mean) / std))
+
+
+def compare(reference: DriftSketch, current: DriftSketch) -> dict[str, float]:
+    """Drift scores of current against reference."""
+    intensity_ks, intensity_p = ks_binned(reference.intensity, current.intensity, reference.count, current.count)
+    prediction_ks, prediction_p = ks_binned(reference.prediction, current.prediction, reference.count, current.count)
+    return {
+        "intensity_psi": psi(reference.intensity, current.intensity),
+        "intensity_ks": intensity_ks,
+        "intensity_ks_pvalue": intensity_p,
+        "prediction_psi": psi(reference.prediction, current.prediction),
+        "prediction_ks": prediction_ks,
+        "prediction_ks_pvalue": prediction_p,
+        "embedding_shift": embedding_shift(reference, current),
+    }
+
+
+def intensity_histograms(images):
+    """(N, 1, H, W) preprocessed images -> (N, 64) pixel counts per intensity bin."""
+    import torch
+
+    flat = images.detach().flatten(1).float().clamp(-1.0, 1.0)
+    n_bins = len(INTENSITY_EDGES) - 1
+    bins = ((flat + 1.0) * (n_bins / 2.0)).long().clamp_(max=n_bins - 1)
+    bins += torch.arange(len(flat), device=flat.device).unsqueeze(1) * n_bins
+    return torch.bincount(bins.flatten(), minlength=len(flat) * n_bins).view(len(flat), n_bins).cpu().numpy()
+
+
+def build_reference(model, loader, device=None) -> DriftSketch:
+    """DriftSketch of the model's embeddings and predictions over a DataLoader of (images, labels)."""
+    import torch
+
+    device = device or next(model.parameters()).device
+    sketch = DriftSketch()
+    model.eval()
+    with torch.no_grad():
+        for images, _ in loader:
+            images = images.to(device)
+            preds, embeddings = model.forward_with_embedding(images)
+            sketch.update_batch(
+                intensity_histograms(images), embeddings.cpu().numpy(), preds.clamp(min=0.0).cpu().numpy(),
+            )
+    return sketch
+
+
+def main():
+    import torch
+
+    from infer import load_model
+    from registry import ModelRegistry, resolve_checkpoint
+    from train import create_dataloaders
+
+    project_root = Path(__file__).resolve().parents[2]
+    parser = argparse.ArgumentParser(description="Build the drift reference of a checkpoint from the training split.")
+    parser.add_argument("--model", type=str, default=None, help="Checkpoint (default: registry's active version).")
+    parser.add_argument("--version", type=str, default=None, help="Model registry version instead of --model.")
+    parser.add_argument("--csv", type=Path, default=project_root / "data" / "raw" / "sem_mean_sizes.csv")
+    parser.add_argument("--images", type=Path, default=project_root / "data" / "raw" / "images")
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--output", type=Path, default=None, help="Default: <checkpoint stem>.drift.npz beside it.")
+    args = parser.parse_args()
+
+    model_path = ModelRegistry().checkpoint_path(args.version) if args.version else resolve_checkpoint(args.model)
+    model, device = load_model(model_path)
+    # Same seeded split as training; only the train part is the reference
+    train_loader, _, _ = create_dataloaders(args.csv, args.images, batch_size=args.batch_size)
+    sketch = build_reference(model, train_loader, device)
+
+    output = args.output or reference_path(model_path)
+    sketch.save(output)
+    print(f"Drift reference over {sketch.count} training images -> {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Warm-start fine-tuning of a trained SemMeanSizeCNN on newly labelled images.
+
+Instead of retraining from scratch on the whole CSV (train.py), this loads
+an existing checkpoint and:
+
+  - freezes the first --freeze ConvBlocks (weights and BatchNorm statistics)
+  - trains the remaining blocks + head on the new images plus a replay
+    sample of the old training split (--replay old images per new image),
+    so the model does not forget the old distribution
+  - runs the frozen blocks only once: their outputs for all training images
+    are cached (float16 by default; ~0.5 MB per image with --freeze 3) and
+    the epochs run train_one_epoch on the unfrozen tail. The first three
+    blocks are ~70% of the forward cost at 480x480 and need no backward pass.
+
+Test metrics of the base and the fine-tuned model are computed on the old
+test split and on a held-out part of the new images, and with --register
+the result is added to the model registry with the base version as parent.
+
+Caching means the cached images are never augmented (BatchAugment runs on
+input images); use --freeze 0 to fine-tune end to end with --augment.
+
+CLI:
+    python finetune.py --new-csv data/new/sem_mean_sizes.csv --new-images data/new/images \
+        --freeze 3 --epochs 10 --register
+"""
+from pathlib import Path
+import argparse
+import time
+
+import torch
+import torch.nn as nn
+from torch.utils.data import ConcatDataset, DataLoader, Subset, TensorDataset, random_split
+
+from augment import BatchAugment
+from datasets import SemMeanSizeDataset, get_default_transforms
+from infer import load_model
+from model import SemMeanSizeCNN
+from registry import ModelRegistry, resolve_checkpoint
+from train import create_dataloaders, evaluate, train_one_epoch
+
+
+class TrainableTail(nn.Module):
+    """
+    The part of a SemMeanSizeCNN after its first n_frozen ConvBlocks: maps
+    the frozen blocks' output to the prediction. Shares its modules with the
+    model, so training the tail trains the model.
+    """
+
+    def __init__(self, model: SemMeanSizeCNN, n_frozen: int):
+        super().__init__()
+        self.blocks = model.features[n_frozen:]
+        self.global_pool = model.global_pool
+        self.regressor = model.regressor
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.regressor(self.global_pool(self.blocks(x))).squeeze(-1)
+
+
+def freeze_prefix(model: SemMeanSizeCNN, n_frozen: int) -> nn.Sequential:
+    """Freeze (and put in eval mode) the first n_frozen ConvBlocks; returns them."""
+    if not 0 <= n_frozen < len(model.features):
+        raise ValueError(f"Can freeze 0..{len(model.features) - 1} ConvBlocks, got {n_frozen}")
+    prefix = model.features[:n_frozen]
+    prefix.eval()
+    prefix.requires_grad_(False)
+    return prefix
+
+
+@torch.no_grad()
+def cache_features(
+    prefix: nn.Module,
+    dataset,
+    device: torch.device,
+    batch_size: int = 16,
+    dtype: torch.dtype = torch.float16,
+    num_workers: int = 0,
+) -> TensorDataset:
+    """(prefix(image), target) for every item of dataset, computed once."""
+    features, targets = [], []
+    for images, batch_targets in DataLoader(dataset, batch_size=batch_size, num_workers=num_workers):
+        features.append(prefix(images.to(device)).to("cpu", dtype))
+        targets.append(batch_targets)
+    return TensorDataset(torch.cat(features), torch.cat(targets))
+
+
+class _Upcast(nn.Module):
+    """Cast cached (float16) features back to the tail's dtype."""
+
+    def __init__(self, tail: nn.Module):
+        super().__init__()
+        self.tail = tail
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        return self.tail(x.float())
+
+
+def replay_sample(dataset, n: int, seed: int = 0):
+    """n random items of dataset (all of them if it has fewer)."""
+    if n >= len(dataset):
+        return dataset
+    generator = torch.Generator().manual_seed(seed)
+    return Subset(dataset, torch.randperm(len(dataset), generator=generator)[:n].tolist())
+
+
+def fine_tune(
+    model: SemMeanSizeCNN,
+    train_dataset,
+    device: torch.device,
+    n_frozen: int = 3,
+    epochs: int = 10,
+    learning_rate: float = 1e-4,
+    batch_size: int = 16,
+    cache_dtype: torch.dtype = torch.float16,
+    augment: nn.Module | None = None,
+    num_workers: int = 0,
+    seed: int = 0,
+) -> dict:
+    """
+    Fine-tune model in place on train_dataset (new + replay items).
+    Returns per-epoch train loss/MAE and the time spent caching and training.
+    """
+    torch.manual_seed(seed)
+    prefix = freeze_prefix(model, n_frozen)
+    criterion = nn.MSELoss()
+
+    t0 = time.perf_counter()
+    if n_frozen > 0:
+        if augment is not None:
+            raise ValueError("Augmentation needs the input images; use n_frozen=0 with augment")
+        cached = cache_features(prefix, train_dataset, device, batch_size, cache_dtype, num_workers)
+        trainable = _Upcast(TrainableTail(model, n_frozen))
+        loader = DataLoader(cached, batch_size=batch_size, shuffle=True)
+    else:
+        trainable = model
+        loader = DataLoader(train_dataset, batch_size=batch_size, shuffle=True, num_workers=num_workers)
+    t1 = time.perf_counter()
+
+    params = [p for p in model.parameters() if p.requires_grad]
+    optimizer = torch.optim.Adam(params, lr=learning_rate)
+    history = []
+    for _ in range(epochs):
+        history.append(train_one_epoch(trainable, loader, criterion, optimizer, device, augment=augment))
+    t2 = time.perf_counter()
+
+    model.eval()
+    model.requires_grad_(True)
+    return {
+        "train_loss": [loss for loss, _ in history],
+        "train_mae": [mae for _, mae in history],
+        "cache_seconds": t1 - t0,
+        "train_seconds": t2 - t1,
+        "samples": len(train_dataset),
+    }
+
+
+def _prefixed(prefix: str, metrics: dict | None) -> dict:
+    return {f"{prefix}_{name}": value for name, value in (metrics or {}).items()}
+
+
+def main(argv=None):
+    project_root = Path(__file__).resolve().parents[2]
+    parser = argparse.ArgumentParser(description="Fine-tune a trained SemMeanSizeCNN on newly labelled images.")
+    parser.add_argument("--model", type=str, default=None, help="Base checkpoint (default: registry's active version).")
+    parser.add_argument("--version", type=str, default=None, help="Base model registry version instead of --model.")
+    parser.add_argument("--new-csv", type=Path, required=True, help="Labels of the new images (filename, mean_size_nm).")
+    parser.add_argument("--new-images", type=Path, required=True)
+    parser.add_argument("--csv", type=Path, default=project_root / "data" / "raw" / "sem_mean_sizes.csv",
+                        help="Original labels: replay samples come from its train split, old test metrics from its test split.")
+    parser.add_argument("--images", type=Path, default=project_root / "data" / "raw" / "images")
+    parser.add_argument("--freeze", type=int, default=3, help="Number of leading ConvBlocks to freeze (0-4).")
+    parser.add_argument("--replay", type=float, default=1.0, help="Old training images replayed per new image.")
+    parser.add_argument("--new-test-ratio", type=float, default=0.2, help="Part of the new images held out for testing.")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--batch-size", type=int, default=16)
+    parser.add_argument("--cache-dtype", choices=["float16", "float32"], default="float16",
+                        help="Dtype of the cached frozen-block features.")
+    parser.add_argument("--augment", action="store_true", help="BatchAugment (requires --freeze 0).")
+    parser.add_argument("--num-workers", type=int, default=0)
+    parser.add_argument("--output", type=Path, default=project_root / "models" / "finetuned_sem_meansize_cnn.pt")
+    parser.add_argument("--register", action="store_true", help="Add the result to the model registry.")
+    parser.add_argument("--activate", action="store_true", help="With --register: serve the new version.")
+    args = parser.parse_args(argv)
+
+    registry = ModelRegistry()
+    parent = args.version or (registry.active_version() if args.model is None else None)
+    base_path = registry.checkpoint_path(args.version) if args.version else resolve_checkpoint(args.model)
+    model, device = load_model(base_path)
+    print(f"Base model: {parent or base_path} on {device}")
+
+    # Same seeded split as train.py, so replay never touches the old test split
+    old_train, _, old_test = create_dataloaders(args.csv, args.images, batch_size=args.batch_size)
+    new_dataset = SemMeanSizeDataset(args.new_csv, args.new_images, transform=get_default_transforms(train=False))
+    n_new_test = int(len(new_dataset) * args.new_test_ratio)
+    new_train, new_test = random_split(
+        new_dataset, [len(new_dataset) - n_new_test, n_new_test], generator=torch.Generator().manual_seed(42),
+    )
+    replay = replay_sample(old_train.dataset, round(args.replay * len(new_train)))
+    new_test_loader = DataLoader(new_test, batch_size=args.batch_size)
+    print(f"Fine-tuning on {len(new_train)} new + {len(replay)} replayed images, "
+          f"testing on {len(old_test.dataset)} old + {len(new_test)} new")
+
+    before = {**_prefixed("test", evaluate(model, old_test, device)),
+              **_prefixed("new_test", evaluate(model, new_test_loader, device))}
+
+    result = fine_tune(
+        model,
+        ConcatDataset([new_train, replay]),
+        device,
+        n_frozen=args.freeze,
+        epochs=args.epochs,
+        learning_rate=args.lr,
+        batch_size=args.batch_size,
+        cache_dtype=getattr(torch, args.cache_dtype),
+        augment=BatchAugment().to(device) if args.augment else None,
+        num_workers=args.num_workers,
+    )
+    after = {**_prefixed("test", evaluate(model, old_test, device)),
+             **_prefixed("new_test", evaluate(model, new_test_loader, device))}
+
+    for name in sorted(after):
+        print(f"  {name:<14} {before.get(name, float('nan')):10.4f} -> {after[name]:10.4f}")
+    seconds = result["cache_seconds"] + result["train_seconds"]
+    print(f"Fine-tune took {seconds:.1f} s ({result['cache_seconds']:.1f} s caching frozen features)")
+
+    args.output.parent.mkdir(parents=True, exist_ok=True)
+    torch.save(model.state_dict(), args.output)
+    print(f"Saved to {args.output}")
+
+    if args.register:
+        metrics = {**after, **_prefixed("before", before), "finetune_seconds": seconds}
+        config = {
+            "fine_tune": True,
+            "base_checkpoint": str(base_path),
+            "freeze_blocks": args.freeze,
+            "epochs": args.epochs,
+            "learning_rate": args.lr,
+            "batch_size": args.batch_size,
+            "new_csv": str(args.new_csv),
+            "new_train_samples": len(new_train),
+            "replay_samples": len(replay),
+            "cache_dtype": args.cache_dtype,
+            "augment": args.augment,
+        }
+        version = registry.register(args.output, metrics=metrics, config=config, parent=parent, activate=args.activate)
+        print(f"Registered model version {version} (parent {parent})")
+
+
+if __name__ == "__main__":
+    main()
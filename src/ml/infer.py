@@ -1,11 +1,17 @@
 from pathlib import Path
+from functools import lru_cache
 import argparse
+import hashlib
+import time
 
 import torch
 from PIL import Image
+from torch.profiler import record_function
 
 from datasets import get_default_transforms
-from model import create_model
+from model import channels_from_state_dict, create_model
+from profiling import add_profile_args, profiler_from_args
+from registry import ModelRegistry, resolve_checkpoint
 
 
 def load_model(
@@ -20,12 +26,12 @@ def load_model(
     elif isinstance(device, str):
         device = torch.device(device)
 
-    model = create_model(device=device)
-
     if not model_path.exists():
         raise FileNotFoundError(f"Model file not found: {model_path}")
 
     state_dict = torch.load(model_path, map_location=device)
+    # Pruned checkpoints (prune.py) have narrower ConvBlocks
+    model = create_model(device=device, channels=channels_from_state_dict(state_dict))
     model.load_state_dict(state_dict)
     model.eval()
 
@@ -41,13 +47,21 @@ def preprocess_image(image_path: Path):
         raise FileNotFoundError(f"Image not found: {image_path}")
 
     with Image.open(image_path) as img:
-        img = img.convert("L")  # ensure grayscale
+        return image_to_tensor(img)
+
+
+def image_to_tensor(img: Image.Image):
+    """
+    preprocess_image for an already opened/decoded PIL image
+    (e.g. one decoded while it was uploaded).
+    """
+    img = img.convert("L")  # ensure grayscale
 
-        # If for some reason size is not 480x480, we can resize.
-        # (According to the contract, all BME images are 480x480.)
-        if img.size != (480, 480):
-            print(f"[WARNING] Image size is {img.size}, resizing to (480, 480).")
-            img = img.resize((480, 480))
+    # If for some reason size is not 480x480, we can resize.
+    # (According to the contract, all BME images are 480x480.)
+    if img.size != (480, 480):
+        print(f"[WARNING] Image size is {img.size}, resizing to (480, 480).")
+        img = img.resize((480, 480))
 
     transform = get_default_transforms(train=False)
     tensor = transform(img)  # shape: [1, 480, 480]
@@ -56,37 +70,68 @@ def preprocess_image(image_path: Path):
     return tensor
 
 
+@lru_cache(maxsize=32)
+def _checkpoint_digest(model_path: Path, mtime_ns: int, size: int) -> str:
+    sha = hashlib.sha256()
+    with open(model_path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def checkpoint_version(model_path: str | Path) -> str:
+    """
+    Short, content-based version string for a checkpoint, e.g.
+    "best_sem_meansize_cnn-3fa2c1d09b7e". Cached per (path, mtime, size).
+    """
+    model_path = Path(model_path).resolve()
+    stat = model_path.stat()
+    digest = _checkpoint_digest(model_path, stat.st_mtime_ns, stat.st_size)
+    return f"{model_path.stem}-{digest[:12]}"
+
+
 @torch.no_grad()
 def predict_mean_size(
     image_path: str | Path,
     model_path: str | Path | None = None,
     device: torch.device | str | None = None,
+    timings: dict[str, float] | None = None,
 ) -> float:
     """
     Predict the mean nanoparticle size (in nm) for a single SEM image.
 
     Args:
         image_path: path to a PNG image.
-        model_path: path to trained model (.pt). If None, uses models/best_sem_meansize_cnn.pt.
+        model_path: path to trained model (.pt). If None, uses the active version of the
+            model registry (models/registry/), else models/best_sem_meansize_cnn.pt.
         device: 'cpu', 'cuda', or torch.device. If None, auto-selects.
+        timings: optional dict that receives the duration in seconds of each
+            stage ("model_load", "decode", "forward").
 
     Returns:
         Predicted mean size in nanometers (float, >= 0).
     """
     image_path = Path(image_path).resolve()
-    project_root = image_path.parents[3] if "data" in str(image_path) else Path(__file__).resolve().parents[2]
-
-    if model_path is None:
-        model_path = project_root / "models" / "best_sem_meansize_cnn.pt"
-    else:
-        model_path = Path(model_path).resolve()
-
-    model, device = load_model(model_path=model_path, device=device)
-    img_tensor = preprocess_image(image_path).to(device)
-
-    preds = model(img_tensor)           # shape: [1]
-    preds_clamped = torch.clamp(preds, min=0.0)
-    mean_size_nm = float(preds_clamped.item())
+    model_path = resolve_checkpoint(model_path)
+
+    t0 = time.perf_counter()
+    with record_function("model_load"):
+        model, device = load_model(model_path=model_path, device=device)
+    t1 = time.perf_counter()
+    with record_function("decode"):
+        img_tensor = preprocess_image(image_path).to(device)
+    t2 = time.perf_counter()
+
+    with record_function("forward"):
+        preds = model(img_tensor)           # shape: [1]
+        preds_clamped = torch.clamp(preds, min=0.0)
+        mean_size_nm = float(preds_clamped.item())
+    t3 = time.perf_counter()
+
+    if timings is not None:
+        timings["model_load"] = t1 - t0
+        timings["decode"] = t2 - t1
+        timings["forward"] = t3 - t2
 
     return mean_size_nm
 
@@ -105,7 +150,14 @@ def main():
         "--model",
         type=str,
         default=None,
-        help="Path to the trained model (.pt). If omitted, uses models/best_sem_meansize_cnn.pt",
+        help="Path to the trained model (.pt). If omitted, uses the registry's active version "
+             "or models/best_sem_meansize_cnn.pt",
+    )
+    parser.add_argument(
+        "--version",
+        type=str,
+        default=None,
+        help="Model registry version to use instead of --model (see registry.py list).",
     )
     parser.add_argument(
         "--device",
@@ -114,13 +166,29 @@ def main():
         help="Device to use: 'cpu' or 'cuda'. If omitted, auto-detect.",
     )
 
+    add_profile_args(parser, default_name="infer")
     args = parser.parse_args()
-
-    mean_size_nm = predict_mean_size(
-        image_path=args.image,
-        model_path=args.model,
-        device=args.device,
-    )
+    if args.version is not None:
+        args.model = ModelRegistry().checkpoint_path(args.version)
+
+    profiler = profiler_from_args(args)
+    if profiler is not None:
+        # Repeat the prediction so the profiler window (wait + warmup + steps) fills up
+        with profiler:
+            while not profiler.done:
+                mean_size_nm = predict_mean_size(
+                    image_path=args.image,
+                    model_path=args.model,
+                    device=args.device,
+                )
+                profiler.step()
+        print(profiler.summary())
+    else:
+        mean_size_nm = predict_mean_size(
+            image_path=args.image,
+            model_path=args.model,
+            device=args.device,
+        )
 
     print(f"Predicted mean size: {mean_size_nm:.4f} nm")
 
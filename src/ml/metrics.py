@@ -0,0 +1,198 @@
+"""
+Training/evaluation metrics without a host sync per batch.
+
+Calling loss.item() / mae.item() every batch blocks until the device has
+finished the step (a CUDA sync) and converts to a Python float in the hot
+loop. MetricAccumulator keeps the running sums in one tensor on the device
+instead; compute() copies them to the host once (and all-reduces them
+under DDP), typically once per epoch.
+
+evaluation_report() turns the predictions collected by an accumulator
+(keep_predictions=True) into a richer test report in one vectorised pass:
+MAE/RMSE per true-size bin, a histogram of the residuals, and the worst-k
+samples mapped back to their filenames (see loader_filenames()).
+"""
+import math
+
+import torch
+import torch.distributed as dist
+from torch.utils.data import ConcatDataset, DataLoader, Subset
+
+from distributed import all_reduce_sum, is_distributed
+
+
+# True mean size bins (nm) for the per-bin errors; the last bin is open-ended
+SIZE_BIN_EDGES = (0.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, math.inf)
+# Residual (prediction - target, nm) histogram; outer bins catch everything beyond
+# (open ends are reported as None, so the report stays valid JSON)
+RESIDUAL_BIN_EDGES = (-math.inf, -50.0, -20.0, -10.0, -5.0, -2.0, -1.0, 0.0, 1.0, 2.0, 5.0, 10.0, 20.0, 50.0, math.inf)
+
+
+class MetricAccumulator:
+    """
+    Running loss / absolute error / squared error sums on the device.
+    Errors use predictions clamped to >= 0 (a mean size can't be negative);
+    the loss is whatever the criterion returned for the raw predictions.
+    """
+
+    def __init__(self, device: torch.device | str, keep_predictions: bool = False):
+        device = torch.device(device)
+        # float64 sums where the device supports them (MPS does not)
+        dtype = torch.float32 if device.type == "mps" else torch.float64
+        self._sums = torch.zeros(3, dtype=dtype, device=device)  # loss * n, |err|, err^2
+        self.n = 0  # batch sizes are known on the host
+        self.keep_predictions = keep_predictions
+        self._preds: list[torch.Tensor] = []
+        self._targets: list[torch.Tensor] = []
+
+    @torch.no_grad()
+    def update(self, preds: torch.Tensor, targets: torch.Tensor, loss: torch.Tensor | None = None):
+        preds = preds.detach().clamp(min=0.0)
+        diff = preds - targets
+        n = targets.size(0)
+        self._sums[1:].add_(torch.stack([diff.abs().sum(), diff.square().sum()]))
+        if loss is not None:
+            self._sums[0].add_(loss.detach(), alpha=n)
+        self.n += n
+        if self.keep_predictions:
+            self._preds.append(preds)
+            self._targets.append(targets.detach())
+
+    def compute(self) -> dict[str, float]:
+        """loss, mae, mse, rmse and n over everything seen (all ranks under DDP). One host sync."""
+        loss_sum, abs_sum, sq_sum, n = all_reduce_sum(self._sums.tolist() + [self.n])
+        if n == 0:
+            return {"loss": math.nan, "mae": math.nan, "mse": math.nan, "rmse": math.nan, "n": 0}
+        return {"loss": loss_sum / n, "mae": abs_sum / n, "mse": sq_sum / n, "rmse": math.sqrt(sq_sum / n), "n": int(n)}
+
+    def predictions(self) -> tuple[torch.Tensor, torch.Tensor]:
+        """(clamped predictions, targets) of this rank, in the order they were seen."""
+        if not self.keep_predictions:
+            raise RuntimeError("MetricAccumulator was created with keep_predictions=False")
+        if not self._preds:
+            empty = torch.empty(0, device=self._sums.device)
+            return empty, empty
+        return torch.cat(self._preds), torch.cat(self._targets)
+
+
+def dataset_filenames(dataset) -> list[str] | None:
+    """Filename of every item of a SemMeanSizeDataset (through Subset/ConcatDataset); None if unknown."""
+    if isinstance(dataset, Subset):
+        names = dataset_filenames(dataset.dataset)
+        return None if names is None else [names[i] for i in dataset.indices]
+    if isinstance(dataset, ConcatDataset):
+        parts = [dataset_filenames(d) for d in dataset.datasets]
+        return None if any(p is None for p in parts) else [name for part in parts for name in part]
+    filenames = getattr(dataset, "filenames", None)
+    if filenames is None:
+        return None
+    return [name.decode("utf-8") if isinstance(name, bytes) else str(name) for name in filenames]
+
+
+def loader_filenames(loader: DataLoader) -> list[str] | None:
+    """Filenames in the order an unshuffled loader yields them (this rank's part under DDP)."""
+    names = dataset_filenames(loader.dataset)
+    if names is None:
+        return None
+    return [names[i] for i in loader.sampler]
+
+
+def gather_predictions(preds: torch.Tensor, targets: torch.Tensor, filenames: list[str] | None):
+    """Concatenate every rank's predictions, targets and filenames (no-op without DDP)."""
+    if not is_distributed():
+        return preds, targets, filenames
+    parts = [None] * dist.get_world_size()
+    dist.all_gather_object(parts, (preds.cpu(), targets.cpu(), filenames))
+    preds = torch.cat([p for p, _, _ in parts])
+    targets = torch.cat([t for _, t, _ in parts])
+    if any(names is None for _, _, names in parts):
+        return preds, targets, None
+    return preds, targets, [name for _, _, names in parts for name in names]
+
+
+def _edge(value: float) -> float | None:
+    return value if math.isfinite(value) else None
+
+
+@torch.no_grad()
+def evaluation_report(
+    preds: torch.Tensor,
+    targets: torch.Tensor,
+    filenames: list[str] | None = None,
+    size_edges=SIZE_BIN_EDGES,
+    residual_edges=RESIDUAL_BIN_EDGES,
+    worst_k: int = 10,
+) -> dict:
+    """
+    Per-size-bin MAE/RMSE, residual histogram and the worst_k samples by
+    absolute error, computed on the device; the results are copied to the
+    host in one transfer. Infinite bin edges are reported as None.
+    """
+    preds, targets = preds.double(), targets.double()
+    residual = preds - targets
+    device = residual.device
+
+    size_edges_t = torch.tensor(size_edges, dtype=torch.float64, device=device)
+    n_size_bins = len(size_edges) - 1
+    size_bin = torch.bucketize(targets, size_edges_t[1:-1], right=True)
+    count = torch.bincount(size_bin, minlength=n_size_bins).double()
+    abs_sum = torch.zeros(n_size_bins, dtype=torch.float64, device=device).index_add_(0, size_bin, residual.abs())
+    sq_sum = torch.zeros(n_size_bins, dtype=torch.float64, device=device).index_add_(0, size_bin, residual.square())
+    # Empty bins give 0/0 = nan
+    bin_mae = abs_sum / count
+    bin_rmse = (sq_sum / count).sqrt()
+
+    residual_edges_t = torch.tensor(residual_edges, dtype=torch.float64, device=device)
+    residual_bin = torch.bucketize(residual, residual_edges_t[1:-1], right=True)
+    residual_counts = torch.bincount(residual_bin, minlength=len(residual_edges) - 1)
+
+    k = min(worst_k, len(residual))
+    worst_err, worst_idx = residual.abs().topk(k)
+
+    # One device -> host copy for everything
+    host = torch.cat([
+        count, bin_mae, bin_rmse, residual_counts.double(),
+        worst_idx.double(), preds[worst_idx], targets[worst_idx], residual[worst_idx],
+    ]).cpu().tolist()
+    sections = [n_size_bins] * 3 + [len(residual_edges) - 1] + [k] * 4
+    count, bin_mae, bin_rmse, residual_counts, worst_idx, worst_pred, worst_target, worst_residual = (
+        host[sum(sections[:i]):sum(sections[:i + 1])] for i in range(len(sections))
+    )
+
+    return {
+        "n": len(residual),
+        "size_bins": [
+            {
+                "range_nm": [_edge(size_edges[i]), _edge(size_edges[i + 1])],
+                "count": int(count[i]),
+                "mae": bin_mae[i] if count[i] else None,
+                "rmse": bin_rmse[i] if count[i] else None,
+            }
+            for i in range(n_size_bins)
+        ],
+        "residual_histogram": {"edges_nm": [_edge(e) for e in residual_edges], "counts": [int(c) for c in residual_counts]},
+        "worst": [
+            {
+                "index": int(idx),
+                "filename": filenames[int(idx)] if filenames is not None else None,
+                "target_nm": target,
+                "predicted_nm": pred,
+                "residual_nm": res,
+            }
+            for idx, pred, target, res in zip(worst_idx, worst_pred, worst_target, worst_residual)
+        ],
+    }
+
+
+def format_report(report: dict, worst: int = 5) -> str:
+    """Human-readable summary of an evaluation_report()."""
+    lines = [f"{'size bin (nm)':>16} {'n':>6} {'MAE':>9} {'RMSE':>9}"]
+    for row in report["size_bins"]:
+        if row["count"]:
+            lo, hi = row["range_nm"]
+            label = f"{lo:g}-{hi:g}" if hi is not None else f">= {lo:g}"
+            lines.append(f"{label:>16} {row['count']:>6} {row['mae']:>9.3f} {row['rmse']:>9.3f}")
+    for row in report["worst"][:worst]:
+        lines.append(f"  worst: {row['filename'] or row['index']}: predicted {row['predicted_nm']:.2f} nm, "
+                     f"true {row['target_nm']:.2f} nm")
+    return "\n".join(lines)
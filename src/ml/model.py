@@ -28,6 +28,10 @@ class ConvBlock(nn.Module):
         return x
 
 
+# Output channels of the five ConvBlocks (prune.py produces narrower models)
+DEFAULT_CHANNELS = (16, 32, 64, 128, 256)
+
+
 class SemMeanSizeCNN(nn.Module):
     """
     CNN model for predicting mean nanoparticle size (in nm)
@@ -36,17 +40,15 @@ class SemMeanSizeCNN(nn.Module):
     Output: a single scalar (no activation on the last layer).
     """
 
-    def __init__(self):
+    def __init__(self, channels: tuple[int, ...] = DEFAULT_CHANNELS):
         super().__init__()
+        self.channels = tuple(channels)
 
-        # Feature extractor
+        # Feature extractor: each block halves H and W
+        # Input: 1 x 480 x 480 -> 16 x 240 x 240 -> ... -> 256 x 15 x 15
+        in_channels = (1,) + self.channels[:-1]
         self.features = nn.Sequential(
-            # Input: 1 x 480 x 480
-            ConvBlock(1, 16),   # -> 16 x 240 x 240
-            ConvBlock(16, 32),  # -> 32 x 120 x 120
-            ConvBlock(32, 64),  # -> 64 x 60 x 60
-            ConvBlock(64, 128), # -> 128 x 30 x 30
-            ConvBlock(128, 256) # -> 256 x 15 x 15
+            *(ConvBlock(c_in, c_out) for c_in, c_out in zip(in_channels, self.channels))
         )
 
         # Global average pooling -> 256 x 1 x 1
@@ -55,7 +57,7 @@ class SemMeanSizeCNN(nn.Module):
         # Regression head
         self.regressor = nn.Sequential(
             nn.Flatten(),            # 256
-            nn.Linear(256, 128),
+            nn.Linear(self.channels[-1], 128),
             nn.ReLU(inplace=True),
             nn.Dropout(p=0.2),
             nn.Linear(128, 64),
@@ -74,19 +76,43 @@ class SemMeanSizeCNN(nn.Module):
         x = x.squeeze(-1)       # -> (batch_size,)
         return x
 
+    def embed(self, x: torch.Tensor) -> torch.Tensor:
+        """
+        The global_pool features the regressor sees: (batch_size, channels[-1]),
+        i.e. (batch_size, 256) unless the last block was pruned.
+        Used as micrograph embeddings for similar-image search.
+        """
+        return self.global_pool(self.features(x)).flatten(1)
+
+    def forward_with_embedding(self, x: torch.Tensor) -> tuple[torch.Tensor, torch.Tensor]:
+        """forward() and embed() from a single pass: ((batch_size,), (batch_size, 256))."""
+        embedding = self.embed(x)
+        return self.regressor(embedding).squeeze(-1), embedding
+
 
-def create_model(device: str | torch.device | None = None) -> SemMeanSizeCNN:
+def create_model(
+    device: str | torch.device | None = None,
+    channels: tuple[int, ...] = DEFAULT_CHANNELS,
+) -> SemMeanSizeCNN:
     """
     Helper to create the model and move it to a device if given.
     Example:
         model = create_model(device="cuda" if torch.cuda.is_available() else "cpu")
     """
-    model = SemMeanSizeCNN()
+    model = SemMeanSizeCNN(channels)
     if device is not None:
         model = model.to(device)
     return model
 
 
+def channels_from_state_dict(state_dict: dict) -> tuple[int, ...]:
+    """ConvBlock widths of a checkpoint (a pruned one is narrower than DEFAULT_CHANNELS)."""
+    channels = []
+    while f"features.{len(channels)}.conv.weight" in state_dict:
+        channels.append(state_dict[f"features.{len(channels)}.conv.weight"].shape[0])
+    return tuple(channels)
+
+
 def count_parameters(model: nn.Module) -> int:
     """Return number of trainable parameters."""
     return sum(p.numel() for p in model.parameters() if p.requires_grad)
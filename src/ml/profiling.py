@@ -0,0 +1,186 @@
+from pathlib import Path
+import logging
+import threading
+
+import torch
+import torch.nn as nn
+from torch.profiler import ProfilerActivity, profile, record_function, schedule
+
+from model import ConvBlock
+
+
+logger = logging.getLogger(__name__)
+
+
+class StepProfiler:
+    """
+    Profile a window of training steps / requests with the PyTorch profiler.
+
+    The profiler skips `wait` steps, warms up for `warmup` steps, then records
+    `active` steps (operator CPU time, memory, input shapes). When the window
+    closes it writes to output_dir:
+      - <name>_trace.json     Chrome trace (open in chrome://tracing or Perfetto)
+      - <name>_top_ops.txt    top-k operators by self CPU time
+
+    While active, every ConvBlock forward is labelled "ConvBlock(in->out)" so
+    per-layer cost shows up next to the aten ops. The profiler and the module
+    hooks are removed as soon as the window closes, so steps after it run
+    unprofiled even inside the `with` block.
+
+    The operator table is logged (logger "profiling") and kept in .table;
+    CLIs print summary() themselves, library users (the backend) only log.
+
+    Usage:
+        with StepProfiler("profiles", name="train") as prof:
+            for batch in loader:
+                ...
+                prof.step()
+        print(prof.summary())
+    """
+
+    def __init__(
+        self,
+        output_dir: str | Path,
+        name: str = "profile",
+        wait: int = 1,
+        warmup: int = 1,
+        active: int = 5,
+        row_limit: int = 25,
+        sort_by: str = "self_cpu_time_total",
+        record_shapes: bool = True,
+        profile_memory: bool = True,
+        with_stack: bool = False,
+        annotate_types: tuple[type[nn.Module], ...] = (ConvBlock,),
+    ):
+        self.output_dir = Path(output_dir)
+        self.name = name
+        self.wait = wait
+        self.warmup = warmup
+        self.active = active
+        self.row_limit = row_limit
+        self.sort_by = sort_by
+        self.annotate_types = annotate_types
+        self.steps_done = 0
+        self.table: str | None = None
+        self.trace_path = self.output_dir / f"{name}_trace.json"
+        self.table_path = self.output_dir / f"{name}_top_ops.txt"
+
+        activities = [ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(ProfilerActivity.CUDA)
+
+        self._profiler = profile(
+            activities=activities,
+            schedule=schedule(wait=wait, warmup=warmup, active=active, repeat=1),
+            on_trace_ready=self._on_trace_ready,
+            record_shapes=record_shapes,
+            profile_memory=profile_memory,
+            with_stack=with_stack,
+        )
+        self._hooks = []
+        self._local = threading.local()
+        self._open = False
+
+    @property
+    def done(self) -> bool:
+        return self.steps_done >= self.wait + self.warmup + self.active
+
+    def __enter__(self):
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._hooks = [
+            nn.modules.module.register_module_forward_pre_hook(self._enter_module),
+            nn.modules.module.register_module_forward_hook(self._exit_module),
+        ]
+        self._profiler.__enter__()
+        self._open = True
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close(exc_type, exc, tb)
+        return False
+
+    def close(self, exc_type=None, exc=None, tb=None):
+        """Stop the profiler and remove the module hooks (idempotent)."""
+        if not self._open:
+            return
+        self._open = False
+        try:
+            self._profiler.__exit__(exc_type, exc, tb)
+        finally:
+            for handle in self._hooks:
+                handle.remove()
+            self._hooks = []
+
+    def step(self):
+        if self.done:
+            return
+        self.steps_done += 1
+        self._profiler.step()
+        if self.done:
+            self.close()
+
+    # --- module labels -------------------------------------------------------
+
+    def _module_label(self, module: nn.Module) -> str:
+        conv = getattr(module, "conv", None)
+        if isinstance(conv, nn.Conv2d):
+            return f"{type(module).__name__}({conv.in_channels}->{conv.out_channels})"
+        return type(module).__name__
+
+    def _enter_module(self, module, inputs):
+        if isinstance(module, self.annotate_types):
+            stack = getattr(self._local, "stack", None)
+            if stack is None:
+                stack = self._local.stack = []
+            region = record_function(self._module_label(module))
+            region.__enter__()
+            stack.append(region)
+
+    def _exit_module(self, module, inputs, output):
+        if isinstance(module, self.annotate_types):
+            stack = getattr(self._local, "stack", None)
+            if stack:
+                stack.pop().__exit__(None, None, None)
+
+    # --- export --------------------------------------------------------------
+
+    def _on_trace_ready(self, prof):
+        prof.export_chrome_trace(str(self.trace_path))
+        table = prof.key_averages().table(sort_by=self.sort_by, row_limit=self.row_limit)
+        self.table_path.write_text(table)
+        self.table = table
+        logger.info("Profile written: Chrome trace %s, operator table %s", self.trace_path, self.table_path)
+
+    def summary(self) -> str:
+        """Operator table and output paths, for CLIs to print ("" before the window closed)."""
+        if self.table is None:
+            return ""
+        return (
+            f"\n[profile] Top {self.row_limit} operators by {self.sort_by}:\n{self.table}\n"
+            f"[profile] Chrome trace : {self.trace_path}\n"
+            f"[profile] Operator table: {self.table_path}"
+        )
+
+
+def add_profile_args(parser, default_name: str):
+    """Add the shared --profile* options to an argparse parser."""
+    parser.add_argument("--profile", action="store_true", help="Profile a window of steps with torch.profiler.")
+    parser.add_argument("--profile-dir", type=str, default="profiles", help="Where traces/tables are written.")
+    parser.add_argument("--profile-name", type=str, default=default_name, help="File name prefix for outputs.")
+    parser.add_argument("--profile-wait", type=int, default=1, help="Steps to skip before profiling.")
+    parser.add_argument("--profile-warmup", type=int, default=1, help="Warm-up steps (not recorded).")
+    parser.add_argument("--profile-steps", type=int, default=5, help="Steps recorded.")
+    parser.add_argument("--profile-top-k", type=int, default=25, help="Rows in the operator table.")
+
+
+def profiler_from_args(args) -> StepProfiler | None:
+    if not args.profile:
+        return None
+    return StepProfiler(
+        output_dir=args.profile_dir,
+        name=args.profile_name,
+        wait=args.profile_wait,
+        warmup=args.profile_warmup,
+        active=args.profile_steps,
+        row_limit=args.profile_top_k,
+    )
@@ -0,0 +1,306 @@
+"""
+Structured channel pruning of a trained SemMeanSizeCNN.
+
+For each sparsity level the output channels of the chosen ConvBlocks are
+ranked by |BatchNorm gamma| (--criterion bn: a channel the BN scales to ~0
+contributes ~nothing after the ReLU) or by the L1 norm of their conv
+filters (--criterion l1), and the lowest-ranked fraction is removed
+physically: the conv's output filters and bias, the BN parameters and
+running statistics, and the matching input channels of the next conv (or
+of the first regressor Linear for the last block) are sliced out. The
+result is a smaller dense SemMeanSizeCNN (model.channels records its
+widths; infer.load_model reads them back from the checkpoint), not a
+masked one, so it is faster everywhere without sparse kernels.
+
+Each pruned model is then fine-tuned with train.train_one_epoch, keeping
+the weights with the best validation MAE, and its batch-1 forward latency
+is measured. The report lists every level (plus the unpruned model) and
+marks the accuracy/latency Pareto front: the levels no other level beats
+on both validation MAE and latency.
+
+Which blocks to prune matters more than how much: at batch 1 on CPU the
+first two blocks (16 and 32 channels at 480x480 and 240x240) take about
+70% of the forward time and the last two under 15%, so pruning only the
+wide late blocks barely changes the latency. The default prunes blocks
+0-3. Pruning the last block (--blocks 4) also shrinks the 256-d embedding
+that the backend's similarity search and drift monitor expect, so such
+models cannot be registered for serving.
+
+CLI:
+    python prune.py --sparsity 0.25 0.5 0.75 --criterion bn --epochs 5 --register
+"""
+from pathlib import Path
+import argparse
+import json
+import time
+
+import torch
+import torch.nn as nn
+
+from infer import load_model
+from model import SemMeanSizeCNN, count_parameters, create_model
+from registry import ModelRegistry, resolve_checkpoint
+from train import create_dataloaders, evaluate, train_one_epoch
+
+
+CRITERIA = ("bn", "l1")
+
+
+def channel_importance(model: SemMeanSizeCNN, block: int, criterion: str = "bn") -> torch.Tensor:
+    """One score per output channel of a ConvBlock; low scores are pruned first."""
+    conv_block = model.features[block]
+    if criterion == "bn":
+        return conv_block.bn.weight.detach().abs()
+    if criterion == "l1":
+        return conv_block.conv.weight.detach().abs().sum(dim=(1, 2, 3))
+    raise ValueError(f"Unknown criterion {criterion!r} (expected one of {', '.join(CRITERIA)})")
+
+
+def select_channels(
+    model: SemMeanSizeCNN,
+    sparsity: float,
+    blocks=(0, 1, 2, 3),
+    criterion: str = "bn",
+) -> dict[int, torch.Tensor]:
+    """{block: sorted indices of the output channels to keep} removing `sparsity` of each block's channels."""
+    if not 0.0 <= sparsity < 1.0:
+        raise ValueError(f"sparsity must be in [0, 1), got {sparsity}")
+    keep = {}
+    for block in blocks:
+        if not 0 <= block < len(model.features):
+            raise ValueError(f"No ConvBlock {block} (the model has {len(model.features)})")
+        importance = channel_importance(model, block, criterion)
+        n_keep = max(1, round(len(importance) * (1.0 - sparsity)))
+        keep[block] = importance.topk(n_keep).indices.sort().values
+    return keep
+
+
+@torch.no_grad()
+def prune_channels(model: SemMeanSizeCNN, keep: dict[int, torch.Tensor]) -> SemMeanSizeCNN:
+    """A new, narrower SemMeanSizeCNN with only the kept output channels of each block in keep."""
+    state = model.state_dict()
+    channels = list(model.channels)
+    last = len(channels) - 1
+    for block, idx in keep.items():
+        idx = idx.to(state[f"features.{block}.conv.weight"].device)
+        channels[block] = len(idx)
+        for name in ("conv.weight", "conv.bias", "bn.weight", "bn.bias", "bn.running_mean", "bn.running_var"):
+            key = f"features.{block}.{name}"
+            state[key] = state[key].index_select(0, idx)
+        # The consumer of this block's output loses the same input channels
+        consumer = f"features.{block + 1}.conv.weight" if block < last else "regressor.1.weight"
+        state[consumer] = state[consumer].index_select(1, idx)
+
+    device = next(model.parameters()).device
+    pruned = create_model(device=device, channels=tuple(channels))
+    pruned.load_state_dict(state)
+    return pruned.train(model.training)
+
+
+def prune(model: SemMeanSizeCNN, sparsity: float, blocks=(0, 1, 2, 3), criterion: str = "bn") -> SemMeanSizeCNN:
+    """select_channels + prune_channels."""
+    return prune_channels(model, select_channels(model, sparsity, blocks, criterion))
+
+
+@torch.no_grad()
+def measure_latency(model: nn.Module, batch_size: int = 1, side: int = 480, min_time: float = 1.0) -> float:
+    """Mean forward time in ms of a (batch_size, 1, side, side) batch on the model's device."""
+    device = next(model.parameters()).device
+    model.eval()
+    x = torch.randn(batch_size, 1, side, side, device=device)
+
+    def sync():
+        if device.type == "cuda":
+            torch.cuda.synchronize(device)
+
+    model(x)  # warm-up
+    sync()
+    iters = 0
+    t0 = time.perf_counter()
+    while True:
+        model(x)
+        iters += 1
+        sync()
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time and iters >= 3:
+            return elapsed / iters * 1000
+
+
+def fine_tune_pruned(
+    model: SemMeanSizeCNN,
+    train_loader,
+    val_loader,
+    device: torch.device,
+    epochs: int = 5,
+    learning_rate: float = 1e-4,
+) -> list[dict]:
+    """
+    Train all of a pruned model for a few epochs; the weights with the best
+    validation MAE are restored at the end. Returns per-epoch metrics.
+    """
+    criterion = nn.MSELoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+    has_val = len(val_loader.dataset) > 0
+    best_mae, best_state = float("inf"), None
+    history = []
+    for _ in range(epochs):
+        train_loss, train_mae = train_one_epoch(model, train_loader, criterion, optimizer, device)
+        val = evaluate(model, val_loader, device) if has_val else None
+        history.append({"train_loss": train_loss, "train_mae": train_mae, "val_mae": val["mae"] if val else None})
+        if val is not None and val["mae"] < best_mae:
+            best_mae = val["mae"]
+            best_state = {name: value.clone() for name, value in model.state_dict().items()}
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+    return history
+
+
+def pareto_front(points: list[dict], x: str = "latency_ms", y: str = "val_mae") -> list[dict]:
+    """The points not dominated by another (<= on both x and y, < on one), by increasing x."""
+    front = []
+    for p in sorted(points, key=lambda p: (p[x], p[y])):
+        if not front or p[y] < front[-1][y]:
+            front.append(p)
+    return front
+
+
+def sweep(
+    model: SemMeanSizeCNN,
+    sparsities,
+    train_loader,
+    val_loader,
+    test_loader,
+    device: torch.device,
+    blocks=(0, 1, 2, 3),
+    criterion: str = "bn",
+    epochs: int = 5,
+    learning_rate: float = 1e-4,
+    latency_min_time: float = 1.0,
+    on_pruned=None,
+) -> list[dict]:
+    """
+    Prune the model at every sparsity level (and keep it unpruned at 0.0),
+    fine-tune, and measure. Returns one row per level with "pareto" set on
+    the accuracy/latency front. on_pruned(sparsity, model) is called with
+    each fine-tuned model (e.g. to save it).
+    """
+    base_latency = measure_latency(model, min_time=latency_min_time)
+    rows = []
+    for sparsity in sorted({0.0, *sparsities}):
+        pruned = prune(model, sparsity, blocks, criterion) if sparsity > 0 else model
+        row = {
+            "sparsity": sparsity,
+            "channels": list(pruned.channels),
+            "parameters": count_parameters(pruned),
+            # Accuracy straight after slicing, before any fine-tuning
+            "val_mae_pruned": _mae(evaluate(pruned, val_loader, device)),
+        }
+        if sparsity > 0 and epochs > 0:
+            row["fine_tune"] = fine_tune_pruned(pruned, train_loader, val_loader, device, epochs, learning_rate)
+        row["val_mae"] = _mae(evaluate(pruned, val_loader, device))
+        row["test_mae"] = _mae(evaluate(pruned, test_loader, device))
+        row["latency_ms"] = base_latency if sparsity == 0 else measure_latency(pruned, min_time=latency_min_time)
+        row["speedup"] = base_latency / row["latency_ms"]
+        if on_pruned is not None:
+            on_pruned(sparsity, pruned)
+        rows.append(row)
+
+    front = {id(row) for row in pareto_front([r for r in rows if r["val_mae"] is not None])}
+    for row in rows:
+        row["pareto"] = id(row) in front
+    return rows
+
+
+def _mae(metrics: dict | None) -> float | None:
+    return metrics["mae"] if metrics is not None else None
+
+
+def format_rows(rows: list[dict]) -> str:
+    def fmt(value):
+        return f"{value:9.3f}" if value is not None else f"{'-':>9}"
+
+    lines = [f"{'sparsity':>8} {'channels':>24} {'params':>9} {'ms':>8} {'speedup':>7} "
+             f"{'MAE cut':>9} {'val MAE':>9} {'test MAE':>9}  pareto"]
+    for r in rows:
+        lines.append(
+            f"{r['sparsity']:>8.2f} {str(tuple(r['channels'])):>24} {r['parameters']:>9,} {r['latency_ms']:>8.1f} "
+            f"{r['speedup']:>6.2f}x {fmt(r['val_mae_pruned'])} {fmt(r['val_mae'])} {fmt(r['test_mae'])}"
+            f"  {'*' if r['pareto'] else ''}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    project_root = Path(__file__).resolve().parents[2]
+    parser = argparse.ArgumentParser(description="Prune ConvBlock channels of a trained SemMeanSizeCNN and fine-tune.")
+    parser.add_argument("--model", type=str, default=None, help="Checkpoint to prune (default: registry's active version).")
+    parser.add_argument("--version", type=str, default=None, help="Model registry version instead of --model.")
+    parser.add_argument("--csv", type=Path, default=project_root / "data" / "raw" / "sem_mean_sizes.csv")
+    parser.add_argument("--images", type=Path, default=project_root / "data" / "raw" / "images")
+    parser.add_argument("--sparsity", type=float, nargs="+", default=[0.25, 0.5, 0.75],
+                        help="Fractions of each pruned block's channels to remove.")
+    parser.add_argument("--blocks", type=int, nargs="+", default=[0, 1, 2, 3], help="ConvBlocks (0-4) whose outputs are pruned.")
+    parser.add_argument("--criterion", choices=CRITERIA, default="bn",
+                        help="Channel ranking: |BatchNorm gamma| or L1 norm of the conv filters.")
+    parser.add_argument("--epochs", type=int, default=5, help="Fine-tune epochs per sparsity level.")
+    parser.add_argument("--lr", type=float, default=1e-4)
+    parser.add_argument("--batch-size", type=int, default=4)
+    parser.add_argument("--num-workers", type=int, default=0)
+    parser.add_argument("--output-dir", type=Path, default=project_root / "models" / "pruned")
+    parser.add_argument("--register", action="store_true", help="Add the Pareto-front models to the model registry.")
+    args = parser.parse_args(argv)
+
+    last_block = len(SemMeanSizeCNN().features) - 1
+    if args.register and last_block in args.blocks:
+        parser.error(f"--register: pruning block {last_block} changes the 256-d embedding the backend expects")
+
+    registry = ModelRegistry()
+    parent = args.version or (registry.active_version() if args.model is None else None)
+    base_path = registry.checkpoint_path(args.version) if args.version else resolve_checkpoint(args.model)
+    model, device = load_model(base_path)
+    print(f"Pruning {parent or base_path} on {device}: blocks {args.blocks}, criterion {args.criterion}")
+
+    # Same seeded split as train.py
+    train_loader, val_loader, test_loader = create_dataloaders(
+        args.csv, args.images, batch_size=args.batch_size, num_workers=args.num_workers,
+    )
+
+    args.output_dir.mkdir(parents=True, exist_ok=True)
+    stem = Path(base_path).stem
+    paths = {0.0: Path(base_path)}
+
+    def save(sparsity, pruned):
+        if sparsity > 0:
+            paths[sparsity] = args.output_dir / f"{stem}.pruned{round(sparsity * 100):02d}.pt"
+            torch.save(pruned.state_dict(), paths[sparsity])
+
+    rows = sweep(
+        model, args.sparsity, train_loader, val_loader, test_loader, device,
+        blocks=args.blocks, criterion=args.criterion, epochs=args.epochs, learning_rate=args.lr, on_pruned=save,
+    )
+    for row in rows:
+        row["checkpoint"] = str(paths[row["sparsity"]])
+    print(format_rows(rows))
+
+    report_path = args.output_dir / f"{stem}.pruning.json"
+    report = {"base_checkpoint": str(base_path), "blocks": args.blocks, "criterion": args.criterion,
+              "epochs": args.epochs, "levels": rows}
+    report_path.write_text(json.dumps(report, indent=2))
+    print(f"Report: {report_path}")
+
+    if args.register:
+        for row in rows:
+            if not row["pareto"] or row["sparsity"] == 0:
+                continue
+            metrics = {"val_mae": row["val_mae"], "test_mae": row["test_mae"],
+                       "latency_ms": row["latency_ms"], "parameters": row["parameters"]}
+            config = {"pruned": True, "base_checkpoint": str(base_path), "sparsity": row["sparsity"],
+                      "blocks": args.blocks, "criterion": args.criterion, "channels": row["channels"],
+                      "epochs": args.epochs, "learning_rate": args.lr, "batch_size": args.batch_size}
+            version = registry.register(row["checkpoint"], metrics=metrics, config=config, parent=parent)
+            print(f"Registered sparsity {row['sparsity']:.2f} as {version} (parent {parent})")
+
+
+if __name__ == "__main__":
+    main()
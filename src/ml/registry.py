@@ -0,0 +1,204 @@
+"""
+Versioned model registry for SemMeanSizeCNN checkpoints.
+
+Layout (default root: models/registry/):
+
+    registry/
+      index.json                 {"active": "v0002-3fa2c1d09b7e", "versions": [...]}
+      v0001-81c0e2a4d5f6/
+        model.pt                 state_dict, copied in at registration
+        metadata.json            version, sha256, created_at, source, metrics, config, ...
+      v0002-3fa2c1d09b7e/
+        ...
+
+A version is "v<sequence>-<first 12 hex of the checkpoint's sha256>" and is
+what the backend stores in MeanSizePrediction.model_version. index.json is
+only ever replaced atomically (write to a temp file + os.replace), so
+readers such as the backend's ModelServer see either the old or the new
+active version, never a partial file.
+
+CLI:
+    python registry.py register models/best_sem_meansize_cnn.pt --activate \
+        --metrics '{"test_mae": 3.1}' --config '{"epochs": 100}'
+    python registry.py list
+    python registry.py activate v0001-81c0e2a4d5f6
+"""
+from datetime import datetime, timezone
+from pathlib import Path
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+
+
+DEFAULT_REGISTRY_ROOT = Path(__file__).resolve().parents[2] / "models" / "registry"
+INDEX_NAME = "index.json"
+CHECKPOINT_NAME = "model.pt"
+METADATA_NAME = "metadata.json"
+
+
+def file_sha256(path: Path) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def _atomic_write_json(path: Path, data: dict):
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+
+
+class ModelRegistry:
+    def __init__(self, root: str | Path = DEFAULT_REGISTRY_ROOT):
+        self.root = Path(root)
+
+    @property
+    def index_path(self) -> Path:
+        return self.root / INDEX_NAME
+
+    def _read_index(self) -> dict:
+        if not self.index_path.exists():
+            return {"active": None, "versions": []}
+        return json.loads(self.index_path.read_text())
+
+    def versions(self) -> list[str]:
+        return list(self._read_index()["versions"])
+
+    def active_version(self) -> str | None:
+        return self._read_index()["active"]
+
+    def checkpoint_path(self, version: str) -> Path:
+        path = self.root / version / CHECKPOINT_NAME
+        if not path.exists():
+            raise KeyError(f"Unknown model version: {version}")
+        return path
+
+    def metadata(self, version: str) -> dict:
+        path = self.root / version / METADATA_NAME
+        if not path.exists():
+            raise KeyError(f"Unknown model version: {version}")
+        return json.loads(path.read_text())
+
+    def register(
+        self,
+        checkpoint_path: str | Path,
+        metrics: dict | None = None,
+        config: dict | None = None,
+        parent: str | None = None,
+        activate: bool = False,
+    ) -> str:
+        """
+        Copy a checkpoint into the registry with its metadata and return the
+        new version. Registering identical bytes again returns the existing
+        version (activating it if asked).
+        """
+        checkpoint_path = Path(checkpoint_path)
+        sha256 = file_sha256(checkpoint_path)
+        self.root.mkdir(parents=True, exist_ok=True)
+
+        index = self._read_index()
+        for version in index["versions"]:
+            if version.endswith(sha256[:12]) and self.metadata(version)["sha256"] == sha256:
+                if activate:
+                    self.set_active(version)
+                return version
+
+        version = f"v{len(index['versions']) + 1:04d}-{sha256[:12]}"
+        # Stage in a temp dir and rename, so a version directory is complete
+        # as soon as it exists.
+        staging = Path(tempfile.mkdtemp(dir=self.root, prefix=f".{version}."))
+        try:
+            shutil.copy2(checkpoint_path, staging / CHECKPOINT_NAME)
+            metadata = {
+                "version": version,
+                "sha256": sha256,
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "source": str(checkpoint_path.resolve()),
+                "parent": parent,
+                "metrics": metrics or {},
+                "config": config or {},
+            }
+            (staging / METADATA_NAME).write_text(json.dumps(metadata, indent=2))
+            os.replace(staging, self.root / version)
+        except BaseException:
+            shutil.rmtree(staging, ignore_errors=True)
+            raise
+
+        index["versions"].append(version)
+        if activate or index["active"] is None:
+            index["active"] = version
+        _atomic_write_json(self.index_path, index)
+        return version
+
+    def set_active(self, version: str):
+        """Point the registry at another version (picked up by the backend's ModelServer)."""
+        self.checkpoint_path(version)  # raises KeyError for unknown versions
+        index = self._read_index()
+        index["active"] = version
+        _atomic_write_json(self.index_path, index)
+
+
+def resolve_checkpoint(model_path: str | Path | None = None, registry_root: str | Path = DEFAULT_REGISTRY_ROOT) -> Path:
+    """
+    The checkpoint to use when none is given explicitly: the registry's
+    active version if there is one, else models/best_sem_meansize_cnn.pt.
+    """
+    if model_path is not None:
+        return Path(model_path).resolve()
+    registry = ModelRegistry(registry_root)
+    active = registry.active_version()
+    if active is not None:
+        return registry.checkpoint_path(active)
+    return DEFAULT_REGISTRY_ROOT.parent / "best_sem_meansize_cnn.pt"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the SemMeanSizeCNN model registry.")
+    parser.add_argument("--root", type=Path, default=DEFAULT_REGISTRY_ROOT, help="Registry directory.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    reg = sub.add_parser("register", help="Add a checkpoint as a new version.")
+    reg.add_argument("checkpoint", type=Path)
+    reg.add_argument("--metrics", type=json.loads, default=None, help="JSON object of evaluation metrics.")
+    reg.add_argument("--config", type=json.loads, default=None, help="JSON object of the training config.")
+    reg.add_argument("--parent", type=str, default=None, help="Version this one was derived from.")
+    reg.add_argument("--activate", action="store_true", help="Make it the active (served) version.")
+
+    sub.add_parser("list", help="List versions with their metrics.")
+
+    act = sub.add_parser("activate", help="Switch the active version.")
+    act.add_argument("version")
+
+    args = parser.parse_args()
+    registry = ModelRegistry(args.root)
+
+    if args.command == "register":
+        version = registry.register(
+            args.checkpoint, metrics=args.metrics, config=args.config, parent=args.parent, activate=args.activate,
+        )
+        print(f"Registered {version}" + (" (active)" if registry.active_version() == version else ""))
+    elif args.command == "list":
+        active = registry.active_version()
+        for version in registry.versions():
+            meta = registry.metadata(version)
+            marker = "*" if version == active else " "
+            print(f"{marker} {version}  {meta['created_at']}  metrics={json.dumps(meta['metrics'])}")
+    elif args.command == "activate":
+        registry.set_active(args.version)
+        print(f"Active version: {args.version}")
+
+
+if __name__ == "__main__":
+    main()
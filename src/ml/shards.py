@@ -0,0 +1,292 @@
+"""
+Sharded, streamable dataset format for large SEM corpora.
+
+`pack_shards` converts the usual images directory + labels CSV into
+webdataset-style tar shards: each sample is two consecutive members,
+<key>.png (the original PNG bytes, not re-encoded) and <key>.json
+({"filename": ..., "mean_size_nm": ...}). Samples are shuffled before
+packing, and every split directory gets an index.json with per-shard
+sample counts:
+
+    shards/
+      train/shard-000000.tar, shard-000001.tar, ..., index.json
+      val/...
+      test/...
+
+`ShardedSemDataset` streams the shards sequentially (large sequential reads
+instead of one small random read per image), shuffles with a bounded buffer
+and splits shards across DistributedDataParallel ranks and DataLoader workers.
+
+CLI:
+    python shards.py --csv data/raw/sem_mean_sizes.csv --images-dir data/raw/images \
+        --out data/shards --shard-size 1000
+"""
+from pathlib import Path
+import argparse
+import io
+import json
+import math
+import multiprocessing
+import os
+import random
+import tarfile
+
+import pandas as pd
+from PIL import Image
+
+import torch
+import torch.distributed as dist
+from torch.utils.data import DataLoader, IterableDataset, get_worker_info
+
+from datasets import get_default_transforms
+
+
+INDEX_NAME = "index.json"
+
+
+def _add_member(tar: tarfile.TarFile, name: str, data: bytes):
+    info = tarfile.TarInfo(name)
+    info.size = len(data)
+    tar.addfile(info, io.BytesIO(data))
+
+
+def write_shards(rows: list[tuple[str, float]], images_dir: Path, output_dir: Path, shard_size: int) -> dict:
+    """Write (filename, mean_size_nm) rows to tar shards in output_dir and return the index."""
+    output_dir.mkdir(parents=True, exist_ok=True)
+    shards = []
+
+    for shard_id, start in enumerate(range(0, len(rows), shard_size)):
+        shard_rows = rows[start:start + shard_size]
+        shard_name = f"shard-{shard_id:06d}.tar"
+        with tarfile.open(output_dir / shard_name, "w") as tar:
+            for i, (filename, mean_size) in enumerate(shard_rows):
+                key = f"{start + i:09d}"
+                _add_member(tar, f"{key}.png", (images_dir / filename).read_bytes())
+                meta = {"filename": filename, "mean_size_nm": float(mean_size)}
+                _add_member(tar, f"{key}.json", json.dumps(meta).encode("utf-8"))
+        shards.append({
+            "name": shard_name,
+            "num_samples": len(shard_rows),
+            "bytes": (output_dir / shard_name).stat().st_size,
+        })
+
+    index = {"num_samples": len(rows), "shards": shards}
+    (output_dir / INDEX_NAME).write_text(json.dumps(index, indent=2))
+    return index
+
+
+def pack_shards(
+    csv_path: str | Path,
+    images_dir: str | Path,
+    output_dir: str | Path,
+    shard_size: int = 1000,
+    val_ratio: float = 0.15,
+    test_ratio: float = 0.15,
+    seed: int = 42,
+) -> dict[str, dict]:
+    """
+    Shuffle the labelled images, split them into train/val/test and write
+    each split as tar shards of shard_size samples. Returns {split: index}.
+    """
+    csv_path = Path(csv_path)
+    images_dir = Path(images_dir)
+    output_dir = Path(output_dir)
+
+    df = pd.read_csv(csv_path)
+    df["filename"] = df["filename"].astype(str).str.strip()
+    df["mean_size_nm"] = pd.to_numeric(df["mean_size_nm"], errors="raise")
+    rows = list(zip(df["filename"], df["mean_size_nm"]))
+    random.Random(seed).shuffle(rows)
+
+    n_test = int(len(rows) * test_ratio)
+    n_val = int(len(rows) * val_ratio)
+    splits = {
+        "test": rows[:n_test],
+        "val": rows[n_test:n_test + n_val],
+        "train": rows[n_test + n_val:],
+    }
+
+    return {
+        split: write_shards(split_rows, images_dir, output_dir / split, shard_size)
+        for split, split_rows in splits.items()
+    }
+
+
+def _distributed_rank_and_world() -> tuple[int, int]:
+    if dist.is_available() and dist.is_initialized():
+        return dist.get_rank(), dist.get_world_size()
+    return int(os.environ.get("RANK", 0)), int(os.environ.get("WORLD_SIZE", 1))
+
+
+class ShardedSemDataset(IterableDataset):
+    """
+    Streams (image, mean_size_nm) samples from tar shards written by pack_shards.
+
+    Shards are assigned round-robin first to distributed ranks, then to
+    DataLoader workers, so every sample is read by exactly one worker on one
+    node per epoch. Use at least world_size * num_workers shards, ideally a
+    multiple, or some workers will sit idle. Call set_epoch() every epoch to
+    reshuffle shard order and the shuffle buffer (this also reaches
+    persistent DataLoader workers).
+    """
+
+    def __init__(
+        self,
+        shard_dir: str | Path,
+        transform=None,
+        shuffle: bool = True,
+        shuffle_buffer: int = 1000,
+        seed: int = 42,
+        split_by_node: bool = True,
+    ):
+        super().__init__()
+        self.shard_dir = Path(shard_dir)
+        index_path = self.shard_dir / INDEX_NAME
+        if not index_path.exists():
+            raise FileNotFoundError(f"Shard index not found: {index_path}")
+
+        self.index = json.loads(index_path.read_text())
+        self.shards = [self.shard_dir / s["name"] for s in self.index["shards"]]
+        self.transform = transform if transform is not None else get_default_transforms(train=shuffle)
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        self.seed = seed
+        self.split_by_node = split_by_node
+        # Shared with the DataLoader workers: persistent workers keep the copy
+        # of the dataset they started with, so a plain attribute set in the
+        # main process would never reach them after the first epoch.
+        self._epoch = multiprocessing.Value("i", 0, lock=False)
+
+    @property
+    def epoch(self) -> int:
+        return self._epoch.value
+
+    def set_epoch(self, epoch: int):
+        self._epoch.value = epoch
+
+    def __len__(self):
+        # Samples seen by this rank (approximate when shards are uneven).
+        world = _distributed_rank_and_world()[1] if self.split_by_node else 1
+        return math.ceil(self.index["num_samples"] / world)
+
+    def _my_shards(self) -> list[Path]:
+        shards = list(self.shards)
+        if self.shuffle:
+            random.Random(self.seed + self.epoch).shuffle(shards)
+
+        if self.split_by_node:
+            rank, world = _distributed_rank_and_world()
+            shards = shards[rank::world]
+
+        worker = get_worker_info()
+        if worker is not None:
+            shards = shards[worker.id::worker.num_workers]
+        return shards
+
+    def _iter_samples(self, shards: list[Path]):
+        for shard_path in shards:
+            pending = {}
+            with tarfile.open(shard_path, "r|") as tar:
+                for member in tar:
+                    if not member.isfile():
+                        continue
+                    key, _, ext = member.name.rpartition(".")
+                    pending.setdefault(key, {})[ext] = tar.extractfile(member).read()
+                    sample = pending[key]
+                    if "png" in sample and "json" in sample:
+                        del pending[key]
+                        yield sample["png"], json.loads(sample["json"])
+
+    def _decode(self, png_bytes: bytes, meta: dict):
+        with Image.open(io.BytesIO(png_bytes)) as img:
+            img = img.convert("L")
+        if self.transform is not None:
+            img = self.transform(img)
+        return img, torch.tensor(meta["mean_size_nm"], dtype=torch.float32)
+
+    def __iter__(self):
+        samples = self._iter_samples(self._my_shards())
+
+        if not self.shuffle or self.shuffle_buffer <= 1:
+            for png_bytes, meta in samples:
+                yield self._decode(png_bytes, meta)
+            return
+
+        worker = get_worker_info()
+        rank = _distributed_rank_and_world()[0]
+        rng = random.Random(hash((self.seed, self.epoch, rank, worker.id if worker else 0)))
+
+        # Keep undecoded PNG bytes in the buffer; decode only on the way out.
+        buffer = []
+        for sample in samples:
+            if len(buffer) < self.shuffle_buffer:
+                buffer.append(sample)
+                continue
+            i = rng.randrange(len(buffer))
+            buffer[i], sample = sample, buffer[i]
+            yield self._decode(*sample)
+
+        rng.shuffle(buffer)
+        for sample in buffer:
+            yield self._decode(*sample)
+
+
+def create_shard_dataloaders(
+    shard_root: str | Path,
+    batch_size: int = 4,
+    num_workers: int = 0,
+    shuffle_buffer: int = 1000,
+    seed: int = 42,
+):
+    """Train/val/test DataLoaders over shard_root/{train,val,test} written by pack_shards."""
+    shard_root = Path(shard_root)
+
+    train_dataset = ShardedSemDataset(
+        shard_root / "train",
+        transform=get_default_transforms(train=True),
+        shuffle=True,
+        shuffle_buffer=shuffle_buffer,
+        seed=seed,
+    )
+    eval_kwargs = dict(transform=get_default_transforms(train=False), shuffle=False)
+    val_dataset = ShardedSemDataset(shard_root / "val", **eval_kwargs)
+    test_dataset = ShardedSemDataset(shard_root / "test", **eval_kwargs)
+
+    def loader(dataset):
+        return DataLoader(
+            dataset,
+            batch_size=batch_size,
+            num_workers=num_workers,
+            persistent_workers=num_workers > 0,
+        )
+
+    return loader(train_dataset), loader(val_dataset), loader(test_dataset)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pack SEM images + labels into tar shards.")
+    parser.add_argument("--csv", type=Path, required=True, help="Labels CSV (filename, mean_size_nm).")
+    parser.add_argument("--images-dir", type=Path, required=True, help="Directory with the PNG images.")
+    parser.add_argument("--out", type=Path, required=True, help="Output directory for the shards.")
+    parser.add_argument("--shard-size", type=int, default=1000, help="Samples per shard.")
+    parser.add_argument("--val-ratio", type=float, default=0.15)
+    parser.add_argument("--test-ratio", type=float, default=0.15)
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    indexes = pack_shards(
+        csv_path=args.csv,
+        images_dir=args.images_dir,
+        output_dir=args.out,
+        shard_size=args.shard_size,
+        val_ratio=args.val_ratio,
+        test_ratio=args.test_ratio,
+        seed=args.seed,
+    )
+    for split, index in indexes.items():
+        total_mb = sum(s["bytes"] for s in index["shards"]) / 1e6
+        print(f"{split:>5}: {index['num_samples']} samples in {len(index['shards'])} shard(s), {total_mb:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,12 +1,33 @@
+from contextlib import nullcontext
 from pathlib import Path
-import math
+import argparse
+import json
+import os
 
 import torch
 import torch.nn as nn
-from torch.utils.data import DataLoader, random_split
+from torch.distributed.algorithms.join import Join
+from torch.nn.parallel import DistributedDataParallel
+from torch.profiler import record_function
+from torch.utils.data import DataLoader, DistributedSampler, random_split
 
+from augment import BatchAugment
 from datasets import SemMeanSizeDataset, get_default_transforms
+from distributed import (
+    UnpaddedDistributedSampler,
+    barrier,
+    cleanup_distributed,
+    init_distributed,
+    is_distributed,
+    is_main_process,
+    print0,
+    unwrap_model,
+)
+from metrics import MetricAccumulator, evaluation_report, format_report, gather_predictions, loader_filenames
 from model import create_model
+from profiling import StepProfiler, add_profile_args, profiler_from_args
+from registry import ModelRegistry
+from shards import create_shard_dataloaders
 
 
 def create_dataloaders(
@@ -20,6 +41,12 @@ def create_dataloaders(
 ):
     """
     Create train/val/test DataLoaders from the full SEM dataset.
+
+    Under DDP (see distributed.py) every rank builds the same seeded split;
+    the train loader then uses a DistributedSampler (call
+    train_loader.sampler.set_epoch(epoch) each epoch) and val/test use an
+    unpadded sampler, so each rank sees a disjoint 1/world_size of each split.
+    batch_size is per process.
     """
 
     # Full dataset
@@ -30,7 +57,7 @@ def create_dataloaders(
     )
 
     n_total = len(full_dataset)
-    print(f"Total samples in full dataset: {n_total}")
+    print0(f"Total samples in full dataset: {n_total}")
 
     if n_total < 2:
         raise ValueError(
@@ -49,7 +76,7 @@ def create_dataloaders(
             f"Got n_total={n_total}, train={n_train}, val={n_val}, test={n_test}."
         )
 
-    print(f"Splits -> train: {n_train}, val: {n_val}, test: {n_test} "
+    print0(f"Splits -> train: {n_train}, val: {n_val}, test: {n_test} "
           "(val/test may be 0 for very small datasets)")
 
     generator = torch.Generator().manual_seed(seed)
@@ -59,10 +86,18 @@ def create_dataloaders(
         generator=generator,
     )
 
+    if is_distributed():
+        train_sampler = DistributedSampler(train_dataset, shuffle=True, seed=seed)
+        val_sampler = UnpaddedDistributedSampler(val_dataset)
+        test_sampler = UnpaddedDistributedSampler(test_dataset)
+    else:
+        train_sampler = val_sampler = test_sampler = None
+
     train_loader = DataLoader(
         train_dataset,
         batch_size=batch_size,
-        shuffle=True,
+        shuffle=train_sampler is None,
+        sampler=train_sampler,
         num_workers=num_workers,
     )
 
@@ -70,6 +105,7 @@ def create_dataloaders(
         val_dataset,
         batch_size=batch_size,
         shuffle=False,
+        sampler=val_sampler,
         num_workers=num_workers,
     )
 
@@ -77,6 +113,7 @@ def create_dataloaders(
         test_dataset,
         batch_size=batch_size,
         shuffle=False,
+        sampler=test_sampler,
         num_workers=num_workers,
     )
 
@@ -91,161 +128,296 @@ def train_one_epoch(
     criterion: nn.Module,
     optimizer: torch.optim.Optimizer,
     device: torch.device,
+    profiler: StepProfiler | None = None,
+    augment: nn.Module | None = None,
 ):
+    """
+    One pass over the training loader.
+    If augment is given (e.g. BatchAugment), it is applied to each collated
+    batch on the device: augment(images, targets) -> (images, targets).
+    With a DDP-wrapped model, ranks may run out of batches at different
+    steps (e.g. uneven tar shards); Join keeps the gradient all-reduces
+    matched until the last rank is done.
+    """
     model.train()
 
-    running_loss = 0.0
-    running_mae = 0.0
-    n_samples = 0
+    # Running sums stay on the device: no host sync per batch
+    metrics = MetricAccumulator(device)
 
-    for images, targets in loader:
-        images = images.to(device)             # [B, 1, 480, 480]
-        targets = targets.to(device)           # [B]
+    uneven_inputs = Join([model]) if isinstance(model, DistributedDataParallel) else nullcontext()
+    with uneven_inputs:
+        for images, targets in loader:
+            images = images.to(device)             # [B, 1, 480, 480]
+            targets = targets.to(device)           # [B]
 
-        optimizer.zero_grad()
+            if augment is not None:
+                with record_function("augment"):
+                    images, targets = augment(images, targets)
 
-        preds = model(images)                  # [B]
-        # We use raw preds for loss (they can be negative while training)
-        loss = criterion(preds, targets)
+            optimizer.zero_grad()
 
-        loss.backward()
-        optimizer.step()
+            with record_function("forward"):
+                preds = model(images)                  # [B]
+                # We use raw preds for loss (they can be negative while training)
+                loss = criterion(preds, targets)
 
-        # --------- stats ----------
-        batch_size = targets.size(0)
-        running_loss += loss.item() * batch_size
+            with record_function("backward"):
+                loss.backward()
+            with record_function("optimizer_step"):
+                optimizer.step()
 
-        # For MAE we clamp to >= 0 (physically mean size can't be negative)
-        preds_clamped = torch.clamp(preds, min=0.0)
-        mae = torch.abs(preds_clamped - targets).sum()
-        running_mae += mae.item()
-        n_samples += batch_size
+            # MAE uses preds clamped to >= 0 (physically mean size can't be negative)
+            metrics.update(preds, targets, loss)
 
-    epoch_loss = running_loss / n_samples
-    epoch_mae = running_mae / n_samples
+            if profiler is not None:
+                profiler.step()
 
-    return epoch_loss, epoch_mae
+    # One sync, averaged over all ranks under DDP
+    epoch = metrics.compute()
+    return epoch["loss"], epoch["mae"]
 
 
 @torch.no_grad()
-def evaluate(model: nn.Module, loader: DataLoader, device: torch.device):
+def evaluate(
+    model: nn.Module,
+    loader: DataLoader,
+    device: torch.device,
+    profiler: StepProfiler | None = None,
+    report: bool = False,
+    worst_k: int = 10,
+):
     """
     Evaluate MSE, MAE, RMSE on a loader.
     Returns None if the loader has no samples.
+    If a profiler is given, each batch counts as one profiler step.
+    Under DDP each rank evaluates its own part of the loader and the sums
+    are all-reduced, so every rank returns the metrics of the whole split.
+    With report=True the result also has a "report" entry: per-size-bin
+    MAE/RMSE, residual histogram and the worst_k samples with their
+    filenames (metrics.evaluation_report).
     """
     if len(loader.dataset) == 0:
         return None
 
+    # Evaluate the plain module: DDP's forward may sync buffers across ranks,
+    # which would hang when ranks have different numbers of eval batches.
+    model = unwrap_model(model)
     model.eval()
 
-    mse_sum = 0.0
-    mae_sum = 0.0
-    n_samples = 0
+    metrics = MetricAccumulator(device, keep_predictions=report)
 
     for images, targets in loader:
         images = images.to(device)
         targets = targets.to(device)
 
         preds = model(images)                      # [B]
-        preds_clamped = torch.clamp(preds, min=0.0)
-
-        diff = preds_clamped - targets
-        mse_sum += (diff ** 2).sum().item()
-        mae_sum += diff.abs().sum().item()
-        n_samples += targets.size(0)
+        metrics.update(preds, targets)
 
-    mse = mse_sum / n_samples
-    mae = mae_sum / n_samples
-    rmse = math.sqrt(mse)
+        if profiler is not None:
+            profiler.step()
 
-    return {"mse": mse, "mae": mae, "rmse": rmse}
+    totals = metrics.compute()
+    results = {"mse": totals["mse"], "mae": totals["mae"], "rmse": totals["rmse"]}
+    if report:
+        preds, targets = metrics.predictions()
+        preds, targets, filenames = gather_predictions(preds, targets, loader_filenames(loader))
+        results["report"] = evaluation_report(preds, targets, filenames, worst_k=worst_k)
+    return results
 
 
 
 # Main training script
-def main():
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Train SemMeanSizeCNN on the raw SEM dataset.")
+    parser.add_argument("--epochs", type=int, default=100, help="Number of training epochs.")
+    parser.add_argument(
+        "--shards",
+        type=Path,
+        default=None,
+        help="Stream training data from tar shards made by shards.py (expects train/ val/ test/ subdirs).",
+    )
+    parser.add_argument("--num-workers", type=int, default=0, help="DataLoader worker processes.")
+    parser.add_argument(
+        "--augment",
+        action="store_true",
+        help="Apply batch-level flips/rotations/intensity jitter/random crops (augment.BatchAugment).",
+    )
+    add_profile_args(parser, default_name="train")
+    parser.add_argument(
+        "--profile-eval",
+        action="store_true",
+        help="With --profile: profile evaluate() batches instead of training steps.",
+    )
+    parser.add_argument(
+        "--register",
+        action="store_true",
+        help="Add the best checkpoint to the model registry (models/registry/) with its metrics and config.",
+    )
+    parser.add_argument(
+        "--activate",
+        action="store_true",
+        help="With --register: make the new version the one the backend serves.",
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    _, world_size = init_distributed()
+
     project_root = Path(__file__).resolve().parents[2]
     csv_path = project_root / "data" / "raw" / "sem_mean_sizes.csv"
     images_dir = project_root / "data" / "raw" / "images"
     models_dir = project_root / "models"
-    models_dir.mkdir(parents=True, exist_ok=True)
+    if is_main_process():
+        models_dir.mkdir(parents=True, exist_ok=True)
 
     # Hyperparameters (anyone who clones the repo can tune these)
     batch_size = 4
-    num_epochs = 100
+    num_epochs = args.epochs
     learning_rate = 1e-3
     val_ratio = 0.15
     test_ratio = 0.15
 
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    print(f"Using device: {device}")
+    if torch.cuda.is_available():
+        device = torch.device("cuda", int(os.environ.get("LOCAL_RANK", 0)))
+    else:
+        device = torch.device("cpu")
+    print0(f"Using device: {device}")
+    if world_size > 1:
+        print0(f"DDP: {world_size} processes, global batch size {batch_size * world_size}")
 
     # Data
-    train_loader, val_loader, test_loader = create_dataloaders(
-        csv_path=csv_path,
-        images_dir=images_dir,
-        batch_size=batch_size,
-        val_ratio=val_ratio,
-        test_ratio=test_ratio,
-        num_workers=0,
-        seed=42,
-    )
+    if args.shards is not None:
+        train_loader, val_loader, test_loader = create_shard_dataloaders(
+            shard_root=args.shards,
+            batch_size=batch_size,
+            num_workers=args.num_workers,
+            seed=42,
+        )
+    else:
+        train_loader, val_loader, test_loader = create_dataloaders(
+            csv_path=csv_path,
+            images_dir=images_dir,
+            batch_size=batch_size,
+            val_ratio=val_ratio,
+            test_ratio=test_ratio,
+            num_workers=args.num_workers,
+            seed=42,
+        )
 
     # Model, loss, optimizer
     model = create_model(device=device)
+    if world_size > 1:
+        # DDP broadcasts rank 0's initial weights, so all replicas start equal
+        model = DistributedDataParallel(model, device_ids=[device.index] if device.type == "cuda" else None)
     criterion = nn.MSELoss()
     optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+    augment = BatchAugment().to(device) if args.augment else None
 
     best_val_mae = float("inf")
     best_model_path = models_dir / "best_sem_meansize_cnn.pt"
 
     has_val = len(val_loader.dataset) > 0
 
-    print("\nStarting training...\n")
-    for epoch in range(1, num_epochs + 1):
-        train_loss, train_mae = train_one_epoch(
-            model=model,
-            loader=train_loader,
-            criterion=criterion,
-            optimizer=optimizer,
-            device=device,
-        )
-
-        msg = f"[Epoch {epoch:03d}] Train loss: {train_loss:.4f}, Train MAE: {train_mae:.4f} nm"
-
-        # Validation (if we have val data)
-        if has_val:
-            val_metrics = evaluate(model, val_loader, device)
-            if val_metrics is not None:
-                val_mae = val_metrics["mae"]
-                msg += f" | Val MAE: {val_mae:.4f} nm, Val RMSE: {val_metrics['rmse']:.4f} nm"
-
-                # Save best model by validation MAE
-                if val_mae < best_val_mae:
-                    best_val_mae = val_mae
-                    torch.save(model.state_dict(), best_model_path)
+    # Optional torch.profiler window over the first training (or eval) steps
+    # (rank 0 only under DDP)
+    profiler = profiler_from_args(args) if is_main_process() else None
+    train_profiler = profiler if profiler is not None and not args.profile_eval else None
+    eval_profiler = profiler if profiler is not None and args.profile_eval else None
+
+    print0("\nStarting training...\n")
+    # The profiler closes itself (and removes its module hooks) after its window
+    with profiler if profiler is not None else nullcontext():
+        for epoch in range(1, num_epochs + 1):
+            if hasattr(train_loader.dataset, "set_epoch"):
+                train_loader.dataset.set_epoch(epoch)
+            if isinstance(train_loader.sampler, DistributedSampler):
+                train_loader.sampler.set_epoch(epoch)
+
+            train_loss, train_mae = train_one_epoch(
+                model=model,
+                loader=train_loader,
+                criterion=criterion,
+                optimizer=optimizer,
+                device=device,
+                profiler=train_profiler,
+                augment=augment,
+            )
+
+            msg = f"[Epoch {epoch:03d}] Train loss: {train_loss:.4f}, Train MAE: {train_mae:.4f} nm"
+
+            # Validation (if we have val data)
+            if has_val:
+                val_metrics = evaluate(model, val_loader, device, profiler=eval_profiler)
+                if val_metrics is not None:
+                    val_mae = val_metrics["mae"]
+                    msg += f" | Val MAE: {val_mae:.4f} nm, Val RMSE: {val_metrics['rmse']:.4f} nm"
+
+                    # Save best model by validation MAE (metrics are all-reduced,
+                    # so every rank takes the same branch; only rank 0 writes)
+                    if val_mae < best_val_mae:
+                        best_val_mae = val_mae
+                        if is_main_process():
+                            torch.save(unwrap_model(model).state_dict(), best_model_path)
+                else:
+                    msg += " | (no validation samples)"
             else:
-                msg += " | (no validation samples)"
-        else:
-            msg += " | (validation set empty with current dataset size)"
+                msg += " | (validation set empty with current dataset size)"
 
-        print(msg)
+            print0(msg)
+
+    if profiler is not None:
+        print(profiler.summary())
 
     # If we never had a val set, just save final model
-    if not has_val:
-        torch.save(model.state_dict(), best_model_path)
+    if not has_val and is_main_process():
+        torch.save(unwrap_model(model).state_dict(), best_model_path)
+
+    print0(f"\nTraining finished. Best model saved to: {best_model_path}")
 
-    print(f"\nTraining finished. Best model saved to: {best_model_path}")
+    # With --register the test metrics must describe the registered weights,
+    # i.e. the best checkpoint rather than the last epoch.
+    if args.register and has_val:
+        barrier()  # rank 0 wrote the file
+        unwrap_model(model).load_state_dict(torch.load(best_model_path, map_location=device))
 
     # Final test evaluation (if test set is non-empty)
+    test_metrics = None
     if len(test_loader.dataset) > 0:
-        test_metrics = evaluate(model, test_loader, device)
-        print(
+        test_metrics = evaluate(model, test_loader, device, report=True)
+        test_report = test_metrics.pop("report")
+        print0(
             f"\nTest set: MAE = {test_metrics['mae']:.4f} nm, "
             f"RMSE = {test_metrics['rmse']:.4f} nm"
         )
+        print0(format_report(test_report))
+        if is_main_process():
+            report_path = best_model_path.with_name(best_model_path.stem + ".test_report.json")
+            report_path.write_text(json.dumps(test_report, indent=2, allow_nan=False))
+            print0(f"Test report written to {report_path}")
     else:
-        print("\nTest set is empty (too few samples). Add more data to evaluate properly.")
+        print0("\nTest set is empty (too few samples). Add more data to evaluate properly.")
+
+    if args.register and is_main_process():
+        metrics = {f"test_{name}": value for name, value in (test_metrics or {}).items()}
+        if has_val:
+            metrics["best_val_mae"] = best_val_mae
+        config = {
+            "epochs": num_epochs,
+            "batch_size": batch_size,
+            "world_size": world_size,
+            "learning_rate": learning_rate,
+            "val_ratio": val_ratio,
+            "test_ratio": test_ratio,
+            "seed": 42,
+            "augment": args.augment,
+            "shards": str(args.shards) if args.shards is not None else None,
+        }
+        version = ModelRegistry().register(best_model_path, metrics=metrics, config=config, activate=args.activate)
+        print0(f"Registered model version {version}")
+
+    cleanup_distributed()
 
 
 if __name__ == "__main__":
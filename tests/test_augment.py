@@ -0,0 +1,32 @@
+import torch
+
+from augment import BatchAugment
+
+
+def test_dihedral_ops_preserve_shape_and_pixel_values():
+    images = torch.linspace(-1, 1, 8 * 16 * 16).view(8, 1, 16, 16)
+    targets = torch.arange(8, dtype=torch.float32)
+    augment = BatchAugment(brightness=0.0, contrast=0.0, crop_p=0.0, generator=torch.Generator().manual_seed(0))
+
+    out, out_targets = augment(images, targets)
+
+    assert out.shape == images.shape
+    assert torch.equal(out_targets, targets)
+    # Flips / transposes only permute pixels within each image
+    for i in range(8):
+        assert torch.equal(out[i].flatten().sort().values, images[i].flatten().sort().values)
+
+
+def test_crop_scales_targets_and_eval_mode_is_identity():
+    images = torch.rand(6, 1, 32, 32) * 2 - 1
+    targets = torch.full((6,), 50.0)
+    augment = BatchAugment(flip_p=0.0, rot90=False, brightness=0.0, contrast=0.0, crop_p=1.0, crop_scale=(0.5, 0.8))
+
+    out, out_targets = augment(images, targets)
+    assert out.shape == images.shape
+    assert torch.all(out_targets > 50.0 / 0.8 - 1e-4)
+    assert torch.all(out_targets < 50.0 / 0.5 + 1e-4)
+
+    augment.eval()
+    out, out_targets = augment(images, targets)
+    assert out is images and out_targets is targets
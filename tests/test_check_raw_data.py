@@ -0,0 +1,30 @@
+from check_raw_data import validate_raw_data
+from datasets import SemMeanSizeDataset
+from synthetic import make_synthetic_dataset
+
+
+def test_validator_is_incremental_and_feeds_dataset(tmp_path):
+    csv_path, images_dir = make_synthetic_dataset(tmp_path, n_images=4)
+    (images_dir / "broken.png").write_bytes(b"not a png")
+    with open(csv_path, "a") as f:
+        f.write("broken.png,10.0\n")
+
+    kwargs = dict(
+        images_dir=images_dir,
+        csv_path=csv_path,
+        manifest_path=tmp_path / "manifest.csv",
+        report_path=tmp_path / "report.json",
+        workers=1,
+    )
+    first = validate_raw_data(**kwargs)
+    assert first["counts"]["rechecked"] == 5
+    assert list(first["unreadable"]) == ["broken.png"]
+    assert first["counts"]["valid"] == 4
+
+    second = validate_raw_data(**kwargs)
+    assert second["counts"]["rechecked"] == 0
+
+    dataset = SemMeanSizeDataset(csv_path, images_dir, report_path=tmp_path / "report.json")
+    assert len(dataset) == 4
+    image, target = dataset[0]
+    assert image.shape == (1, 480, 480)
@@ -0,0 +1,62 @@
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+import torch.nn as nn
+from torch.nn.parallel import DistributedDataParallel
+from torch.utils.data import DataLoader, DistributedSampler, TensorDataset
+
+from distributed import UnpaddedDistributedSampler, unwrap_model
+from model import create_model
+from train import evaluate, train_one_epoch
+
+WORLD_SIZE = 2
+
+
+def _dataset():
+    generator = torch.Generator().manual_seed(0)
+    images = torch.rand(11, 1, 32, 32, generator=generator) * 2 - 1
+    targets = torch.rand(11, generator=generator) * 100
+    return TensorDataset(images, targets)
+
+
+def _worker(rank, init_file, out_dir):
+    torch.set_num_threads(1)
+    dist.init_process_group("gloo", init_method=f"file://{init_file}", rank=rank, world_size=WORLD_SIZE)
+    try:
+        torch.manual_seed(rank)  # different init per rank; DDP must broadcast rank 0's weights
+        model = DistributedDataParallel(create_model())
+        dataset = _dataset()
+        # Uneven per-rank batch counts (batch_size 4 over an unpadded split) exercise Join
+        train_loader = DataLoader(dataset, batch_size=4, sampler=UnpaddedDistributedSampler(dataset))
+        optimizer = torch.optim.SGD(model.parameters(), lr=1e-4)
+        loss, mae = train_one_epoch(model, train_loader, nn.MSELoss(), optimizer, torch.device("cpu"))
+
+        eval_loader = DataLoader(dataset, batch_size=3, sampler=UnpaddedDistributedSampler(dataset))
+        metrics = evaluate(model, eval_loader, torch.device("cpu"))
+        torch.save({"metrics": metrics, "state": unwrap_model(model).state_dict()}, f"{out_dir}/rank{rank}.pt")
+    finally:
+        dist.destroy_process_group()
+
+
+def test_ddp_replicas_stay_in_sync_and_metrics_are_global(tmp_path):
+    mp.spawn(_worker, args=(str(tmp_path / "init"), str(tmp_path)), nprocs=WORLD_SIZE, join=True)
+    results = [torch.load(tmp_path / f"rank{r}.pt") for r in range(WORLD_SIZE)]
+
+    for key, value in results[0]["state"].items():
+        assert torch.equal(value, results[1]["state"][key]), key
+    assert results[0]["metrics"] == results[1]["metrics"]
+
+    # All-reduced metrics equal a single-process evaluation of the same weights
+    model = create_model()
+    model.load_state_dict(results[0]["state"])
+    expected = evaluate(model, DataLoader(_dataset(), batch_size=5), torch.device("cpu"))
+    for name in ("mse", "mae", "rmse"):
+        assert abs(results[0]["metrics"][name] - expected[name]) < 1e-4 * max(1.0, expected[name])
+
+
+def test_samplers_split_dataset():
+    dataset = list(range(11))
+    parts = [list(UnpaddedDistributedSampler(dataset, rank=r, world_size=3)) for r in range(3)]
+    assert sorted(sum(parts, [])) == dataset
+    assert [len(UnpaddedDistributedSampler(dataset, rank=r, world_size=3)) for r in range(3)] == [4, 4, 3]
+    assert len(DistributedSampler(dataset, num_replicas=3, rank=0)) == 4
@@ -0,0 +1,40 @@
+import numpy as np
+import torch
+
+from drift import DriftSketch, build_reference, compare, intensity_histograms
+from model import create_model
+
+
+def test_sketch_merges_and_round_trips(tmp_path):
+    torch.manual_seed(0)
+    model = create_model().eval()
+    images = torch.randn(6, 1, 64, 64).clamp(-1, 1)
+    whole = build_reference(model, [(images, torch.zeros(6))])
+    halves = build_reference(model, [(images[:3], None)]).merge(build_reference(model, [(images[3:], None)]))
+
+    assert whole.count == 6 and whole.prediction.sum() == 6
+    np.testing.assert_allclose(intensity_histograms(images).sum(axis=1), 64 * 64)
+    for name in DriftSketch.FIELDS:
+        np.testing.assert_allclose(getattr(halves, name), getattr(whole, name), rtol=1e-6)
+
+    whole.save(tmp_path / "ref.drift.npz")
+    loaded = DriftSketch.load(tmp_path / "ref.drift.npz")
+    assert DriftSketch.from_dict(loaded.to_dict()).count == 6
+    scores = compare(whole, loaded)
+    assert scores["intensity_psi"] == 0.0 and scores["embedding_shift"] == 0.0
+    assert scores["intensity_ks_pvalue"] == 1.0
+
+
+def test_shifted_inputs_are_detected():
+    rng = np.random.default_rng(0)
+    reference, same, shifted = DriftSketch(), DriftSketch(), DriftSketch()
+    edges = np.linspace(-1, 1, 65)
+    for sketch, center, n in ((reference, 0.0, 500), (same, 0.0, 100), (shifted, 0.3, 100)):
+        for _ in range(n):
+            hist, _ = np.histogram(rng.normal(center, 0.3, 4096), bins=edges)
+            sketch.update(hist, rng.normal(center, 1.0, 256), rng.lognormal(3.0 + center, 0.3))
+
+    ok, drifted = compare(reference, same), compare(reference, shifted)
+    assert ok["intensity_psi"] < 0.05 and ok["prediction_ks_pvalue"] > 0.01 and ok["embedding_shift"] < 0.2
+    assert drifted["intensity_psi"] > 0.2 and drifted["prediction_ks_pvalue"] < 0.01
+    assert drifted["embedding_shift"] > 0.25
@@ -0,0 +1,28 @@
+import torch
+
+from ensemble import EnsemblePredictor, tta_views
+from model import create_model
+
+
+def test_batched_ensemble_matches_sequential_calls(tmp_path):
+    paths, models = [], []
+    for seed in range(2):
+        torch.manual_seed(seed)
+        models.append(create_model().eval())
+        paths.append(tmp_path / f"seed{seed}.pt")
+        torch.save(models[-1].state_dict(), paths[-1])
+
+    images = torch.randn(2, 1, 64, 64)
+    predictor = EnsemblePredictor(paths, tta_views=8, device="cpu", max_batch=5)
+    mean, std, preds = predictor.predict(images)
+    assert preds.shape == (2, 8, 2)
+
+    with torch.no_grad():
+        expected = torch.stack([
+            torch.stack([model(view).clamp(min=0.0) for view in tta_views(images, 8).split(2)])
+            for model in models
+        ])                                                      # (K, T, N)
+    assert torch.allclose(preds, expected, atol=1e-5)
+    assert torch.allclose(mean, expected.mean(dim=(0, 1)), atol=1e-5)
+    assert torch.allclose(std, expected.reshape(-1, 2).std(dim=0, correction=0), atol=1e-5)
+    assert predictor.version.startswith("ens2-") and predictor.version.endswith("+tta8")
@@ -0,0 +1,28 @@
+import torch
+from torch.utils.data import TensorDataset
+
+from finetune import TrainableTail, fine_tune, freeze_prefix
+from model import create_model
+
+
+def test_cached_tail_fine_tune_only_changes_unfrozen_blocks():
+    torch.manual_seed(0)
+    model = create_model().eval()
+    images = torch.randn(12, 1, 64, 64)
+    dataset = TensorDataset(images, torch.rand(12) * 50)
+
+    with torch.no_grad():
+        expected = model(images)
+        tail_out = TrainableTail(model, 3)(freeze_prefix(model, 3)(images))
+    assert torch.allclose(tail_out, expected, atol=1e-5)
+
+    before = {name: value.clone() for name, value in model.state_dict().items()}
+    result = fine_tune(model, dataset, torch.device("cpu"), n_frozen=3, epochs=2, batch_size=4, learning_rate=1e-2)
+    after = model.state_dict()
+
+    assert len(result["train_loss"]) == 2 and result["samples"] == 12
+    for name, value in after.items():
+        frozen = name.split(".")[:2] in (["features", "0"], ["features", "1"], ["features", "2"])
+        # Weights and BatchNorm running statistics of the frozen blocks stay put
+        assert torch.equal(value, before[name]) == frozen or name.endswith("num_batches_tracked"), name
+    assert not model.training and all(p.requires_grad for p in model.parameters())
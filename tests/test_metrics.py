@@ -0,0 +1,76 @@
+import json
+import math
+
+import pytest
+import torch
+from torch.utils.data import DataLoader, Dataset, Subset
+
+from metrics import MetricAccumulator, evaluation_report, loader_filenames
+from model import create_model
+from train import evaluate
+
+
+class _NamedDataset(Dataset):
+    def __init__(self, n):
+        self.images = torch.randn(n, 1, 32, 32)
+        self.targets = torch.linspace(1.0, 150.0, n)
+        self.filenames = [f"img_{i:03d}.png".encode() for i in range(n)]
+
+    def __len__(self):
+        return len(self.targets)
+
+    def __getitem__(self, idx):
+        return self.images[idx], self.targets[idx]
+
+
+def test_accumulator_matches_per_batch_items():
+    torch.manual_seed(0)
+    acc = MetricAccumulator("cpu")
+    abs_sum = sq_sum = loss_sum = 0.0
+    for _ in range(5):
+        preds, targets = torch.randn(7) * 10, torch.rand(7) * 10
+        loss = torch.nn.functional.mse_loss(preds, targets)
+        acc.update(preds, targets, loss)
+        diff = preds.clamp(min=0.0) - targets
+        abs_sum += diff.abs().sum().item()
+        sq_sum += (diff ** 2).sum().item()
+        loss_sum += loss.item() * 7
+
+    result = acc.compute()
+    assert result["n"] == 35
+    assert result["mae"] == pytest.approx(abs_sum / 35)
+    assert result["rmse"] == pytest.approx(math.sqrt(sq_sum / 35))
+    assert result["loss"] == pytest.approx(loss_sum / 35)
+
+
+def test_evaluation_report_bins_histogram_and_worst():
+    preds = torch.tensor([4.0, 12.0, 30.0, 60.0, 300.0])
+    targets = torch.tensor([3.0, 10.0, 20.0, 50.0, 100.0])
+    report = evaluation_report(preds, targets, [f"f{i}" for i in range(5)], worst_k=2)
+
+    bins = {tuple(row["range_nm"]): row for row in report["size_bins"]}
+    assert bins[(0.0, 5.0)]["count"] == 1 and bins[(0.0, 5.0)]["mae"] == pytest.approx(1.0)
+    assert bins[(20.0, 50.0)]["rmse"] == pytest.approx(10.0)
+    assert bins[(5.0, 10.0)]["mae"] is None
+    assert sum(report["residual_histogram"]["counts"]) == 5
+    assert report["residual_histogram"]["counts"][-1] == 1  # residual 200 nm > 50 nm
+    assert [row["filename"] for row in report["worst"]] == ["f4", "f2"]
+    assert bins[(200.0, None)]["count"] == 0
+    assert report["residual_histogram"]["edges_nm"][0] is None
+    json.dumps(report, allow_nan=False)  # what train.py writes
+
+
+def test_evaluate_report_maps_worst_samples_to_filenames():
+    dataset = Subset(_NamedDataset(20), list(range(19, -1, -2)))
+    loader = DataLoader(dataset, batch_size=4)
+    assert loader_filenames(loader)[:2] == ["img_019.png", "img_017.png"]
+
+    torch.manual_seed(0)
+    metrics = evaluate(create_model().eval(), loader, torch.device("cpu"), report=True, worst_k=3)
+    report = metrics["report"]
+    assert report["n"] == 10
+    for row in report["worst"]:
+        assert row["filename"] == f"img_{19 - 2 * row['index']:03d}.png"
+    errors = [abs(row["residual_nm"]) for row in report["worst"]]
+    assert errors == sorted(errors, reverse=True)
+    assert metrics["mae"] >= errors[-1] * 3 / 10
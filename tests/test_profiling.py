@@ -0,0 +1,25 @@
+import torch
+from torch.nn.modules import module as nn_module
+
+from model import create_model
+from profiling import StepProfiler
+
+
+def test_profiler_closes_after_window_and_stays_quiet(tmp_path, capsys):
+    model = create_model().eval()
+    images = torch.randn(1, 1, 32, 32)
+    hooks_before = len(nn_module._global_forward_hooks)
+
+    with StepProfiler(tmp_path, name="t", wait=0, warmup=1, active=1) as prof:
+        for _ in range(4):
+            with torch.no_grad():
+                model(images)
+            prof.step()
+            if prof.done:
+                # Window over: hooks gone while still inside the with block
+                assert len(nn_module._global_forward_hooks) == hooks_before
+
+    assert (tmp_path / "t_trace.json").exists()
+    assert "ConvBlock(1->16)" in prof.table
+    assert capsys.readouterr().out == ""
+    assert "t_top_ops.txt" in prof.summary()
@@ -0,0 +1,53 @@
+import torch
+
+from infer import load_model
+from model import DEFAULT_CHANNELS, create_model
+from prune import pareto_front, prune, select_channels
+
+
+def test_pruning_dead_channels_is_exact_and_checkpoints_reload(tmp_path):
+    torch.manual_seed(0)
+    model = create_model().eval()
+    # Give every pruned block random BN scales and kill half of its channels
+    dead = {}
+    with torch.no_grad():
+        for block in (2, 3, 4):
+            bn = model.features[block].bn
+            bn.weight.uniform_(0.5, 1.5)
+            dead[block] = torch.randperm(bn.num_features)[: bn.num_features // 2]
+            bn.weight[dead[block]] = 0.0
+            bn.bias[dead[block]] = 0.0
+
+    keep = select_channels(model, 0.5, blocks=(2, 3, 4), criterion="bn")
+    for block, idx in keep.items():
+        assert not set(idx.tolist()) & set(dead[block].tolist())
+
+    pruned = prune(model, 0.5, blocks=(2, 3, 4), criterion="bn")
+    assert pruned.channels == (16, 32, 32, 64, 128)
+    assert sum(p.numel() for p in pruned.parameters()) < sum(p.numel() for p in model.parameters()) / 3
+
+    images = torch.randn(3, 1, 64, 64)
+    with torch.no_grad():
+        # Zeroed channels are 0 after the ReLU, so removing them changes nothing
+        assert torch.allclose(pruned(images), model(images), atol=1e-5)
+        assert pruned.embed(images).shape == (3, 128)
+
+    path = tmp_path / "pruned.pt"
+    torch.save(pruned.state_dict(), path)
+    reloaded, _ = load_model(path, device="cpu")
+    assert reloaded.channels == pruned.channels
+    assert create_model().channels == DEFAULT_CHANNELS
+
+    l1 = prune(model, 0.25, blocks=(3,), criterion="l1")
+    assert l1.channels == (16, 32, 64, 96, 256)
+
+
+def test_pareto_front_drops_dominated_levels():
+    points = [
+        {"sparsity": 0.0, "latency_ms": 10.0, "val_mae": 1.0},
+        {"sparsity": 0.25, "latency_ms": 8.0, "val_mae": 1.1},
+        {"sparsity": 0.5, "latency_ms": 6.0, "val_mae": 1.3},
+        {"sparsity": 0.6, "latency_ms": 7.0, "val_mae": 1.4},  # slower and worse than 0.5
+        {"sparsity": 0.75, "latency_ms": 5.0, "val_mae": 2.0},
+    ]
+    assert [p["sparsity"] for p in pareto_front(points)] == [0.75, 0.5, 0.25, 0.0]
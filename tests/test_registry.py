@@ -0,0 +1,30 @@
+import json
+
+import pytest
+
+from registry import ModelRegistry, resolve_checkpoint
+
+
+def test_register_dedupe_and_activate(tmp_path):
+    first, second = tmp_path / "a.pt", tmp_path / "b.pt"
+    first.write_bytes(b"checkpoint-a")
+    second.write_bytes(b"checkpoint-b")
+    registry = ModelRegistry(tmp_path / "registry")
+
+    v1 = registry.register(first, metrics={"test_mae": 3.0}, config={"epochs": 5})
+    v2 = registry.register(second, parent=v1)
+    assert v1.startswith("v0001-") and v2.startswith("v0002-")
+    # The first registered version becomes active; later ones only on request.
+    assert registry.active_version() == v1
+    assert registry.register(first) == v1
+    assert registry.versions() == [v1, v2]
+
+    meta = registry.metadata(v2)
+    assert meta["parent"] == v1 and meta["sha256"].startswith(v2.split("-")[1])
+    assert registry.metadata(v1)["metrics"] == {"test_mae": 3.0}
+
+    registry.set_active(v2)
+    assert resolve_checkpoint(registry_root=registry.root).read_bytes() == b"checkpoint-b"
+    assert json.loads(registry.index_path.read_text())["active"] == v2
+    with pytest.raises(KeyError):
+        registry.set_active("v0009-000000000000")
@@ -0,0 +1,32 @@
+from torch.utils.data import DataLoader
+
+from shards import ShardedSemDataset, pack_shards
+from synthetic import make_synthetic_dataset
+
+
+def test_shards_cover_every_sample_once_across_workers(tmp_path):
+    csv_path, images_dir = make_synthetic_dataset(tmp_path / "raw", n_images=10)
+    indexes = pack_shards(csv_path, images_dir, tmp_path / "shards", shard_size=2, val_ratio=0.2, test_ratio=0.0)
+    assert indexes["train"]["num_samples"] == 8
+    assert len(indexes["train"]["shards"]) == 4
+
+    dataset = ShardedSemDataset(tmp_path / "shards" / "train", shuffle=True, shuffle_buffer=3)
+    loader = DataLoader(dataset, batch_size=None, num_workers=2)
+    targets = sorted(round(float(target), 3) for _, target in loader)
+
+    assert len(targets) == 8
+    assert len(set(targets)) == 8
+
+
+def test_set_epoch_reshuffles_persistent_workers(tmp_path):
+    csv_path, images_dir = make_synthetic_dataset(tmp_path / "raw", n_images=12)
+    pack_shards(csv_path, images_dir, tmp_path / "shards", shard_size=2, val_ratio=0.0, test_ratio=0.0)
+
+    dataset = ShardedSemDataset(tmp_path / "shards" / "train", shuffle=True, shuffle_buffer=4)
+    loader = DataLoader(dataset, batch_size=None, num_workers=2, persistent_workers=True)
+    orders = set()
+    for epoch in range(3):
+        dataset.set_epoch(epoch)
+        orders.add(tuple(round(float(target), 3) for _, target in loader))
+
+    assert len(orders) == 3